@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Consultation, ChildPhoto
+from .models import Consultation, ChildPhoto, ProcessingJob
 
 
 class ChildPhotoInline(admin.TabularInline):
@@ -19,3 +19,9 @@ class ConsultationAdmin(admin.ModelAdmin):
 class ChildPhotoAdmin(admin.ModelAdmin):
     list_display = ("id", "photo_id", "context", "consent", "created_at")
     list_filter = ("context", "consent", "created_at")
+
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "consultation", "status", "stage", "created_at", "finished_at")
+    list_filter = ("status", "stage", "created_at")
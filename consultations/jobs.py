@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from ragapi import metrics
+
+from .models import Consultation, ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CONSULTATION_WORKERS,
+                thread_name_prefix="consultation",
+            )
+    return _executor
+
+
+class StageTracker:
+    """
+    Catat tahap aktif + durasi tiap tahap ke ProcessingJob (jika ada).
+    """
+
+    def __init__(self, job: ProcessingJob | None = None):
+        self.job = job
+        self.timings = {}
+        self._stage = None
+        self._t0 = None
+
+    def __call__(self, stage: str):
+        self._close_current()
+        self._stage = stage
+        self._t0 = time.perf_counter()
+        if self.job is not None:
+            self.job.stage = stage
+            self.job.stage_timings = dict(self.timings)
+            self.job.save(update_fields=["stage", "stage_timings", "updated_at"])
+
+    def _close_current(self):
+        if self._stage is not None:
+            elapsed = time.perf_counter() - self._t0
+            self.timings[self._stage] = round(self.timings.get(self._stage, 0.0) + elapsed, 4)
+            self._stage = None
+
+    def finish(self):
+        self._close_current()
+        return self.timings
+
+
+def process_consultation(c: Consultation, on_stage=None, use_cache: bool = True) -> dict:
+    """
+    Pipeline lengkap satu konsultasi: vision (jika perlu) → answer_hybrid.
+    Hasil ditulis ke baris Consultation. Return dict hasil answer_hybrid.
+    use_cache=False memaksa generasi ulang jawaban LLM (dan tidak memakai reuse jawaban).
+    """
+    # lazy import supaya startup cepat
+    from ragapi.hybrid import answer_hybrid
+
+    on_stage = on_stage or StageTracker()
+
+    with metrics.span("process"):
+        ensure_vision_findings(c, on_stage)
+        result = None
+        if use_cache:
+            with metrics.span("process.reuse"):
+                result = reuse_answer(c)
+        if result is None:
+            with metrics.span("process.answer"):
+                result = answer_hybrid(c, k=8, on_stage=on_stage, use_cache=use_cache)
+        save_answer(c, result)
+    return result
+
+
+def reuse_answer(c: Consultation) -> dict | None:
+    """
+    Ambil jawaban konsultasi lain yang hampir identik (lihat ragapi.answer_reuse).
+    Return dict berbentuk hasil answer_hybrid, atau None jika tidak ada yang cocok.
+    """
+    from ragapi.answer_reuse import find_similar_answer, forget_answer
+
+    match = find_similar_answer(c)
+    if match is None:
+        return None
+
+    source_id, similarity = match
+    source = Consultation.objects.filter(id=source_id).exclude(answer_text__isnull=True).first()
+    if source is None:
+        # entri index tertinggal (konsultasi sudah dihapus / belum terjawab lagi)
+        forget_answer(source_id)
+        return None
+
+    return {
+        "answer": source.answer_text,
+        "hits": [{"meta": m} for m in (source.rag_citations or [])],
+        "did_autofetch": False,
+        "evidence_limited": False,
+        "enrichment_job_id": None,
+        "reused_from": source,
+        "reuse_similarity": similarity,
+    }
+
+
+def ensure_vision_findings(c: Consultation, on_stage=None):
+    """
+    Jalankan analisis visual jika konsultasi punya foto dan belum dianalisis.
+    """
+    from ragapi.vision import analyze_images
+
+    if c.vision_findings is not None:
+        return
+
+    images = [
+        {"url": p.url, "context": p.context}
+        for p in c.child_photos.all()
+        if p.url
+    ]
+    if images:
+        if on_stage:
+            on_stage(ProcessingJob.Stage.VISION)
+        with metrics.span("process.vision"):
+            c.vision_findings = analyze_images(images)
+        c.save()
+
+
+def save_answer(c: Consultation, result: dict):
+    from ragapi.answer_reuse import forget_answer, remember_answer
+
+    c.rag_citations = [h["meta"] for h in result.get("hits", [])]
+    c.answer_text = result.get("answer")
+    c.reused_from = result.get("reused_from")
+    c.reuse_similarity = result.get("reuse_similarity")
+    c.save()
+
+    # hanya jawaban hasil generasi dengan evidence memadai yang boleh dipakai ulang
+    if c.reused_from is None and not result.get("evidence_limited") and result.get("hits"):
+        remember_answer(c)
+    else:
+        # diproses ulang dengan hasil yang tidak layak reuse → jangan tinggalkan jawaban lama di index
+        forget_answer(c.id)
+
+
+def expire_stale_jobs(jobs) -> int:
+    """
+    Tandai failed job queued/running yang heartbeat-nya (updated_at) lebih lama dari
+    CONSULTATION_JOB_STALE_SECONDS. Worker pool hidup di memori proses web, jadi job yang
+    sedang antre/jalan saat proses restart atau crash tidak akan pernah selesai.
+    jobs: queryset ProcessingJob. Return jumlah job yang ditandai.
+    """
+    now = timezone.now()
+    expired = jobs.filter(
+        status__in=[ProcessingJob.Status.QUEUED, ProcessingJob.Status.RUNNING],
+        updated_at__lt=now - timedelta(seconds=settings.CONSULTATION_JOB_STALE_SECONDS),
+    ).update(
+        status=ProcessingJob.Status.FAILED,
+        error="stale: worker berhenti sebelum job selesai (restart/crash)",
+        finished_at=now,
+        updated_at=now,
+    )
+    if expired:
+        logger.warning(f"[PROCESS] {expired} job stale ditandai failed")
+    return expired
+
+
+def enqueue_processing(c: Consultation, use_cache: bool = True) -> tuple[ProcessingJob, bool]:
+    """
+    Buat job untuk konsultasi (atau kembalikan job yang masih aktif) lalu
+    serahkan ke worker pool. Job aktif yang stale tidak dikembalikan (diganti job baru).
+    Return: (job, created)
+    """
+    expire_stale_jobs(c.processing_jobs.all())
+    active = c.processing_jobs.filter(
+        status__in=[ProcessingJob.Status.QUEUED, ProcessingJob.Status.RUNNING]
+    ).first()
+    if active:
+        return active, False
+
+    job = ProcessingJob.objects.create(consultation=c)
+    job_id = job.id
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job_id, use_cache))
+    return job, True
+
+
+def _run_in_thread(job_id, use_cache: bool = True):
+    close_old_connections()
+    try:
+        run_processing_job(job_id, use_cache=use_cache)
+    finally:
+        close_old_connections()
+
+
+def run_processing_job(job_id, use_cache: bool = True) -> ProcessingJob | None:
+    now = timezone.now()
+    updated = ProcessingJob.objects.filter(id=job_id, status=ProcessingJob.Status.QUEUED).update(
+        status=ProcessingJob.Status.RUNNING,
+        started_at=now,
+        updated_at=now,
+    )
+    if updated != 1:
+        return None
+
+    job = ProcessingJob.objects.select_related("consultation").get(id=job_id)
+    tracker = StageTracker(job)
+    try:
+        with metrics.collect_timings() as timings:
+            result = process_consultation(job.consultation, on_stage=tracker, use_cache=use_cache)
+        job.status = ProcessingJob.Status.DONE
+        job.stage = ProcessingJob.Stage.DONE
+        job.result = {
+            "reused_from": str(result["reused_from"].id) if result.get("reused_from") else None,
+            "did_autofetch": result.get("did_autofetch", False),
+            "evidence_limited": result.get("evidence_limited", False),
+            "enrichment_job_id": result.get("enrichment_job_id"),
+            "timings": timings.as_dict(),
+        }
+    except Exception as e:
+        logger.exception(f"[PROCESS] Job {job.id} failed")
+        job.status = ProcessingJob.Status.FAILED
+        job.error = f"{type(e).__name__}: {e}"
+
+    job.stage_timings = tracker.finish()
+    job.finished_at = timezone.now()
+    # hanya menimpa job yang masih running (bisa sudah ditandai stale dan digantikan job baru)
+    saved = ProcessingJob.objects.filter(id=job.id, status=ProcessingJob.Status.RUNNING).update(
+        status=job.status,
+        stage=job.stage,
+        stage_timings=job.stage_timings,
+        result=job.result,
+        error=job.error,
+        finished_at=job.finished_at,
+        updated_at=job.finished_at,
+    )
+    if not saved:
+        logger.warning(f"[PROCESS] Job {job.id} selesai setelah ditandai stale; status tidak ditimpa")
+    return job
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0002_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='reuse_similarity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='consultation',
+            name='reused_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reused_by', to='consultations.consultation'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consultations', '0003_consultation_reuse_similarity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
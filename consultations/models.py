@@ -38,6 +38,12 @@ class Consultation(models.Model):
     rag_citations = models.JSONField(null=True, blank=True)
     answer_text = models.TextField(null=True, blank=True)
 
+    # jawaban diambil dari konsultasi lain yang hampir identik (audit reuse)
+    reused_from = models.ForeignKey(
+        "self", null=True, blank=True, related_name="reused_by", on_delete=models.SET_NULL
+    )
+    reuse_similarity = models.FloatField(null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self) -> str:
@@ -62,3 +68,47 @@ class ChildPhoto(models.Model):
 
     def __str__(self) -> str:
         return f"{self.photo_id} | {self.context}"
+
+
+class ProcessingJob(models.Model):
+    """
+    Satu kali eksekusi pipeline (vision → retrieval → autofetch → generation)
+    untuk sebuah konsultasi, dijalankan di worker pool lokal.
+    updated_at berfungsi sebagai heartbeat: job queued/running yang tidak bergerak lebih lama
+    dari CONSULTATION_JOB_STALE_SECONDS dianggap hilang (proses restart/crash).
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    class Stage(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        VISION = "vision", "Vision"
+        RETRIEVAL = "retrieval", "Retrieval"
+        AUTOFETCH = "autofetch", "Autofetch"
+        GENERATION = "generation", "Generation"
+        DONE = "done", "Done"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    consultation = models.ForeignKey(
+        Consultation, related_name="processing_jobs", on_delete=models.CASCADE
+    )
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    stage = models.CharField(max_length=20, choices=Stage.choices, default=Stage.QUEUED)
+    # {"vision": 1.23, "retrieval": 0.08, ...} dalam detik
+    stage_timings = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.consultation_id} | {self.status} | {self.stage}"
@@ -0,0 +1,26 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+def sse_event(event: str, data) -> bytes:
+    """
+    Format satu event Server-Sent Events.
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Supaya DRF menerima `Accept: text/event-stream`. Response sukses berupa
+    StreamingHttpResponse (tidak lewat renderer); renderer ini hanya dipakai
+    untuk response error (404, 400, ...) yang dikirim sebagai satu event "error".
+    """
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return sse_event("error", data)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Consultation, ChildPhoto
+from .models import Consultation, ChildPhoto, ProcessingJob
 
 
 ALLOWED_CONTEXTS = {
@@ -49,9 +49,18 @@ class ConsultationSerializer(serializers.ModelSerializer):
             "vision_findings",
             "rag_citations",
             "answer_text",
+            "reused_from",
+            "reuse_similarity",
+            "created_at",
+        ]
+        read_only_fields = [
+            "vision_findings",
+            "rag_citations",
+            "answer_text",
+            "reused_from",
+            "reuse_similarity",
             "created_at",
         ]
-        read_only_fields = ["vision_findings", "rag_citations", "answer_text", "created_at"]
 
     def validate(self, attrs):
         mode = attrs["mode"]
@@ -94,3 +103,22 @@ class ConsultationSerializer(serializers.ModelSerializer):
             ChildPhoto.objects.create(consultation=c, **p)
 
         return c
+
+
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProcessingJob
+        fields = [
+            "id",
+            "consultation",
+            "status",
+            "stage",
+            "stage_timings",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "updated_at",
+        ]
+        read_only_fields = fields
@@ -1,3 +1,238 @@
-from django.test import TestCase
+import hashlib
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ragapi import answer_reuse
+from ragapi.bench import isolated_store
+from ragapi.chroma_client import get_answer_collection
+
+from .jobs import reuse_answer, run_processing_job, save_answer
+from .models import Consultation, ProcessingJob
+
+
+def _consultation(**overrides) -> Consultation:
+    fields = {
+        "mode": Consultation.Mode.BALITA,
+        "age_value": 30,
+        "age_unit": "months",
+        "sex": Consultation.Sex.FEMALE,
+        "weight_kg": "11.5",
+        "height_cm": "85.0",
+        "measurement_type": Consultation.MeasurementType.HEIGHT,
+        "user_question": "Apakah anak saya stunting?",
+    }
+    fields.update(overrides)
+    return Consultation.objects.create(**fields)
+
+
+def _age_job(job: ProcessingJob, seconds: int):
+    # updated_at auto_now → mundurkan lewat update() supaya tidak disentuh save()
+    ProcessingJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=seconds))
+
+
+@override_settings(CONSULTATION_JOB_STALE_SECONDS=60)
+class ProcessJobTests(TestCase):
+    def setUp(self):
+        self.c = _consultation()
+        self.url = f"/api/consultations/{self.c.id}/process/"
+        # on_commit tidak dijalankan di TestCase, tapi jangan sampai worker pool ikut dibuat
+        patcher = mock.patch("consultations.jobs._get_executor")
+        self.executor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_async_returns_202_with_status_url(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(f"{self.url}?async=true")
+
+        self.assertEqual(res.status_code, 202)
+        job = ProcessingJob.objects.get(id=res.data["job_id"])
+        self.assertEqual(job.status, ProcessingJob.Status.QUEUED)
+        self.assertTrue(res.data["status_url"].endswith(f"/api/consultations/{self.c.id}/jobs/{job.id}/"))
+        self.executor.return_value.submit.assert_called_once()
+
+    def test_active_job_is_deduplicated(self):
+        first = self.client.post(f"{self.url}?async=true")
+        second = self.client.post(f"{self.url}?async=true")
+
+        self.assertEqual(first.data["job_id"], second.data["job_id"])
+        self.assertEqual(self.c.processing_jobs.count(), 1)
+
+    def test_job_status(self):
+        job_id = self.client.post(f"{self.url}?async=true").data["job_id"]
+
+        res = self.client.get(f"/api/consultations/{self.c.id}/jobs/{job_id}/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["status"], ProcessingJob.Status.QUEUED)
+        self.assertEqual(res.data["consultation"], self.c.id)  # detail konsultasi hanya saat done
+
+        missing = self.client.get(f"/api/consultations/{self.c.id}/jobs/00000000-0000-0000-0000-000000000000/")
+        self.assertEqual(missing.status_code, 404)
+
+    def test_default_is_synchronous(self):
+        result = {"answer": "Jawaban", "hits": [], "evidence_limited": False}
+        with mock.patch("consultations.views.process_consultation", return_value=result) as process:
+            res = self.client.post(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        process.assert_called_once()
+        self.assertFalse(ProcessingJob.objects.exists())
+
+    def test_stale_job_is_replaced(self):
+        stale = ProcessingJob.objects.create(consultation=self.c, status=ProcessingJob.Status.RUNNING)
+        _age_job(stale, 120)
+
+        res = self.client.post(f"{self.url}?async=true")
+        self.assertEqual(res.status_code, 202)
+        self.assertNotEqual(res.data["job_id"], str(stale.id))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ProcessingJob.Status.FAILED)
+        self.assertTrue(stale.error.startswith("stale"))
+
+    def test_job_status_reports_stale_job_failed(self):
+        stale = ProcessingJob.objects.create(consultation=self.c)
+        _age_job(stale, 120)
+
+        res = self.client.get(f"/api/consultations/{self.c.id}/jobs/{stale.id}/")
+        self.assertEqual(res.data["status"], ProcessingJob.Status.FAILED)
+
+    def test_recent_job_is_not_stale(self):
+        job = ProcessingJob.objects.create(consultation=self.c, status=ProcessingJob.Status.RUNNING)
+        _age_job(job, 30)
+
+        res = self.client.post(f"{self.url}?async=true")
+        self.assertEqual(res.data["job_id"], str(job.id))
+
+
+class RunProcessingJobTests(TestCase):
+    def test_runs_queued_job(self):
+        c = _consultation()
+        job = ProcessingJob.objects.create(consultation=c)
+        result = {"answer": "Jawaban", "hits": []}
+
+        with mock.patch("consultations.jobs.process_consultation", return_value=result):
+            run_processing_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProcessingJob.Status.DONE)
+        self.assertIn("timings", job.result)
+        self.assertIsNone(run_processing_job(job.id))  # job yang sudah selesai tidak diklaim ulang
+
+    def test_finished_job_does_not_overwrite_expired_status(self):
+        c = _consultation()
+        job = ProcessingJob.objects.create(consultation=c)
+
+        def expire_midway(consultation, **kwargs):
+            ProcessingJob.objects.filter(id=job.id).update(status=ProcessingJob.Status.FAILED, error="stale")
+            return {"answer": "Jawaban", "hits": []}
+
+        with mock.patch("consultations.jobs.process_consultation", side_effect=expire_midway):
+            run_processing_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ProcessingJob.Status.FAILED, "stale"))
+
+
+def _fake_embed(texts, **kwargs):
+    vecs = np.stack(
+        [np.random.default_rng(int(hashlib.md5(t.encode()).hexdigest()[:8], 16)).standard_normal(8) for t in texts]
+    ).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _sse_events(response) -> list[tuple[str, dict]]:
+    events = []
+    for block in b"".join(response.streaming_content).decode().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@override_settings(RAG_ANSWER_REUSE_ENABLED=True, RAG_ANSWER_REUSE_MIN_SIMILARITY=0.95)
+class AnswerReuseTests(TestCase):
+    HITS = [{"meta": {"title": "Pedoman stunting", "year": 2020}}]
+
+    def setUp(self):
+        self.enterContext(isolated_store())
+        self.enterContext(mock.patch("ragapi.answer_reuse.embed", side_effect=_fake_embed))
+
+    def _answered(self, **overrides) -> Consultation:
+        c = _consultation(**overrides)
+        save_answer(c, {"answer": "Jawaban\n\n### 4) Sumber (otomatis)\n[S1] Pedoman stunting | 2020", "hits": self.HITS})
+        return c
+
+    def _indexed(self, c) -> bool:
+        return bool(get_answer_collection().get(ids=[str(c.id)])["ids"])
+
+    def test_own_entry_does_not_hide_other_candidates(self):
+        first = self._answered()
+        second = self._answered()  # teks reuse identik → dirinya sendiri ikut jadi tetangga terdekat
+
+        match = answer_reuse.find_similar_answer(second)
+
+        self.assertEqual(match[0], str(first.id))
+        self.assertAlmostEqual(match[1], 1.0, places=4)
+
+    def test_different_bucket_is_not_reused(self):
+        self._answered()
+        other = _consultation(weight_kg="15.5")
+        self.assertIsNone(answer_reuse.find_similar_answer(other))
+
+    def test_delete_removes_from_index(self):
+        c = self._answered()
+        self.assertTrue(self._indexed(c))
+
+        res = self.client.delete(f"/api/consultations/{c.id}/")
+
+        self.assertEqual(res.status_code, 204)
+        self.assertFalse(self._indexed(c))
+
+    def test_update_removes_from_index(self):
+        c = self._answered()
+
+        payload = {
+            "mode": c.mode,
+            "age_value": c.age_value,
+            "age_unit": c.age_unit,
+            "sex": c.sex,
+            "weight_kg": str(c.weight_kg),
+            "height_cm": str(c.height_cm),
+            "measurement_type": c.measurement_type,
+            "user_question": "Pertanyaan lain",
+        }
+        res = self.client.put(f"/api/consultations/{c.id}/", json.dumps(payload), content_type="application/json")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(self._indexed(c))
+
+    def test_reprocessed_without_evidence_is_forgotten(self):
+        c = self._answered()
+        save_answer(c, {"answer": "Evidence belum cukup", "hits": [], "evidence_limited": True})
+        self.assertFalse(self._indexed(c))
+
+    def test_missing_source_is_forgotten(self):
+        source = self._answered()
+        Consultation.objects.filter(id=source.id).delete()  # bypass view: entri index tertinggal
+
+        self.assertIsNone(reuse_answer(_consultation()))
+        self.assertFalse(self._indexed(source))
+
+    def test_stream_reuse_emits_sources(self):
+        source = self._answered()
+        c = _consultation()
+
+        res = self.client.get(f"/api/consultations/{c.id}/stream/")
+        events = _sse_events(res)
+
+        self.assertEqual([name for name, _ in events], ["token", "sources", "done"])
+        self.assertEqual(events[0][1]["text"], "Jawaban")
+        self.assertIn("[S1] Pedoman stunting | 2020", events[1][1]["text"])
+        self.assertEqual(events[1][1]["hits"], [self.HITS[0]["meta"]])
+        self.assertEqual(events[2][1]["reused_from"], str(source.id))
+        c.refresh_from_db()
+        self.assertEqual(c.answer_text, source.answer_text)
@@ -3,45 +3,89 @@ import uuid
 
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 
-from .models import Consultation
-from .serializers import ConsultationSerializer
-from ragapi.vision import analyze_images
+from ragapi import metrics
+
+from .jobs import (
+    StageTracker,
+    enqueue_processing,
+    ensure_vision_findings,
+    expire_stale_jobs,
+    process_consultation,
+    reuse_answer,
+    save_answer,
+)
+from .models import Consultation, ProcessingJob
+from .renderers import EventStreamRenderer, sse_event
+from .serializers import ConsultationSerializer, ProcessingJobSerializer
+
+
+def _flag(request, name: str) -> bool:
+    value = request.query_params.get(name)
+    if value is None and hasattr(request.data, "get"):
+        value = request.data.get(name)
+    return str(value).lower() in ("1", "true", "yes")
 
 
 class ConsultationViewSet(viewsets.ModelViewSet):
     queryset = Consultation.objects.all().order_by("-created_at")
     serializer_class = ConsultationSerializer
 
+    def perform_update(self, serializer):
+        from ragapi.answer_reuse import forget_answer
+
+        # input berubah → jawaban tersimpan tidak lagi mewakili teks reuse-nya
+        super().perform_update(serializer)
+        forget_answer(serializer.instance.id)
+
+    def perform_destroy(self, instance):
+        from ragapi.answer_reuse import forget_answer
+
+        consultation_id = instance.id
+        super().perform_destroy(instance)
+        forget_answer(consultation_id)
+
     @action(detail=True, methods=["POST"])
     def process(self, request, pk=None):
+        """
+        Default: pipeline dijalankan langsung di request ini → 200 + konsultasi.
+        ?async=true (atau CONSULTATION_PROCESS_ASYNC=True): enqueue job → 202 {job_id, status_url}.
+        Pantau lewat GET /api/consultations/{id}/jobs/{job_id}/; hasil akhir tersimpan di konsultasi.
+        ?sync=true memaksa mode sinkron walaupun CONSULTATION_PROCESS_ASYNC=True.
+        ?no_cache=true memaksa generasi ulang (lewati cache jawaban LLM).
+        ?timings=true (mode sync) menyertakan breakdown durasi per span + counter di field "timings";
+        di mode async breakdown selalu tersimpan di result job.
+        """
         c: Consultation = self.get_object()
+        use_cache = not _flag(request, "no_cache")
+
+        run_async = _flag(request, "async") or (settings.CONSULTATION_PROCESS_ASYNC and not _flag(request, "sync"))
+        if run_async:
+            job, _ = enqueue_processing(c, use_cache=use_cache)
+            data = ProcessingJobSerializer(job).data
+            data["job_id"] = str(job.id)
+            data["status_url"] = reverse(
+                "consultation-job-status", kwargs={"pk": c.pk, "job_id": job.id}, request=request
+            )
+            return Response(data, status=status.HTTP_202_ACCEPTED)
 
         try:
-            # lazy import supaya startup cepat
-            from ragapi.hybrid import answer_hybrid  # type: ignore
-
-            if c.vision_findings is None:
-                images = [
-                    {"url": p.url, "context": p.context}
-                    for p in c.child_photos.all()
-                    if p.url
-                ]
-                if images:
-                    c.vision_findings = analyze_images(images)
-                    c.save()
-
-            result = answer_hybrid(c, k=8)
-            c.rag_citations = [h["meta"] for h in result.get("hits", [])]
-            c.answer_text = result.get("answer")
-            c.save()
+            with metrics.collect_timings() as timings:
+                result = process_consultation(c, use_cache=use_cache)
 
             data = self.get_serializer(c).data
             data["did_autofetch"] = result.get("did_autofetch", False)
+            data["evidence_limited"] = result.get("evidence_limited", False)
+            data["enrichment_job_id"] = result.get("enrichment_job_id")
+            if _flag(request, "timings"):
+                data["timings"] = timings.as_dict()
             return Response(data, status=status.HTTP_200_OK)
 
         except ModuleNotFoundError:
@@ -56,6 +100,76 @@ class ConsultationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=True, methods=["GET", "POST"], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream(self, request, pk=None):
+        """
+        GET/POST /api/consultations/{id}/stream/  (text/event-stream)
+        Event:
+          token   → {"text": potongan jawaban}
+          sources → {"text": blok [S#], "hits": [...]}
+          done    → {"did_autofetch", "evidence_limited", "enrichment_job_id", "reused_from", "timings"}
+          error   → {"error", "detail"}
+        Jawaban lengkap tetap disimpan ke answer_text. ?no_cache=true seperti di /process/.
+        """
+        c: Consultation = self.get_object()
+        use_cache = not _flag(request, "no_cache")
+        response = StreamingHttpResponse(self._event_stream(c, use_cache), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def _event_stream(self, c: Consultation, use_cache: bool = True):
+        from ragapi.hybrid import stream_answer_hybrid, stream_reused_answer
+
+        tracker = StageTracker()
+        try:
+            ensure_vision_findings(c, tracker)
+            reused = reuse_answer(c) if use_cache else None
+            if reused is not None:
+                events = stream_reused_answer(reused)
+            else:
+                events = stream_answer_hybrid(c, k=8, on_stage=tracker, use_cache=use_cache)
+
+            for event, data in events:
+                if event == "token":
+                    yield sse_event("token", {"text": data})
+                elif event == "sources":
+                    yield sse_event("sources", data)
+                elif event == "done":
+                    save_answer(c, data)
+                    yield sse_event(
+                        "done",
+                        {
+                            "did_autofetch": data.get("did_autofetch", False),
+                            "evidence_limited": data.get("evidence_limited", False),
+                            "enrichment_job_id": data.get("enrichment_job_id"),
+                            "reused_from": str(c.reused_from_id) if c.reused_from_id else None,
+                            "timings": tracker.finish(),
+                        },
+                    )
+        except Exception as e:
+            yield sse_event("error", {"error": "Gagal memproses konsultasi", "detail": str(e)})
+
+    @action(detail=True, methods=["GET"], url_path=r"jobs/(?P<job_id>[0-9a-fA-F-]+)")
+    def job_status(self, request, pk=None, job_id=None):
+        """
+        GET /api/consultations/{id}/jobs/{job_id}/
+        Tahap aktif + durasi per tahap; saat status=done sertakan konsultasi terbaru.
+        Job yang worker-nya hilang (lihat expire_stale_jobs) dilaporkan failed.
+        """
+        c: Consultation = self.get_object()
+        try:
+            expire_stale_jobs(c.processing_jobs.filter(id=job_id))
+            job = c.processing_jobs.get(id=job_id)
+        except (ProcessingJob.DoesNotExist, ValueError):
+            return Response({"error": "job tidak ditemukan"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = ProcessingJobSerializer(job).data
+        if job.status == ProcessingJob.Status.DONE:
+            c.refresh_from_db()
+            data["consultation"] = self.get_serializer(c).data
+        return Response(data, status=status.HTTP_200_OK)
+
 
 class UploadPhotoView(APIView):
     """
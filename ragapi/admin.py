@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import EnrichmentJob
 
-# Register your models here.
+
+@admin.register(EnrichmentJob)
+class EnrichmentJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "inserted_chunks", "created_at", "finished_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("query", "query_hash")
@@ -0,0 +1,120 @@
+import logging
+import math
+
+from django.conf import settings
+
+from .chroma_client import get_answer_collection
+from .embeddings import embed
+
+logger = logging.getLogger(__name__)
+
+
+def age_band(c) -> str:
+    if c.age_unit == "months":
+        months = c.age_value
+    else:
+        months = c.age_value * 12
+
+    for upper, label in ((6, "0-5m"), (12, "6-11m"), (24, "12-23m"), (60, "24-59m"), (120, "5-9y"), (180, "10-14y")):
+        if months < upper:
+            return label
+    return "15-19y"
+
+
+def anthro_bucket(c) -> str:
+    """
+    Bucket kasar BB (2 kg) dan TB/PB (5 cm): selisih ~1 kg / beberapa cm tetap satu bucket.
+    """
+    w = float(c.weight_kg)
+    h = float(c.height_cm)
+    w_lo = int(math.floor(w / 2.0) * 2)
+    h_lo = int(math.floor(h / 5.0) * 5)
+    return f"w{w_lo}-{w_lo + 2}|h{h_lo}-{h_lo + 5}"
+
+
+def _filters(c) -> dict:
+    return {
+        "mode": str(c.mode),
+        "age_band": age_band(c),
+        "sex": str(c.sex),
+        "anthro": anthro_bucket(c),
+    }
+
+
+def reuse_text(c) -> str:
+    f = _filters(c)
+    return (
+        f"Mode: {f['mode']}. Umur: {f['age_band']}. Gender: {f['sex']}. "
+        f"Antropometri: {f['anthro']}.\n"
+        f"Pertanyaan: {c.user_question}"
+    )
+
+
+def is_reusable(c) -> bool:
+    """
+    Konsultasi dengan foto/temuan visual tidak ikut reuse (jawaban bergantung pada foto).
+    """
+    if not settings.RAG_ANSWER_REUSE_ENABLED:
+        return False
+    if c.vision_findings:
+        return False
+    return not c.child_photos.exists()
+
+
+def find_similar_answer(c):
+    """
+    Cari konsultasi terjawab yang mirip (mode, umur, gender, bucket antropometri sama
+    dan similarity pertanyaan ≥ RAG_ANSWER_REUSE_MIN_SIMILARITY).
+    Filter bucket ada di `where`; ambil beberapa kandidat supaya konsultasi itu sendiri
+    (jika sudah ada di index karena diproses ulang) tidak menutupi kandidat lain.
+    Return: (consultation_id, similarity) atau None.
+    """
+    if not is_reusable(c):
+        return None
+
+    col = get_answer_collection()
+    if col.count() == 0:
+        return None
+
+    f = _filters(c)
+    res = col.query(
+        query_embeddings=[embed([reuse_text(c)])[0]],
+        n_results=settings.RAG_ANSWER_REUSE_CANDIDATES,
+        where={"$and": [{key: value} for key, value in f.items()]},
+        include=["distances"],
+    )
+    for candidate_id, distance in zip(res["ids"][0], res["distances"][0]):
+        if candidate_id == str(c.id):
+            continue
+        # hasil urut berdasarkan distance: kandidat pertama di bawah ambang → sisanya juga
+        similarity = 1.0 - float(distance)
+        if similarity < settings.RAG_ANSWER_REUSE_MIN_SIMILARITY:
+            return None
+        logger.info(f"[REUSE] {c.id} ≈ {candidate_id} (similarity={similarity:.3f})")
+        return candidate_id, similarity
+    return None
+
+
+def remember_answer(c):
+    """
+    Masukkan konsultasi yang sudah dijawab ke index reuse.
+    """
+    if not is_reusable(c) or not c.answer_text:
+        return
+    get_answer_collection().upsert(
+        ids=[str(c.id)],
+        documents=[reuse_text(c)],
+        metadatas=[_filters(c)],
+        embeddings=[embed([reuse_text(c)])[0]],
+    )
+
+
+def forget_answer(consultation_id):
+    """
+    Keluarkan konsultasi dari index reuse (dihapus, diubah, atau diproses ulang).
+    Gagal hapus hanya di-log supaya tidak menggagalkan operasi konsultasinya.
+    """
+    try:
+        get_answer_collection().delete(ids=[str(consultation_id)])
+    except Exception as e:
+        logger.warning(f"[REUSE] gagal hapus {consultation_id} dari index reuse: {e}")
@@ -1,6 +1,30 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RagapiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ragapi"
+
+    def ready(self):
+        if not settings.RAG_WARMUP or not _is_server_process():
+            return
+        from .warmup import start_background_warmup
+
+        start_background_warmup()
+
+
+def _is_server_process() -> bool:
+    """
+    Warmup hanya untuk proses yang melayani request: bukan migrate/shell/command lain,
+    dan pada runserver hanya di proses anak autoreloader (RUN_MAIN).
+    """
+    if os.path.basename(sys.argv[0]) == "manage.py":
+        command = sys.argv[1] if len(sys.argv) > 1 else ""
+        if command != "runserver":
+            return False
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    return True
@@ -0,0 +1,167 @@
+"""
+Utilitas benchmark (dipakai management command rag_bench, rag_bench_retrieval, rag_eval_compact):
+query contoh, percentile, generator PDF sintetis, dan store Chroma sementara.
+"""
+import random
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.test import override_settings
+
+DEFAULT_QUERIES = [
+    "stunting anak usia 2 tahun berat badan kurang",
+    "MP-ASI pertama usia 6 bulan tekstur dan frekuensi",
+    "z-score tinggi badan menurut umur di bawah -2 SD",
+    "anemia defisiensi besi pada balita",
+    "ASI eksklusif dan risiko stunting",
+    "protein hewani telur untuk pertumbuhan anak",
+    "wasting dan underweight pada anak di bawah lima tahun",
+    "sanitasi air bersih dan diare berulang",
+]
+
+_VOCAB = (
+    "stunting wasting underweight anemia gizi balita remaja MP-ASI ASI eksklusif z-score "
+    "tinggi badan berat protein hewani telur ikan zat besi vitamin sanitasi diare posyandu "
+    "pertumbuhan perkembangan kognitif intervensi prevalensi risiko asupan energi mikronutrien "
+    "children growth nutrition intake complementary feeding breastfeeding height-for-age cohort "
+    "study trial outcome mothers household income education district Indonesia"
+).split()
+
+
+def percentile(values, pct: float) -> float:
+    """
+    Percentile nearest-rank (tanpa interpolasi), cukup untuk laporan latensi.
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def latency_summary(values_ms) -> dict:
+    values_ms = list(values_ms)
+    return {
+        "n": len(values_ms),
+        "mean_ms": sum(values_ms) / len(values_ms) if values_ms else 0.0,
+        "p50_ms": percentile(values_ms, 50),
+        "p95_ms": percentile(values_ms, 95),
+        "p99_ms": percentile(values_ms, 99),
+    }
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_synthetic_pdf(path, pages: list[list[str]]):
+    """
+    Tulis PDF minimal (Helvetica, satu content stream per halaman) yang bisa dibaca pypdf.
+    pages: list halaman, tiap halaman list baris teks.
+    """
+    body = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for i, lines in enumerate(pages):
+        page_obj, content_obj = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_obj} 0 R")
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        body[page_obj] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_obj} 0 R >>"
+        )
+        body[content_obj] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+    body[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = {}
+    for num in sorted(body):
+        offsets[num] = len(out)
+        out += f"{num} 0 obj\n{body[num]}\nendobj\n".encode("latin-1")
+    xref_at = len(out)
+    size = max(body) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    for num in range(1, size):
+        out += f"{offsets[num]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    Path(path).write_bytes(out)
+
+
+def _sentence(rng) -> str:
+    # satu baris = satu kalimat (huruf kapital + titik) supaya chunker berbasis kalimat ikut teruji
+    text = " ".join(rng.choice(_VOCAB) for _ in range(rng.randint(8, 16)))
+    return f"{text[0].upper()}{text[1:]}."
+
+
+def build_synthetic_corpus(directory, n_docs: int, pages: int = 8, lines_per_page: int = 50, seed: int = 0):
+    """
+    Buat n_docs PDF sintetis (kosakata gizi/stunting acak, deterministik per seed). Return list path.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for d in range(n_docs):
+        rng = random.Random(seed * 100_003 + d)
+        content = [[_sentence(rng) for _ in range(lines_per_page)] for _ in range(pages)]
+        path = directory / f"synthetic_{d:04d}.pdf"
+        write_synthetic_pdf(path, content)
+        paths.append(path)
+    return paths
+
+
+@contextmanager
+def isolated_store():
+    """
+    Arahkan Chroma, manifest, index BM25, mirror dan cache ke folder sementara,
+    lalu pulihkan singleton modul setelah selesai. Store produksi tidak tersentuh.
+    """
+    from . import (
+        bm25_index,
+        chroma_client,
+        dedup,
+        embeddings,
+        image_preprocess,
+        ingest_manifest,
+        retrieval,
+        vector_mirror,
+    )
+
+    singletons = [
+        (chroma_client, "_client"),
+        (chroma_client, "_collection"),
+        (chroma_client, "_answer_collection"),
+        (chroma_client, "_generation_conn"),
+        (ingest_manifest, "_conn"),
+        (bm25_index, "_index"),
+        (dedup, "_index"),
+        (vector_mirror, "_mirror"),
+        (embeddings, "_CACHE"),
+        (image_preprocess, "_cache"),
+    ]
+    saved = [(mod, name, getattr(mod, name)) for mod, name in singletons]
+
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as tmp:
+        store = Path(tmp) / "chroma"
+        overrides = {
+            "CHROMA_PERSIST_PATH": str(store),
+            "RAG_INGEST_MANIFEST_PATH": str(store / "ingest_manifest.sqlite3"),
+            "RAG_GENERATION_PATH": str(store / "generation.sqlite3"),
+            "RAG_BM25_INDEX_PATH": str(store / "bm25_index.sqlite3"),
+            "RAG_DEDUP_INDEX_PATH": str(store / "dedup_index.sqlite3"),
+            "RAG_MIRROR_PATH": str(store / "vector_mirror"),
+            "RAG_PROJECTION_PATH": str(store / "projection.npz"),
+            "RAG_CACHE_DIR": str(Path(tmp) / "cache"),
+        }
+        for mod, name in singletons:
+            setattr(mod, name, None)
+        retrieval.clear_retrieval_cache()
+        try:
+            with override_settings(**overrides):
+                yield Path(tmp)
+        finally:
+            for mod, name, value in saved:
+                setattr(mod, name, value)
+            retrieval.clear_retrieval_cache()
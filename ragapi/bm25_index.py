@@ -0,0 +1,278 @@
+"""
+Inverted index BM25 on-disk (SQLite, disimpan di samping Chroma store).
+
+Dipelihara di jalur tulis chunk (upsert_chunks / delete_chunks), supaya istilah klinis
+yang persis ("stunting", "mp-asi", "z-score") tetap ketemu walau embedding MiniLM meleset.
+
+Skema ringkas:
+- docs:     doc_no (integer) ↔ chunk id Chroma, plus panjang dokumen (jumlah token)
+- terms:    term → term_id, df
+- postings: (term_id, doc_no, tf) WITHOUT ROWID, jadi satu posting = satu baris kecil di B-tree
+- stats:    jumlah dokumen dan total panjang (untuk avgdl), diperbarui inkremental
+"""
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_index = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_no  INTEGER PRIMARY KEY,
+    doc_id  TEXT NOT NULL UNIQUE,
+    length  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term_id INTEGER PRIMARY KEY,
+    term    TEXT NOT NULL UNIQUE,
+    df      INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_no  INTEGER NOT NULL,
+    tf      INTEGER NOT NULL,
+    PRIMARY KEY (term_id, doc_no)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_no);
+CREATE TABLE IF NOT EXISTS stats (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats (key, value) VALUES ('doc_count', 0), ('total_length', 0);
+"""
+
+# kata fungsi Indonesia/Inggris yang hampir selalu muncul; tidak berguna untuk ranking
+_STOPWORDS = frozenset(
+    """
+    yang dan di ke dari untuk dengan pada dalam ini itu atau adalah juga tidak akan bisa ada
+    oleh sebagai karena agar jika serta saat lebih sudah telah masih anak apa bagaimana
+    the of and to in for on with by is are was were be as at or an from that this it its not
+    """.split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase, pisah per kata. Istilah bertanda hubung ("mp-asi", "z-score") disimpan utuh
+    sekaligus per bagian, supaya "MP ASI" dan "MP-ASI" sama-sama cocok.
+    """
+    tokens = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        if "-" in tok:
+            tokens.append(tok)
+            parts = tok.split("-")
+        else:
+            parts = (tok,)
+        for part in parts:
+            if len(part) > 1 and part not in _STOPWORDS:
+                tokens.append(part)
+    return tokens
+
+
+class BM25Index:
+    """
+    Satu file SQLite = satu index. Aman dipakai lintas thread dalam satu proses.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _bump_stats(self, conn, doc_delta: int, length_delta: int):
+        conn.executemany(
+            "UPDATE stats SET value = value + ? WHERE key = ?",
+            [(doc_delta, "doc_count"), (length_delta, "total_length")],
+        )
+
+    def _remove(self, conn, doc_ids) -> None:
+        """
+        Hapus dokumen dari index (dipanggil di dalam transaksi).
+        """
+        removed_docs = removed_length = 0
+        for doc_id in doc_ids:
+            row = conn.execute("SELECT doc_no, length FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if not row:
+                continue
+            doc_no, length = row
+            term_ids = [r[0] for r in conn.execute("SELECT term_id FROM postings WHERE doc_no = ?", (doc_no,))]
+            conn.executemany("UPDATE terms SET df = df - 1 WHERE term_id = ?", [(t,) for t in term_ids])
+            conn.execute("DELETE FROM postings WHERE doc_no = ?", (doc_no,))
+            conn.execute("DELETE FROM docs WHERE doc_no = ?", (doc_no,))
+            removed_docs += 1
+            removed_length += length
+        if removed_docs:
+            self._bump_stats(conn, -removed_docs, -removed_length)
+
+    def _term_ids(self, conn, terms) -> dict:
+        terms = list(terms)
+        ids = {}
+        for start in range(0, len(terms), 500):
+            part = terms[start:start + 500]
+            rows = conn.execute(
+                f"SELECT term, term_id FROM terms WHERE term IN ({','.join('?' * len(part))})",
+                part,
+            ).fetchall()
+            ids.update(rows)
+        missing = [t for t in terms if t not in ids]
+        if missing:
+            conn.executemany("INSERT INTO terms (term, df) VALUES (?, 0)", [(t,) for t in missing])
+            for start in range(0, len(missing), 500):
+                part = missing[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT term, term_id FROM terms WHERE term IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                ids.update(rows)
+        return ids
+
+    def index_documents(self, ids, documents):
+        """
+        Tambah/ganti dokumen di index (semantik upsert, sama seperti Chroma).
+        """
+        if not ids:
+            return
+        counted = [(doc_id, Counter(tokenize(doc))) for doc_id, doc in zip(ids, documents)]
+        vocab = set()
+        for _, tf in counted:
+            vocab.update(tf)
+
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            try:
+                self._remove(conn, ids)
+                term_ids = self._term_ids(conn, vocab)
+                total_length = 0
+                df = Counter()
+                postings = []
+                for doc_id, tf in counted:
+                    length = sum(tf.values())
+                    cur = conn.execute("INSERT INTO docs (doc_id, length) VALUES (?, ?)", (doc_id, length))
+                    doc_no = cur.lastrowid
+                    total_length += length
+                    for term, n in tf.items():
+                        term_id = term_ids[term]
+                        postings.append((term_id, doc_no, n))
+                        df[term_id] += 1
+                conn.executemany("INSERT INTO postings (term_id, doc_no, tf) VALUES (?, ?, ?)", postings)
+                conn.executemany("UPDATE terms SET df = df + ? WHERE term_id = ?", [(n, t) for t, n in df.items()])
+                self._bump_stats(conn, len(counted), total_length)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def remove_documents(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            try:
+                self._remove(conn, ids)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM docs")
+            conn.execute("DELETE FROM terms")
+            conn.execute("UPDATE stats SET value = 0")
+            conn.execute("COMMIT")
+
+    def doc_count(self) -> int:
+        with self._lock:
+            return self._get_conn().execute("SELECT value FROM stats WHERE key = 'doc_count'").fetchone()[0]
+
+    def search(self, query: str, k: int = 8, max_df_ratio: float | None = None) -> list[tuple[str, float]]:
+        """
+        Return [(chunk_id, skor_bm25)] terurut skor menurun.
+        Skor per dokumen dijumlahkan di SQLite (GROUP BY … ORDER BY … LIMIT k), bukan di Python.
+        Istilah dengan df > max_df_ratio × jumlah dokumen (default RAG_BM25_MAX_DF_RATIO; mis.
+        "stunting" di korpus stunting) dilewati selama masih ada istilah lain yang lebih jarang:
+        idf-nya kecil, tapi posting-nya hampir seluruh tabel.
+        """
+        q_terms = Counter(tokenize(query))
+        if not q_terms:
+            return []
+        if max_df_ratio is None:
+            max_df_ratio = settings.RAG_BM25_MAX_DF_RATIO
+
+        with self._lock:
+            conn = self._get_conn()
+            stats = dict(conn.execute("SELECT key, value FROM stats"))
+            n_docs, total_length = stats["doc_count"], stats["total_length"]
+            if not n_docs:
+                return []
+            avgdl = total_length / n_docs
+
+            terms = list(q_terms)
+            rows = conn.execute(
+                f"SELECT term, term_id, df FROM terms WHERE df > 0 AND term IN ({','.join('?' * len(terms))})",
+                terms,
+            ).fetchall()
+            if max_df_ratio:
+                rare = [r for r in rows if r[2] <= max_df_ratio * n_docs]
+                if rare:
+                    rows = rare
+            if not rows:
+                return []
+
+            weights = [
+                (term_id, math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * q_terms[term])
+                for term, term_id, df in rows
+            ]
+            values = ",".join("(?, ?)" for _ in weights)
+            params = [x for pair in weights for x in pair]
+            top = conn.execute(
+                f"WITH q (term_id, weight) AS (VALUES {values}) "
+                "SELECT d.doc_id, SUM(q.weight * p.tf * ? / (p.tf + ? * (? + ? * d.length))) AS score "
+                "FROM q JOIN postings p ON p.term_id = q.term_id JOIN docs d ON d.doc_no = p.doc_no "
+                "GROUP BY p.doc_no ORDER BY score DESC, p.doc_no LIMIT ?",
+                params + [BM25_K1 + 1, BM25_K1, 1 - BM25_B, BM25_B / avgdl, k],
+            ).fetchall()
+        return [(doc_id, score) for doc_id, score in top]
+
+
+def get_index() -> BM25Index:
+    global _index
+    if _index is None:
+        _index = BM25Index(settings.RAG_BM25_INDEX_PATH)
+    return _index
+
+
+def index_documents(ids, documents):
+    get_index().index_documents(ids, documents)
+
+
+def remove_documents(ids):
+    get_index().remove_documents(ids)
+
+
+def search(query: str, k: int = 8) -> list[tuple[str, float]]:
+    return get_index().search(query, k)
@@ -0,0 +1,179 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+
+class SQLiteCache:
+    """
+    Key-value cache persisten (SQLite) dengan batas jumlah entry (LRU) dan TTL opsional.
+    Value disimpan sebagai bytes; serialisasi diurus pemanggil.
+    Aman dipakai lintas thread dan lintas proses (gunicorn worker, ingest command, worker
+    enrichment berbagi file yang sama): jumlah entry disimpan di tabel meta dan diubah dalam
+    transaksi yang sama dengan insert/delete, bukan dihitung per proses.
+    """
+
+    def __init__(self, path, max_entries: int = 100_000, ttl_seconds: Optional[float] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            with self._transaction(conn):
+                # file cache lama (sebelum ada tabel meta): hitung sekali saat pertama dibuka
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) SELECT 'count', COUNT(*) FROM cache")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    @contextmanager
+    def _transaction(conn):
+        """
+        BEGIN IMMEDIATE (kunci tulis diambil di awal, supaya hitungan entry konsisten antar proses);
+        ROLLBACK bila gagal, sehingga koneksi tidak tertinggal di dalam transaksi terbuka.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _add_count(conn, delta: int):
+        if delta:
+            conn.execute("UPDATE meta SET value = value + ? WHERE key = 'count'", (delta,))
+
+    @staticmethod
+    def _read_count(conn) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0]
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, bytes]:
+        """
+        Return dict key → value untuk key yang ada (dan belum kedaluwarsa).
+        """
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        if not unique:
+            return found
+
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            expired = []
+            # batas parameter SQLite
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value, created_at FROM cache WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self._expired(created_at, now):
+                        expired.append(key)
+                    else:
+                        found[key] = value
+
+            if found or expired:
+                with self._transaction(conn):
+                    if found:
+                        conn.executemany("UPDATE cache SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                    if expired:
+                        # proses lain bisa saja sudah menghapusnya: hitung yang benar-benar terhapus
+                        before = conn.total_changes
+                        conn.executemany("DELETE FROM cache WHERE key = ?", [(k,) for k in expired])
+                        self._add_count(conn, -(conn.total_changes - before))
+
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes):
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]):
+        items = list(items)
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            with self._transaction(conn):
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    [(k, v, now, now) for k, v in items],
+                )
+                inserted = conn.total_changes - before
+                conn.executemany(
+                    "UPDATE cache SET value = ?, created_at = ?, last_used = ? WHERE key = ?",
+                    [(v, now, now, k) for k, v in items],
+                )
+                self._add_count(conn, inserted)
+                self._evict(conn)
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._get_conn()
+            with self._transaction(conn):
+                cur = conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._add_count(conn, -cur.rowcount)
+
+    def _evict(self, conn):
+        """
+        Buang entry paling lama tidak dipakai sampai jumlah entry ≤ 90% kapasitas,
+        supaya eviction tidak terjadi di setiap set. Dipanggil di dalam transaksi set_many.
+        """
+        count = self._read_count(conn)
+        if count <= self.max_entries:
+            return
+        target = int(self.max_entries * 0.9)
+        cur = conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used ASC LIMIT ?)",
+            (count - target,),
+        )
+        self.evictions += cur.rowcount
+        self._add_count(conn, -cur.rowcount)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._read_count(self._get_conn())
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "max_entries": self.max_entries,
+            }
@@ -1,14 +1,26 @@
-import chromadb
-from chromadb.config import Settings
+import sqlite3
+import threading
+from pathlib import Path
+
 from django.conf import settings
 
 _client = None
 _collection = None
 
+# generation collection: naik setiap kali isi collection berubah (upsert/delete).
+# Disimpan di SQLite (RAG_GENERATION_PATH) supaya perubahan dari proses lain
+# (rag_ingest_folder, rag_enrich_worker, worker gunicorn lain) ikut membatalkan cache retrieval.
+_generation_conn = None
+_generation_lock = threading.Lock()
+
 
 def get_client():
     global _client
     if _client is None:
+        # import chromadb mahal (~detik); ditunda sampai collection benar-benar dipakai
+        import chromadb
+        from chromadb.config import Settings
+
         _client = chromadb.PersistentClient(
             path=str(settings.CHROMA_PERSIST_PATH),
             settings=Settings(anonymized_telemetry=False),
@@ -22,3 +34,108 @@ def get_collection():
         client = get_client()
         _collection = client.get_or_create_collection(name=settings.RAG_COLLECTION)
     return _collection
+
+
+def _get_generation_conn():
+    global _generation_conn
+    if _generation_conn is None:
+        path = Path(settings.RAG_GENERATION_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS generation (collection TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        _generation_conn = conn
+    return _generation_conn
+
+
+def get_generation() -> int:
+    with _generation_lock:
+        row = _get_generation_conn().execute(
+            "SELECT value FROM generation WHERE collection = ?", (settings.RAG_COLLECTION,)
+        ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation() -> int:
+    with _generation_lock:
+        conn = _get_generation_conn()
+        conn.execute(
+            "INSERT INTO generation (collection, value) VALUES (?, 1) "
+            "ON CONFLICT (collection) DO UPDATE SET value = value + 1",
+            (settings.RAG_COLLECTION,),
+        )
+        return conn.execute(
+            "SELECT value FROM generation WHERE collection = ?", (settings.RAG_COLLECTION,)
+        ).fetchone()[0]
+
+
+def upsert_chunks(ids, documents, metadatas, embeddings):
+    """
+    Satu-satunya jalur tulis chunk ke collection (supaya generation selalu naik).
+    """
+    get_collection().upsert(
+        ids=ids,
+        documents=documents,
+        metadatas=metadatas,
+        embeddings=embeddings,
+    )
+    if settings.RAG_BM25_ENABLED:
+        from . import bm25_index
+
+        bm25_index.index_documents(ids, documents)
+    if settings.RAG_DEDUP_MODE in ("skip", "link"):
+        from . import dedup
+
+        # signature baru masuk index dedup setelah chunk benar-benar tersimpan
+        dedup.register_chunks(ids, documents, metadatas)
+    generation = bump_generation()
+    if settings.RAG_RETRIEVAL_ENGINE == "numpy":
+        from . import vector_mirror
+
+        # mirror mencatat generation ini sebagai miliknya; generation lain = tulisan proses lain
+        vector_mirror.sync_upsert(ids, documents, metadatas, embeddings, generation)
+
+
+def delete_chunks(ids):
+    if not ids:
+        return
+    get_collection().delete(ids=ids)
+    if settings.RAG_BM25_ENABLED:
+        from . import bm25_index
+
+        bm25_index.remove_documents(ids)
+    orphans = []
+    if settings.RAG_DEDUP_MODE in ("skip", "link"):
+        from . import dedup
+
+        orphans = dedup.remove_chunks(ids)
+    generation = bump_generation()
+    if settings.RAG_RETRIEVAL_ENGINE == "numpy":
+        from . import vector_mirror
+
+        vector_mirror.sync_remove(ids, generation)
+    if orphans:
+        from .pdf_ingest import restore_duplicates
+
+        # near-duplicate yang chunk kanoniknya baru dihapus di-ingest ulang dari teks yang tersimpan
+        restore_duplicates(orphans)
+
+
+_answer_collection = None
+
+
+def get_answer_collection():
+    """
+    Index vektor kecil khusus konsultasi yang sudah dijawab (untuk reuse jawaban).
+    Memakai cosine supaya distance = 1 - similarity.
+    """
+    global _answer_collection
+    if _answer_collection is None:
+        client = get_client()
+        _answer_collection = client.get_or_create_collection(
+            name=settings.RAG_ANSWER_COLLECTION,
+            metadata={"hnsw:space": "cosine"},
+        )
+    return _answer_collection
@@ -0,0 +1,138 @@
+"""
+Representasi embedding kompak untuk mirror in-memory (Chroma tetap menyimpan float32 penuh).
+
+- proyeksi PCA ke dimensi lebih kecil, di-fit dari embedding korpus dan disimpan
+  di samping collection (RAG_PROJECTION_PATH, .npz)
+- kuantisasi int8 per vektor: x ≈ codes * scale, scale = max|x| / 127
+
+Proyeksi sengaja TIDAK di-center: embedding MiniLM berbagi komponen bersama yang besar,
+dan mengurangi rata-rata korpus mengubah geometri cosine/L2 (distance jadi sistematis lebih
+besar, sehingga RAG_GATING_MAX_DISTANCE tidak lagi berlaku). Basis diambil dari SVD data mentah
+(aproksimasi rank-k terbaik untuk dot product), lalu hasil proyeksi dinormalisasi ulang supaya
+distance tetap di skala float32 penuh. Selisihnya dilaporkan rag_eval_compact (top1_dist_err).
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Projection:
+    def __init__(self, components: np.ndarray):
+        self.components = np.asarray(components, dtype=np.float32)  # (dim_out × dim_in)
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, embs: np.ndarray, dim: int) -> "Projection":
+        embs = np.asarray(embs, dtype=np.float32)
+        if dim >= embs.shape[1]:
+            raise ValueError(f"dimensi proyeksi {dim} harus < dimensi embedding {embs.shape[1]}")
+        # SVD tanpa centering: baris vt = arah energi terbesar, termasuk komponen bersama korpus
+        _, _, vt = np.linalg.svd(embs, full_matrices=False)
+        return cls(vt[:dim])
+
+    def apply(self, embs: np.ndarray) -> np.ndarray:
+        out = np.asarray(embs, dtype=np.float32) @ self.components.T
+        norms = np.linalg.norm(out, axis=-1, keepdims=True)
+        return (out / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(f, components=self.components)
+
+    @classmethod
+    def load(cls, path) -> "Projection":
+        with np.load(path) as data:
+            if "mean" in data.files:
+                raise ValueError("proyeksi tersimpan masih versi ter-center; perlu di-fit ulang")
+            return cls(data["components"])
+
+
+def quantize_int8(embs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return (codes int8 N × D, scales float32 N).
+    """
+    embs = np.asarray(embs, dtype=np.float32)
+    scales = np.abs(embs).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(embs / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class Codec:
+    """
+    Transformasi embedding float32 → baris yang disimpan mirror (float32 atau int8 + scale).
+    """
+
+    def __init__(self, projection: Projection | None = None, int8: bool = False):
+        self.projection = projection
+        self.int8 = int8
+
+    @property
+    def label(self) -> str:
+        parts = [f"pca{self.projection.dim}"] if self.projection else []
+        parts.append("int8" if self.int8 else "float32")
+        return "+".join(parts)
+
+    def encode_query(self, q) -> np.ndarray:
+        q = np.asarray(q, dtype=np.float32)
+        return self.projection.apply(q) if self.projection else q
+
+    def encode(self, embs) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (rows, scales). Untuk float32, scales = 1.
+        """
+        embs = np.asarray(embs, dtype=np.float32)
+        if self.projection:
+            embs = self.projection.apply(embs)
+        if self.int8:
+            return quantize_int8(embs)
+        return embs, np.ones(len(embs), dtype=np.float32)
+
+    def bytes_per_vector(self, dim_in: int) -> int:
+        dim = self.projection.dim if self.projection else dim_in
+        return dim + 4 if self.int8 else dim * 4
+
+
+def load_projection(fit_from: np.ndarray | None = None) -> Projection | None:
+    """
+    Proyeksi sesuai RAG_EMBED_PCA_DIM. Dibaca dari RAG_PROJECTION_PATH; jika belum ada
+    (atau dimensinya beda) dan fit_from diberikan, di-fit lalu disimpan.
+    """
+    dim = settings.RAG_EMBED_PCA_DIM
+    if not dim:
+        return None
+
+    path = Path(settings.RAG_PROJECTION_PATH)
+    if path.exists():
+        try:
+            projection = Projection.load(path)
+        except ValueError as e:
+            logger.info(f"[COMPACT] {e} ({path})")
+        else:
+            if projection.dim == dim:
+                return projection
+            logger.info(f"[COMPACT] proyeksi tersimpan dim={projection.dim} != RAG_EMBED_PCA_DIM={dim}, fit ulang")
+
+    if fit_from is None:
+        return None
+    if len(fit_from) <= dim:
+        logger.warning("[COMPACT] data belum cukup untuk fit proyeksi PCA; pakai dimensi penuh")
+        return None
+
+    projection = Projection.fit(fit_from, dim)
+    projection.save(path)
+    logger.info(f"[COMPACT] proyeksi PCA dim={dim} di-fit dari {len(fit_from)} vektor → {path}")
+    return projection
+
+
+def get_codec(fit_from: np.ndarray | None = None) -> Codec:
+    return Codec(projection=load_projection(fit_from), int8=settings.RAG_EMBED_COMPACT == "int8")
@@ -0,0 +1,379 @@
+"""
+Deteksi chunk near-duplicate saat ingest (MinHash + LSH, index SQLite di samping Chroma store).
+
+Guideline WHO/UNICEF yang sama sering masuk lewat PMC, OpenAlex, Semantic Scholar dan
+folder manual dengan rendering PDF sedikit berbeda. Chunk yang hampir identik dengan chunk
+dokumen lain (estimasi Jaccard shingle kata ≥ RAG_DEDUP_THRESHOLD) tidak di-embed ulang:
+- RAG_DEDUP_MODE="skip": chunk dilewati
+- RAG_DEDUP_MODE="link": chunk dilewati dan ditandai sebagai alias chunk kanonik (linked())
+
+Alur tulis (index hanya berisi chunk yang benar-benar ada di Chroma):
+1. partition(): read-only, memisahkan kandidat unik dan near-duplicate
+2. add(): signature chunk unik didaftarkan setelah upsert Chroma berhasil (hook di upsert_chunks)
+3. record(): chunk duplikat disimpan (teks + metadata) setelah batch-nya tertulis
+4. remove(): chunk yang dihapus dari Chroma dilepas; duplikat yang chunk kanoniknya ikut
+   terhapus dikembalikan ke pemanggil supaya di-ingest ulang (lihat pdf_ingest.restore_duplicates)
+
+Skema ringkas:
+- signatures: chunk_id → paper_id, file_hash, signature MinHash (NUM_PERM × uint32)
+- bands:      (band, bucket, chunk_id) WITHOUT ROWID; kandidat = chunk dengan bucket sama di band mana pun
+- duplicates: chunk duplikat → chunk kanonik, similarity, teks + metadata (untuk dipulihkan)
+- stats:      counter kumulatif (chunk dicek, duplikat, karakter yang tidak di-embed)
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS  # 4 baris per band → peluang jadi kandidat >99% pada Jaccard 0.7
+SHINGLE_WORDS = 5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# koefisien permutasi tetap (signature harus stabil lintas proses dan restart)
+_rng = np.random.RandomState(20240601)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+_WORD_RE = re.compile(r"\w+")
+
+_index = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    chunk_id  TEXT PRIMARY KEY,
+    paper_id  TEXT,
+    file_hash TEXT,
+    sig       BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    band     INTEGER NOT NULL,
+    bucket   INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bands_chunk ON bands (chunk_id);
+CREATE TABLE IF NOT EXISTS duplicates (
+    chunk_id     TEXT PRIMARY KEY,
+    canonical_id TEXT NOT NULL,
+    paper_id     TEXT,
+    similarity   REAL NOT NULL,
+    linked       INTEGER NOT NULL,
+    document     TEXT NOT NULL,
+    metadata     TEXT NOT NULL,
+    recorded_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS duplicates_canonical ON duplicates (canonical_id);
+CREATE TABLE IF NOT EXISTS stats (
+    key   TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+INSERT OR IGNORE INTO stats (key, value) VALUES
+    ('checked', 0), ('duplicates', 0), ('chars_checked', 0), ('chars_skipped', 0);
+"""
+
+
+def _shingles(text: str) -> np.ndarray:
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) <= SHINGLE_WORDS:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def minhash(text: str) -> np.ndarray:
+    """
+    Signature MinHash (NUM_PERM,) uint32 dari shingle SHINGLE_WORDS kata (lowercase).
+    """
+    hashes = _shingles(text)
+    # (a·x + b) mod p, dipotong ke 32 bit; x < 2^32 dan a, b < 2^31 → tidak overflow uint64
+    perm = ((hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME) & _MAX_HASH
+    return perm.min(axis=0).astype(np.uint32)
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """
+    Estimasi Jaccard: porsi posisi signature yang sama.
+    """
+    return float(np.mean(sig_a == sig_b))
+
+
+def _buckets(sig: np.ndarray) -> list[int]:
+    out = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        out.append(int.from_bytes(digest, "big", signed=True))
+    return out
+
+
+class NearDuplicateIndex:
+    """
+    Satu file SQLite = satu index. Aman dipakai lintas thread dalam satu proses.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _get_conn(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _best_match(self, conn, sig, buckets, paper_id, file_hash):
+        """
+        Chunk kanonik paling mirip dari dokumen lain, atau None jika di bawah threshold.
+        Chunk dokumen yang sama (paper_id / file_hash sama) tidak dihitung: ingest ulang dengan
+        chunker baru tidak boleh menganggap versinya sendiri sebagai duplikat.
+        """
+        candidates = set()
+        for band, bucket in enumerate(buckets):
+            candidates.update(
+                r[0] for r in conn.execute("SELECT chunk_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket))
+            )
+        best = None
+        for chunk_id in candidates:
+            row = conn.execute(
+                "SELECT paper_id, file_hash, sig FROM signatures WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+            if row is None or (paper_id and row[0] == paper_id) or (file_hash and row[1] == file_hash):
+                continue
+            score = similarity(sig, np.frombuffer(row[2], dtype=np.uint32))
+            if score >= settings.RAG_DEDUP_THRESHOLD and (best is None or score > best[1]):
+                best = (chunk_id, score)
+        return best
+
+    def _add(self, conn, chunk_id, sig, buckets, paper_id, file_hash):
+        conn.execute("DELETE FROM bands WHERE chunk_id = ?", (chunk_id,))
+        conn.execute(
+            "INSERT OR REPLACE INTO signatures (chunk_id, paper_id, file_hash, sig) VALUES (?, ?, ?, ?)",
+            (chunk_id, paper_id, file_hash, sig.tobytes()),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO bands (band, bucket, chunk_id) VALUES (?, ?, ?)",
+            [(band, bucket, chunk_id) for band, bucket in enumerate(buckets)],
+        )
+
+    def partition(self, ids, documents, metadatas) -> tuple[list[int], list[dict]]:
+        """
+        Pisahkan chunk unik dan near-duplicate tanpa menulis apa pun ke index.
+        Return (indeks chunk unik, [{"chunk_id", "canonical_id", "similarity", "document", "metadata"}, ...]).
+        """
+        sigs = [minhash(doc) for doc in documents]
+        keep, duplicates = [], []
+        with self._lock:
+            conn = self._get_conn()
+            for i, (chunk_id, doc, meta, sig) in enumerate(zip(ids, documents, metadatas, sigs)):
+                meta = meta or {}
+                match = self._best_match(conn, sig, _buckets(sig), meta.get("paper_id"), meta.get("file_hash"))
+                if match is None:
+                    keep.append(i)
+                    continue
+                duplicates.append(
+                    {
+                        "chunk_id": chunk_id,
+                        "canonical_id": match[0],
+                        "similarity": match[1],
+                        "document": doc,
+                        "metadata": meta,
+                    }
+                )
+        return keep, duplicates
+
+    def add(self, ids, documents, metadatas):
+        """
+        Daftarkan chunk yang sudah tertulis di Chroma (hook upsert_chunks, rebuild).
+        """
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            try:
+                for chunk_id, doc, meta in zip(ids, documents, metadatas):
+                    meta = meta or {}
+                    sig = minhash(doc)
+                    self._add(conn, chunk_id, sig, _buckets(sig), meta.get("paper_id"), meta.get("file_hash"))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def record(self, duplicates, checked: int, chars_checked: int, link: bool = False) -> list[dict]:
+        """
+        Simpan chunk duplikat hasil partition() setelah batch-nya selesai ditulis, dan
+        perbarui statistik. Duplikat yang chunk kanoniknya sudah tidak ada di index
+        (terhapus di antara partition dan record) tidak disimpan tapi dikembalikan,
+        supaya pemanggil meng-embed-nya sebagai chunk biasa.
+        """
+        orphans = []
+        recorded_chars = 0
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            try:
+                for dup in duplicates:
+                    exists = conn.execute(
+                        "SELECT 1 FROM signatures WHERE chunk_id = ?", (dup["canonical_id"],)
+                    ).fetchone()
+                    if exists is None:
+                        orphans.append(dup)
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO duplicates "
+                        "(chunk_id, canonical_id, paper_id, similarity, linked, document, metadata, recorded_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            dup["chunk_id"],
+                            dup["canonical_id"],
+                            (dup["metadata"] or {}).get("paper_id"),
+                            dup["similarity"],
+                            int(link),
+                            dup["document"],
+                            json.dumps(dup["metadata"] or {}),
+                            time.time(),
+                        ),
+                    )
+                    recorded_chars += len(dup["document"])
+                conn.executemany(
+                    "UPDATE stats SET value = value + ? WHERE key = ?",
+                    [
+                        (checked, "checked"),
+                        (len(duplicates) - len(orphans), "duplicates"),
+                        (chars_checked, "chars_checked"),
+                        (recorded_chars, "chars_skipped"),
+                    ],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return orphans
+
+    def remove(self, ids) -> list[dict]:
+        """
+        Hapus chunk dari index (signature dan catatan duplikatnya sendiri).
+        Return duplikat yang chunk kanoniknya ikut terhapus: catatannya dilepas dan
+        dikembalikan sebagai {"chunk_id", "document", "metadata"} untuk di-ingest ulang.
+        """
+        ids = list(ids)
+        if not ids:
+            return []
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            try:
+                params = [(i,) for i in ids]
+                conn.executemany("DELETE FROM bands WHERE chunk_id = ?", params)
+                conn.executemany("DELETE FROM signatures WHERE chunk_id = ?", params)
+                conn.executemany("DELETE FROM duplicates WHERE chunk_id = ?", params)
+                orphans = self._pop_orphans(conn, "canonical_id = ?", params)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return orphans
+
+    def orphaned(self) -> list[dict]:
+        """
+        Lepas dan kembalikan duplikat yang chunk kanoniknya tidak ada di index (mis. setelah rebuild).
+        """
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN")
+            try:
+                orphans = self._pop_orphans(
+                    conn, "canonical_id NOT IN (SELECT chunk_id FROM signatures)", [()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return orphans
+
+    def _pop_orphans(self, conn, where: str, params) -> list[dict]:
+        orphans = []
+        for p in params:
+            rows = conn.execute(f"SELECT chunk_id, document, metadata FROM duplicates WHERE {where}", p).fetchall()
+            conn.executemany("DELETE FROM duplicates WHERE chunk_id = ?", [(r[0],) for r in rows])
+            orphans.extend({"chunk_id": r[0], "document": r[1], "metadata": json.loads(r[2])} for r in rows)
+        return orphans
+
+    def clear(self):
+        """
+        Kosongkan signature (rebuild). Catatan duplikat dipertahankan: teksnya tidak ada di Chroma.
+        """
+        with self._lock:
+            conn = self._get_conn()
+            conn.executescript("DELETE FROM bands; DELETE FROM signatures;")
+
+    def linked(self, canonical_id: str) -> list[dict]:
+        """
+        Chunk dokumen lain yang di-link ke chunk kanonik ini (provenance tambahan, mode link).
+        """
+        with self._lock:
+            rows = self._get_conn().execute(
+                "SELECT chunk_id, paper_id, similarity FROM duplicates WHERE canonical_id = ? AND linked = 1",
+                (canonical_id,),
+            ).fetchall()
+        return [{"chunk_id": r[0], "paper_id": r[1], "similarity": r[2]} for r in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._get_conn()
+            stats = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+            stats["indexed"] = conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            stats["recorded_duplicates"] = conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+            stats["links"] = conn.execute("SELECT COUNT(*) FROM duplicates WHERE linked = 1").fetchone()[0]
+        for key in ("checked", "duplicates", "chars_checked", "chars_skipped"):
+            stats[key] = int(stats.get(key, 0))
+        stats["duplicate_rate"] = (stats["duplicates"] / stats["checked"]) if stats["checked"] else 0.0
+        return stats
+
+
+def get_index() -> NearDuplicateIndex:
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex(settings.RAG_DEDUP_INDEX_PATH)
+    return _index
+
+
+def enabled() -> bool:
+    return settings.RAG_DEDUP_MODE in ("skip", "link")
+
+
+def partition(ids, documents, metadatas) -> tuple[list[int], list[dict]]:
+    return get_index().partition(ids, documents, metadatas)
+
+
+def register_chunks(ids, documents, metadatas):
+    get_index().add(ids, documents, metadatas)
+
+
+def record_duplicates(duplicates, checked: int, chars_checked: int) -> list[dict]:
+    return get_index().record(duplicates, checked, chars_checked, link=settings.RAG_DEDUP_MODE == "link")
+
+
+def remove_chunks(ids) -> list[dict]:
+    return get_index().remove(ids)
+
+
+def dedup_stats() -> dict:
+    return get_index().stats() if enabled() else {}
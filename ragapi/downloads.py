@@ -0,0 +1,121 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# content-type yang masih mungkin berisi PDF; sisanya (text/html, dsb.) langsung ditolak
+PDF_CONTENT_TYPES = {
+    "application/pdf",
+    "application/x-pdf",
+    "application/octet-stream",
+    "binary/octet-stream",
+    "application/download",
+    "application/force-download",
+}
+_MAGIC_WINDOW = 1024  # spesifikasi PDF: header %PDF boleh muncul dalam 1024 byte pertama
+
+
+class PDFDownloadError(Exception):
+    pass
+
+
+def new_download_client(concurrency: int | None = None) -> httpx.Client:
+    concurrency = concurrency or settings.RAG_DOWNLOAD_CONCURRENCY
+    return httpx.Client(
+        timeout=60,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    )
+
+
+def _check_content_type(r: httpx.Response):
+    content_type = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type and content_type not in PDF_CONTENT_TYPES:
+        raise PDFDownloadError(f"bukan PDF (content-type={content_type})")
+
+
+def download_pdf(url: str, out_path: str, client: httpx.Client | None = None, max_bytes: int | None = None) -> int:
+    """
+    Unduh PDF secara streaming ke disk (tidak pernah memegang seluruh isi di memori).
+    Batal lebih awal jika content-type bukan PDF, header %PDF tidak ada,
+    atau ukuran melewati max_bytes. Return jumlah byte yang ditulis.
+    """
+    if max_bytes is None:
+        max_bytes = settings.RAG_PDF_MAX_BYTES
+
+    own_client = client is None
+    if own_client:
+        client = new_download_client(1)
+
+    written = 0
+    try:
+        with client.stream("GET", url) as r:
+            r.raise_for_status()
+            _check_content_type(r)
+
+            length = r.headers.get("content-length")
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise PDFDownloadError(f"ukuran {int(length)} byte melebihi batas {max_bytes}")
+
+            head = b""
+            with open(out_path, "wb") as f:
+                for block in r.iter_bytes(64 * 1024):
+                    if len(head) < _MAGIC_WINDOW:
+                        head += block[:_MAGIC_WINDOW]
+                        if len(head) >= _MAGIC_WINDOW and b"%PDF" not in head[:_MAGIC_WINDOW]:
+                            raise PDFDownloadError("header %PDF tidak ditemukan")
+
+                    written += len(block)
+                    if written > max_bytes:
+                        raise PDFDownloadError(f"ukuran melebihi batas {max_bytes} byte")
+                    f.write(block)
+
+            if b"%PDF" not in head[:_MAGIC_WINDOW]:
+                raise PDFDownloadError("header %PDF tidak ditemukan")
+    except BaseException:
+        metrics.inc("downloads", status="error")
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+    finally:
+        # byte yang sudah ditransfer tetap dihitung walau unduhan dibatalkan
+        metrics.inc("download_bytes", written)
+        if own_client:
+            client.close()
+
+    metrics.inc("downloads", status="ok")
+    return written
+
+
+def download_pdfs(items, concurrency: int | None = None, max_bytes: int | None = None):
+    """
+    Unduh banyak PDF bersamaan (dibatasi concurrency) lewat satu connection pool.
+    items: iterable (key, url, out_path)
+    Generator: yield (key, out_path, error) segera setelah tiap file selesai,
+    jadi pemanggil bisa langsung ingest tanpa menunggu unduhan lain.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    concurrency = concurrency or settings.RAG_DOWNLOAD_CONCURRENCY
+    with new_download_client(concurrency) as client, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(download_pdf, url, out_path, client, max_bytes): (key, url, out_path)
+            for key, url, out_path in items
+        }
+        for fut in as_completed(futures):
+            key, url, out_path = futures[fut]
+            try:
+                size = fut.result()
+                logger.info(f"[DOWNLOAD] {url} → {size} bytes")
+                yield key, out_path, None
+            except Exception as e:
+                logger.warning(f"[DOWNLOAD] {url} failed: {type(e).__name__}: {e}")
+                yield key, out_path, e
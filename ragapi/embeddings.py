@@ -1,8 +1,23 @@
 from __future__ import annotations
 
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
 from typing import Optional, Sequence, List
 
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .cache_store import SQLiteCache
+
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
 _MODEL = None
+_CACHE: Optional[SQLiteCache] = None
 _DEVICE_LABEL: Optional[str] = None
 _DEVICE_NAME: Optional[str] = None  # "cuda" atau "cpu"
 
@@ -24,22 +39,44 @@ def _detect_device():
     return "cpu", "cpu"
 
 
+def backend_tag() -> str:
+    """
+    "torch" (SentenceTransformer), "onnx" atau "onnx-int8" sesuai RAG_EMBED_BACKEND / RAG_ONNX_QUANTIZE.
+    """
+    if settings.RAG_EMBED_BACKEND == "onnx":
+        return "onnx-int8" if settings.RAG_ONNX_QUANTIZE else "onnx"
+    return "torch"
+
+
 def get_device_info() -> str:
     """
-    Untuk logging: 'cuda (NVIDIA GeForce ...)' atau 'cpu'
+    Untuk logging: 'cuda (NVIDIA GeForce ...)', 'cpu' atau 'onnx-cpu (threads=..)'
     """
     global _DEVICE_LABEL, _DEVICE_NAME
+    if settings.RAG_EMBED_BACKEND == "onnx":
+        threads = settings.RAG_ONNX_THREADS or "auto"
+        return f"{backend_tag()}-cpu (threads={threads})"
     if _DEVICE_LABEL is None or _DEVICE_NAME is None:
         _DEVICE_NAME, _DEVICE_LABEL = _detect_device()
     return _DEVICE_LABEL
 
 
-def get_embedder(model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+def get_embedder(model_name: str = EMBED_MODEL_NAME):
     """
-    Lazy-load SentenceTransformer dan cache di proses.
+    Lazy-load SentenceTransformer (atau OnnxEmbedder bila RAG_EMBED_BACKEND=onnx) dan cache di proses.
     """
     global _MODEL, _DEVICE_LABEL, _DEVICE_NAME
 
+    if _MODEL is None and settings.RAG_EMBED_BACKEND == "onnx":
+        from .onnx_embedder import OnnxEmbedder
+
+        _MODEL = OnnxEmbedder(
+            settings.RAG_ONNX_MODEL_DIR,
+            quantized=settings.RAG_ONNX_QUANTIZE,
+            threads=settings.RAG_ONNX_THREADS,
+        )
+        _DEVICE_NAME, _DEVICE_LABEL = "cpu", get_device_info()
+
     if _MODEL is None:
         # lazy import supaya startup Django cepat
         from sentence_transformers import SentenceTransformer
@@ -52,14 +89,44 @@ def get_embedder(model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
     return _MODEL
 
 
-def embed(
-    texts: Sequence[str],
-    show_progress: bool = False,
-    batch_size: Optional[int] = None,
-) -> List[List[float]]:
+def loaded_embedder():
     """
-    Buat embeddings normalized untuk list teks.
+    Embedder yang sudah dimuat di proses ini, atau None. Tidak memicu pemuatan model.
+    """
+    return _MODEL
+
+
+def get_embedding_cache() -> Optional[SQLiteCache]:
+    """
+    Cache embedding on-disk (SQLite, float32 bytes), None jika dimatikan.
     """
+    global _CACHE
+    if not settings.RAG_EMBED_CACHE_ENABLED:
+        return None
+    if _CACHE is None:
+        _CACHE = SQLiteCache(
+            Path(settings.RAG_CACHE_DIR) / "embeddings.sqlite3",
+            max_entries=settings.RAG_EMBED_CACHE_MAX_ENTRIES,
+        )
+    return _CACHE
+
+
+def embedding_cache_stats() -> dict:
+    cache = get_embedding_cache()
+    return cache.stats() if cache else {}
+
+
+def _cache_key(text: str, model_name: str = EMBED_MODEL_NAME, normalized: bool = True) -> str:
+    h = hashlib.sha256()
+    backend = backend_tag()
+    # backend torch tanpa tag supaya entry cache lama tetap terpakai
+    tag = "" if backend == "torch" else f"{backend}|"
+    h.update(f"{model_name}|{tag}norm={int(normalized)}|".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _encode(texts: List[str], show_progress: bool, batch_size: Optional[int]) -> np.ndarray:
     model = get_embedder()
 
     global _DEVICE_NAME, _DEVICE_LABEL
@@ -67,12 +134,176 @@ def embed(
         _DEVICE_NAME, _DEVICE_LABEL = _detect_device()
 
     if batch_size is None:
-        batch_size = 64 if _DEVICE_NAME == "cuda" else 16
+        if settings.RAG_EMBED_BACKEND == "onnx":
+            batch_size = settings.RAG_ONNX_BATCH_SIZE
+        else:
+            batch_size = 64 if _DEVICE_NAME == "cuda" else 16
 
     vecs = model.encode(
-        list(texts),
+        texts,
         normalize_embeddings=True,
         batch_size=batch_size,
         show_progress_bar=show_progress,
     )
-    return [v.tolist() for v in vecs]
+    return np.asarray(vecs, dtype=np.float32)
+
+
+class EmbedScheduler:
+    """
+    Micro-batching: panggilan embed kecil yang datang bersamaan (mis. query dari banyak request)
+    dikumpulkan selama maks. window_ms atau sampai max_batch teks, lalu di-encode sekali.
+    Tiap pemanggil menunggu Future miliknya dan menerima potongan vektornya sendiri.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending = deque()  # (texts, future, enqueued_at)
+        self._thread = None
+        # metrik
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+        self.batch_sizes = {}  # ukuran batch (teks) → jumlah batch
+        self.delays_ms = deque(maxlen=1000)  # antre → mulai encode, per request
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        fut = Future()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="rag-embed-batcher", daemon=True)
+                self._thread.start()
+            self._pending.append((texts, fut, time.monotonic()))
+            self._cond.notify()
+        return fut.result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][2] + self.window
+            while sum(len(p[0]) for p in self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, size = [], 0
+            while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_batch):
+                item = self._pending.popleft()
+                batch.append(item)
+                size += len(item[0])
+            return batch, size
+
+    def _loop(self):
+        while True:
+            batch, size = self._take_batch()
+            started = time.monotonic()
+            unique = list(dict.fromkeys(t for texts, _, _ in batch for t in texts))
+            try:
+                vecs = _encode(unique, False, None)
+            except BaseException as e:
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+
+            row = {t: i for i, t in enumerate(unique)}
+            with self._cond:
+                self.batches += 1
+                self.texts += size
+                self.requests += len(batch)
+                self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+                self.delays_ms.extend((started - enqueued) * 1000 for _, _, enqueued in batch)
+            for texts, fut, _ in batch:
+                fut.set_result(vecs[[row[t] for t in texts]])
+
+    def stats(self) -> dict:
+        with self._cond:
+            delays = sorted(self.delays_ms)
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "avg_batch_size": (self.texts / self.batches) if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "queue_delay_ms_p50": delays[len(delays) // 2] if delays else 0.0,
+                "queue_delay_ms_p95": delays[int(len(delays) * 0.95)] if delays else 0.0,
+                "queue_delay_ms_max": delays[-1] if delays else 0.0,
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+            }
+
+
+_SCHEDULER: Optional[EmbedScheduler] = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_embed_scheduler() -> Optional[EmbedScheduler]:
+    global _SCHEDULER
+    if not settings.RAG_EMBED_BATCHING:
+        return None
+    if _SCHEDULER is None:
+        with _SCHEDULER_LOCK:
+            if _SCHEDULER is None:
+                _SCHEDULER = EmbedScheduler(settings.RAG_EMBED_BATCH_WINDOW_MS, settings.RAG_EMBED_MAX_BATCH)
+    return _SCHEDULER
+
+
+def embed_scheduler_stats() -> dict:
+    scheduler = get_embed_scheduler()
+    return scheduler.stats() if scheduler else {}
+
+
+def _encode_coalesced(texts: List[str], show_progress: bool, batch_size: Optional[int]) -> np.ndarray:
+    """
+    Permintaan kecil lewat scheduler (digabung dengan request lain); batch besar (ingest)
+    atau yang minta progress bar langsung di-encode.
+    """
+    scheduler = get_embed_scheduler()
+    if scheduler is None or show_progress or batch_size is not None or len(texts) >= scheduler.max_batch:
+        return _encode(texts, show_progress, batch_size)
+    return scheduler.submit(texts)
+
+
+def embed(
+    texts: Sequence[str],
+    show_progress: bool = False,
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    as_numpy: bool = False,
+) -> List[List[float]] | np.ndarray:
+    """
+    Buat embeddings normalized untuk list teks.
+    Teks yang sudah pernah di-embed diambil dari cache; hanya miss yang
+    di-encode (satu batch), lalu hasilnya digabung sesuai urutan input.
+    as_numpy=True → satu array float32 (N × D) tanpa konversi ke list Python
+    (jalur ingest: Chroma, BM25 dan mirror menerima array langsung).
+    """
+    texts = list(texts)
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        metrics.inc("texts_encoded", len(texts))
+        vecs = _encode_coalesced(texts, show_progress, batch_size)
+        return vecs if as_numpy else [v.tolist() for v in vecs]
+
+    keys = [_cache_key(t) for t in texts]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+
+    if missing:
+        metrics.inc("texts_encoded", len(missing))
+        vecs = _encode_coalesced(list(missing.values()), show_progress, batch_size)
+        fresh = {key: vec.tobytes() for key, vec in zip(missing.keys(), vecs)}
+        cache.set_many(fresh.items())
+        cached.update(fresh)
+
+    if as_numpy:
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([np.frombuffer(cached[key], dtype=np.float32) for key in keys])
+    return [np.frombuffer(cached[key], dtype=np.float32).tolist() for key in keys]
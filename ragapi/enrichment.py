@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EnrichmentJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def query_hash(query: str) -> str:
+    normalized = re.sub(r"\s+", " ", query).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RAG_ENRICH_WORKERS,
+                thread_name_prefix="rag-enrich",
+            )
+    return _executor
+
+
+def _lease_expired() -> Q:
+    """
+    Job running yang lease-nya (started_at + RAG_ENRICH_LEASE_SECONDS) habis: thread inline
+    mati bersama prosesnya atau rag_enrich_worker di-kill sebelum job selesai.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.RAG_ENRICH_LEASE_SECONDS)
+    return Q(status=EnrichmentJob.Status.RUNNING, started_at__lt=cutoff)
+
+
+def _abandoned() -> Q:
+    """
+    Job yang tidak akan jalan sendiri di worker inline: lease habis, atau pending
+    lebih lama dari lease (antrian thread pool hilang saat proses restart).
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.RAG_ENRICH_LEASE_SECONDS)
+    return _lease_expired() | Q(status=EnrichmentJob.Status.PENDING, created_at__lt=cutoff)
+
+
+def claimable_jobs():
+    """
+    Job yang boleh diambil worker: pending, atau running dengan lease kedaluwarsa.
+    """
+    return EnrichmentJob.objects.filter(Q(status=EnrichmentJob.Status.PENDING) | _lease_expired())
+
+
+def _submit(job_id: int):
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job_id))
+
+
+def enqueue_enrichment(query: str, max_papers: int = 3):
+    """
+    Daftarkan job autofetch+ingest. Jika job identik masih pending/running,
+    job itu yang dikembalikan (tidak dobel); job yang ditinggal worker-nya
+    diserahkan ulang ke worker inline.
+    Return: (job, created)
+    """
+    qh = query_hash(query)
+    active = [EnrichmentJob.Status.PENDING, EnrichmentJob.Status.RUNNING]
+
+    job = EnrichmentJob.objects.filter(query_hash=qh, status__in=active).first()
+    if job:
+        if settings.RAG_ENRICH_INLINE_WORKER and EnrichmentJob.objects.filter(_abandoned(), id=job.id).exists():
+            logger.warning(f"[ENRICH] Job {job.id} ({job.status}) ditinggal worker, dijalankan ulang")
+            _submit(job.id)
+        return job, False
+
+    try:
+        with transaction.atomic():
+            job = EnrichmentJob.objects.create(query_hash=qh, query=query, max_papers=max_papers)
+    except IntegrityError:
+        # kalah balapan dengan request lain yang mendaftarkan query yang sama
+        job = EnrichmentJob.objects.filter(query_hash=qh, status__in=active).first()
+        if job:
+            return job, False
+        raise
+
+    if settings.RAG_ENRICH_INLINE_WORKER:
+        _submit(job.id)
+    return job, True
+
+
+def _run_in_thread(job_id: int):
+    close_old_connections()
+    try:
+        run_enrichment_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def claim_job(job_id: int):
+    """
+    Pindahkan job pending (atau running dengan lease kedaluwarsa) → running secara atomik
+    (aman untuk banyak worker). Return started_at baru sebagai token lease, None jika gagal.
+    """
+    now = timezone.now()
+    updated = claimable_jobs().filter(id=job_id).update(
+        status=EnrichmentJob.Status.RUNNING,
+        started_at=now,
+    )
+    return now if updated == 1 else None
+
+
+def run_enrichment_job(job_id: int) -> EnrichmentJob | None:
+    lease = claim_job(job_id)
+    if lease is None:
+        return None
+
+    # import di sini supaya tidak circular (hybrid → enrichment)
+    from .hybrid import autofetch_oa_and_ingest
+
+    job = EnrichmentJob.objects.get(id=job_id)
+    logger.info(f"[ENRICH] Job {job.id} start")
+    try:
+        job.inserted_chunks = autofetch_oa_and_ingest(job.query, max_papers=job.max_papers)
+        job.status = EnrichmentJob.Status.DONE
+    except Exception as e:
+        logger.exception(f"[ENRICH] Job {job.id} failed")
+        job.status = EnrichmentJob.Status.FAILED
+        job.error = f"{type(e).__name__}: {e}"
+    job.finished_at = timezone.now()
+    # lease bisa sudah diklaim ulang worker lain (job dianggap mati); hasilnya tidak ditimpa
+    saved = EnrichmentJob.objects.filter(id=job.id, status=EnrichmentJob.Status.RUNNING, started_at=lease).update(
+        inserted_chunks=job.inserted_chunks,
+        status=job.status,
+        error=job.error,
+        finished_at=job.finished_at,
+    )
+    if not saved:
+        logger.warning(f"[ENRICH] Job {job.id} selesai setelah lease diklaim ulang; status tidak ditimpa")
+    logger.info(f"[ENRICH] Job {job.id} {job.status}, inserted_chunks={job.inserted_chunks}")
+    return job
@@ -2,15 +2,15 @@ def evidence_is_weak(hits, min_hits=4, dist_threshold=0.35, min_unique_papers=2)
     """
     Heuristik sederhana:
     - jika hits sedikit
-    - atau distance terbaik jelek (semakin kecil semakin mirip)
+    - atau distance terbaik (minimum) jelek (semakin kecil semakin mirip)
     - atau sumber unik terlalu sedikit
     """
     if not hits or len(hits) < min_hits:
         return True
 
-    best_dist = hits[0].get("distance", 1.0)
-    if best_dist is None:
-        best_dist = 1.0
+    # hasil hybrid diurutkan RRF, jadi hit pertama belum tentu yang distance-nya terbaik
+    dists = [h.get("distance") for h in hits if h.get("distance") is not None]
+    best_dist = min(dists) if dists else 1.0
     if best_dist > dist_threshold:
         return True
 
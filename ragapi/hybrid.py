@@ -1,16 +1,17 @@
 import os
 import tempfile
-import httpx
 import json
 
+from django.conf import settings
+
+from . import metrics
 from .retrieval import retrieve
 from .gating import evidence_is_weak
 from .pdf_ingest import upsert_pdf
-from .sources_pmc import pmc_search, pmc_fetch_summary
-from .sources_semantic_scholar import s2_search, s2_fetch_summary
-from .sources_openalex import openalex_search, openalex_fetch_summary
+from .downloads import download_pdfs
+from .providers import search_oa_metas
 from .prompts import system_prompt, build_context
-from .openrouter_client import chat
+from .openrouter_client import chat, chat_stream
 
 
 def build_retrieval_query(c) -> str:
@@ -31,14 +32,6 @@ def build_retrieval_query(c) -> str:
     )
 
 
-def _download_pdf(url: str, out_path: str):
-    with httpx.Client(timeout=60, follow_redirects=True) as client:
-        r = client.get(url)
-        r.raise_for_status()
-        with open(out_path, "wb") as f:
-            f.write(r.content)
-
-
 def _build_external_query(query: str, max_len: int = 400) -> str:
     """
     Batasi query untuk provider eksternal agar tidak terlalu panjang.
@@ -53,22 +46,26 @@ def autofetch_oa_and_ingest(query: str, max_papers: int = 3) -> int:
     On-demand: cari OA paper dari PMC/Semantic Scholar/OpenAlex → download PDF → ingest ke Chroma.
     """
     external_query = _build_external_query(query)
-    pmcids = pmc_search(external_query, retmax=max_papers)
-    metas = pmc_fetch_summary(pmcids)
-    metas += s2_fetch_summary(s2_search(external_query, limit=max_papers))
-    metas += openalex_fetch_summary(openalex_search(external_query, per_page=max_papers))
+    with metrics.span("autofetch.search"):
+        metas = search_oa_metas(external_query, max_papers=max_papers)
 
     inserted_total = 0
     with tempfile.TemporaryDirectory() as td:
-        for meta in metas:
-            pdf_url = meta.get("pdf_url")
-            if not pdf_url:
-                continue
+        # paper_id bisa berupa URL (OpenAlex), jadi nama file pakai indeks
+        items = [
+            (i, meta["pdf_url"], os.path.join(td, f"paper_{i}.pdf"))
+            for i, meta in enumerate(metas)
+            if meta.get("pdf_url")
+        ]
 
-            pdf_path = os.path.join(td, f"{meta['paper_id']}.pdf")
+        # ingest tiap file segera setelah unduhannya selesai;
+        # autofetch.download = waktu menunggu unduhan yang tidak tertutup oleh ingest
+        for i, pdf_path, error in metrics.timed_iter("autofetch.download", download_pdfs(items)):
+            if error is not None:
+                continue
             try:
-                _download_pdf(pdf_url, pdf_path)
-                inserted = upsert_pdf(pdf_path, paper_meta=meta)
+                with metrics.span("autofetch.ingest"):
+                    inserted = upsert_pdf(pdf_path, paper_meta=metas[i])
                 inserted_total += inserted
             except Exception:
                 # skip jika ada yang gagal
@@ -96,6 +93,11 @@ def _format_sources(hits):
         if source:
             parts.append(f"SOURCE:{source}")
 
+        page_start, page_end = m.get("page_start"), m.get("page_end")
+        if page_start:
+            pages = str(page_start) if not page_end or page_end == page_start else f"{page_start}-{page_end}"
+            parts.append(f"HAL:{pages}")
+
         pdf_url = m.get("pdf_url")
         landing_url = m.get("landing_url") or m.get("url")
         if pdf_url:
@@ -107,35 +109,74 @@ def _format_sources(hits):
     return "\n".join(lines)
 
 
-def answer_hybrid(c, k: int = 8):
+def _noop_stage(stage: str):
+    pass
+
+
+def _sources_suffix(hits) -> str:
+    sources = _format_sources(hits)
+    if not sources:
+        return ""
+    return f"\n\n### 4) Sumber (otomatis)\n{sources}"
+
+
+def prepare_answer(c, k: int = 8, on_stage=None) -> dict:
     """
-    Hybrid RAG:
-    1) retrieve dari Chroma
-    2) jika bukti lemah → autofetch OA PMC + ingest
-    3) retrieve ulang
-    4) LLM jawab grounded + sitasi
+    Tahap sebelum generasi: retrieval, gating, autofetch, dan penyusunan prompt.
+    Return dict: hits, did_autofetch, evidence_limited, enrichment_job_id, dan
+    messages (untuk LLM) atau answer (jawaban fallback jika CONTEXT kosong).
     """
+    on_stage = on_stage or _noop_stage
+
+    on_stage("retrieval")
     query = build_retrieval_query(c)
 
     hits = retrieve(query=query, k=k)
     did_autofetch = False
+    enrichment_job_id = None
+    mode = settings.RAG_AUTOFETCH_MODE
+
+    with metrics.span("answer.gating"):
+        weak = evidence_is_weak(hits)
 
-    if evidence_is_weak(hits):
-        inserted = autofetch_oa_and_ingest(query, max_papers=3)
+    if not weak:
+        metrics.inc("autofetch_decisions", decision="sufficient")
+    elif mode == "background":
+        from .enrichment import enqueue_enrichment
+
+        metrics.inc("autofetch_decisions", decision="queued")
+        job, _ = enqueue_enrichment(_build_external_query(query), max_papers=3)
+        enrichment_job_id = job.id
+    elif mode != "off":
+        metrics.inc("autofetch_decisions", decision="triggered")
+        on_stage("autofetch")
+        with metrics.span("answer.autofetch"):
+            inserted = autofetch_oa_and_ingest(query, max_papers=3)
         if inserted > 0:
             did_autofetch = True
             hits = retrieve(query=query, k=k)
+    else:
+        metrics.inc("autofetch_decisions", decision="disabled")
+
+    prepared = {
+        "hits": hits,
+        "did_autofetch": did_autofetch,
+        "evidence_limited": evidence_is_weak(hits),
+        "enrichment_job_id": enrichment_job_id,
+        "messages": None,
+        "answer": None,
+    }
 
     context = build_context(hits)
     if not context.strip():
-        answer = (
+        prepared["answer"] = (
             "Mohon maaf, informasi detail (CONTEXT) yang Anda lampirkan kosong. "
             "Berdasarkan aturan ketat yang diberikan, saya tidak dapat memberikan edukasi "
             "berdasarkan kutipan jurnal atau guideline spesifik karena informasi tidak ditemukan "
             "pada sumber yang tersedia.\n\n"
             "Silakan coba lagi setelah menambahkan sumber atau melakukan ingest dokumen."
         )
-        return {"answer": answer, "hits": hits, "did_autofetch": did_autofetch}
+        return prepared
 
     user_prompt = f"""
 DATA USER:
@@ -159,16 +200,88 @@ Catatan: sumber akan ditambahkan otomatis, tapi tetap gunakan [S#] pada klaim pe
 Jika CONTEXT tidak cukup, katakan 'tidak ditemukan pada sumber yang tersedia' dan sarankan langkah aman.
 """.strip()
 
-    answer = chat(
-        messages=[
-            {"role": "system", "content": system_prompt()},
-            {"role": "user", "content": user_prompt},
-        ],
-        max_tokens=1000,
-    )
+    prepared["messages"] = [
+        {"role": "system", "content": system_prompt()},
+        {"role": "user", "content": user_prompt},
+    ]
+    return prepared
 
-    sources = _format_sources(hits)
-    if sources:
-        answer = f"{answer}\n\n### 4) Sumber (otomatis)\n{sources}"
 
-    return {"answer": answer, "hits": hits, "did_autofetch": did_autofetch}
+def _result(prepared: dict, answer: str) -> dict:
+    return {
+        "answer": answer,
+        "hits": prepared["hits"],
+        "did_autofetch": prepared["did_autofetch"],
+        "evidence_limited": prepared["evidence_limited"],
+        "enrichment_job_id": prepared["enrichment_job_id"],
+    }
+
+
+def answer_hybrid(c, k: int = 8, on_stage=None, use_cache: bool = True):
+    """
+    Hybrid RAG:
+    1) retrieve dari Chroma
+    2) jika bukti lemah → autofetch OA PMC + ingest
+       (RAG_AUTOFETCH_MODE="background": masuk antrean, jawaban tidak menunggu)
+    3) retrieve ulang
+    4) LLM jawab grounded + sitasi
+    on_stage: callback opsional on_stage(nama_tahap) saat pipeline berpindah tahap
+    ("retrieval", "autofetch", "generation").
+    use_cache=False: paksa generasi ulang (lewati cache jawaban LLM).
+    """
+    on_stage = on_stage or _noop_stage
+    with metrics.span("answer.prepare"):
+        prepared = prepare_answer(c, k=k, on_stage=on_stage)
+    if prepared["messages"] is None:
+        return _result(prepared, prepared["answer"])
+
+    on_stage("generation")
+    with metrics.span("answer.generation"):
+        answer = chat(messages=prepared["messages"], max_tokens=1000, use_cache=use_cache)
+    answer = f"{answer}{_sources_suffix(prepared['hits'])}"
+    return _result(prepared, answer)
+
+
+def stream_answer_hybrid(c, k: int = 8, on_stage=None, use_cache: bool = True):
+    """
+    Versi streaming answer_hybrid. Generator event (nama, data):
+    - ("token", str)     potongan teks jawaban dari LLM
+    - ("sources", dict)  {"text": blok sumber [S#], "hits": [...meta...]}
+    - ("done", dict)     hasil lengkap (sama seperti answer_hybrid)
+    """
+    on_stage = on_stage or _noop_stage
+    with metrics.span("answer.prepare"):
+        prepared = prepare_answer(c, k=k, on_stage=on_stage)
+
+    if prepared["messages"] is None:
+        yield "token", prepared["answer"]
+        yield "done", _result(prepared, prepared["answer"])
+        return
+
+    on_stage("generation")
+    parts = []
+    for delta in chat_stream(messages=prepared["messages"], max_tokens=1000, use_cache=use_cache):
+        parts.append(delta)
+        yield "token", delta
+
+    suffix = _sources_suffix(prepared["hits"])
+    if suffix:
+        yield "sources", {"text": suffix, "hits": [h.get("meta") for h in prepared["hits"]]}
+
+    yield "done", _result(prepared, "".join(parts) + suffix)
+
+
+def stream_reused_answer(result: dict):
+    """
+    Urutan event stream_answer_hybrid untuk jawaban hasil reuse (lihat consultations.jobs.reuse_answer):
+    token (jawaban tanpa blok sumber) → sources → done.
+    """
+    answer = result["answer"] or ""
+    suffix = _sources_suffix(result.get("hits", []))
+    if suffix and answer.endswith(suffix):
+        answer = answer[: -len(suffix)]
+
+    yield "token", answer
+    if suffix:
+        yield "sources", {"text": suffix, "hits": [h.get("meta") for h in result.get("hits", [])]}
+    yield "done", result
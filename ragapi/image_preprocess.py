@@ -0,0 +1,88 @@
+import hashlib
+import io
+import logging
+from pathlib import Path
+
+from django.conf import settings
+
+from .cache_store import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_cache = None
+
+
+def _params():
+    fmt = str(settings.RAG_VISION_IMAGE_FORMAT).upper()
+    if fmt not in _MIME:
+        fmt = "JPEG"
+    return fmt, int(settings.RAG_VISION_MAX_EDGE), int(settings.RAG_VISION_IMAGE_QUALITY)
+
+
+def get_image_cache() -> SQLiteCache:
+    """
+    Cache hasil preprocess (LRU RAG_VISION_IMAGE_CACHE_MAX_ENTRIES + TTL RAG_VISION_IMAGE_CACHE_TTL).
+    """
+    global _cache
+    if _cache is None:
+        _cache = SQLiteCache(
+            Path(settings.RAG_CACHE_DIR) / "images.sqlite3",
+            max_entries=settings.RAG_VISION_IMAGE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RAG_VISION_IMAGE_CACHE_TTL,
+        )
+    return _cache
+
+
+def _cache_key(content: bytes, fmt: str, max_edge: int, quality: int) -> str:
+    return f"{hashlib.sha256(content).hexdigest()}-{fmt}-{max_edge}-q{quality}"
+
+
+def preprocess_image(content: bytes, content_type: str = "image/jpeg") -> tuple[bytes, str]:
+    """
+    Decode → EXIF orientation → perkecil sisi terpanjang ke RAG_VISION_MAX_EDGE
+    → encode ulang (JPEG/WebP, RAG_VISION_IMAGE_QUALITY).
+    Hasil di-cache (SQLite, LRU + TTL) berdasarkan hash isi gambar + parameter.
+    Jika Pillow tidak terpasang atau gambar gagal didecode, bytes asli dikembalikan.
+    Return: (bytes, content_type)
+    """
+    fmt, max_edge, quality = _params()
+    key = _cache_key(content, fmt, max_edge, quality)
+    cached = get_image_cache().get(key)
+    if cached is not None:
+        return cached, _MIME[fmt]
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return content, content_type
+
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            # gambar kecil, format sudah sesuai, tanpa rotasi EXIF → tidak perlu di-encode ulang
+            untouched = (
+                img.format == fmt
+                and max(img.size) <= max_edge
+                and img.getexif().get(0x0112, 1) == 1
+            )
+
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+            out = io.BytesIO()
+            img.save(out, format=fmt, quality=quality, optimize=True)
+            data = out.getvalue()
+    except Exception as e:
+        logger.warning(f"[VISION] preprocess gagal ({type(e).__name__}: {e}), pakai gambar asli")
+        return content, content_type
+
+    if untouched and len(data) >= len(content):
+        data = content
+
+    get_image_cache().set(key, data)
+
+    logger.info(f"[VISION] preprocess {len(content)} → {len(data)} bytes ({fmt}, max_edge={max_edge})")
+    return data, _MIME[fmt]
@@ -0,0 +1,103 @@
+"""
+Manifest ingest yang persisten (SQLite, disimpan di samping Chroma store).
+
+Satu baris per (file_hash, chunker): paper_id, source_key, jumlah chunk, jumlah halaman.
+Dipakai untuk melewati file yang tidak berubah tanpa parsing/embedding ulang.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_conn = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    file_hash   TEXT NOT NULL,
+    chunker     TEXT NOT NULL,
+    paper_id    TEXT,
+    source_key  TEXT,
+    chunk_count INTEGER NOT NULL,
+    pages       INTEGER,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (file_hash, chunker)
+);
+CREATE INDEX IF NOT EXISTS ingested_files_source ON ingested_files (paper_id, source_key);
+"""
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        path = Path(settings.RAG_INGEST_MANIFEST_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def lookup(file_hash: str, chunker: str) -> dict | None:
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT paper_id, source_key, chunk_count, pages, ingested_at "
+            "FROM ingested_files WHERE file_hash = ? AND chunker = ?",
+            (file_hash, chunker),
+        ).fetchone()
+    if not row:
+        return None
+    return {
+        "file_hash": file_hash,
+        "chunker": chunker,
+        "paper_id": row[0],
+        "source_key": row[1],
+        "chunk_count": row[2],
+        "pages": row[3],
+        "ingested_at": row[4],
+    }
+
+
+def stale_entries(paper_id: str | None, source_key: str | None, file_hash: str, chunker: str) -> list[dict]:
+    """
+    Versi lama dari dokumen yang sama (paper_id + source_key sama),
+    baik karena isi berubah maupun karena parameter chunking berubah.
+    """
+    if not paper_id or not source_key:
+        return []
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT file_hash, chunker, chunk_count FROM ingested_files "
+            "WHERE paper_id = ? AND source_key = ? AND NOT (file_hash = ? AND chunker = ?)",
+            (paper_id, source_key, file_hash, chunker),
+        ).fetchall()
+    return [{"file_hash": r[0], "chunker": r[1], "chunk_count": r[2]} for r in rows]
+
+
+def record(
+    file_hash: str,
+    chunker: str,
+    paper_id: str | None,
+    source_key: str | None,
+    chunk_count: int,
+    pages: int | None = None,
+):
+    with _lock:
+        _get_conn().execute(
+            "INSERT OR REPLACE INTO ingested_files "
+            "(file_hash, chunker, paper_id, source_key, chunk_count, pages, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_hash, chunker, paper_id, source_key, chunk_count, pages, time.time()),
+        )
+
+
+def forget(entries: list[dict]):
+    if not entries:
+        return
+    with _lock:
+        _get_conn().executemany(
+            "DELETE FROM ingested_files WHERE file_hash = ? AND chunker = ?",
+            [(e["file_hash"], e["chunker"]) for e in entries],
+        )
@@ -0,0 +1,226 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from ragapi.bench import DEFAULT_QUERIES, build_synthetic_corpus, isolated_store, latency_summary
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark end-to-end RAG di store Chroma sementara: ekstraksi PDF, chunking, embedding, "
+        "upsert, retrieval dan answer_hybrid (LLM + provider di-stub). Hasil ditulis ke JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pdf-dir", default=None, help="Folder PDF fixture (default: korpus sintetis)")
+        parser.add_argument("--docs", type=int, default=20, help="Jumlah PDF sintetis")
+        parser.add_argument("--pages", type=int, default=8, help="Halaman per PDF sintetis")
+        parser.add_argument("--batch-sizes", default="1,8,16,32,64", help="Ukuran batch embedding yang diuji")
+        parser.add_argument("--embed-sample", type=int, default=256, help="Jumlah chunk untuk benchmark embedding")
+        parser.add_argument("--ks", default="1,4,8,16", help="Nilai k untuk benchmark retrieval")
+        parser.add_argument("--repeat", type=int, default=10, help="Pengulangan per query")
+        parser.add_argument("--answers", type=int, default=10, help="Jumlah panggilan answer_hybrid")
+        parser.add_argument("--out", default=None, help="File JSON output (default: rag_bench_<waktu>.json)")
+
+    def handle(self, *args, **opts):
+        from ragapi.embeddings import backend_tag, get_device_info
+
+        started = datetime.now(timezone.utc)
+        report = {
+            "meta": {
+                "started_at": started.isoformat(),
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "embed_backend": backend_tag(),
+                "embed_device": get_device_info(),
+                "retrieval_mode": settings.RAG_RETRIEVAL_MODE,
+                "retrieval_engine": settings.RAG_RETRIEVAL_ENGINE,
+            },
+            "results": {},
+        }
+        results = report["results"]
+
+        with isolated_store() as tmp:
+            if opts["pdf_dir"]:
+                pdfs = sorted(Path(opts["pdf_dir"]).glob("*.pdf"))
+                if not pdfs:
+                    raise CommandError(f"Tidak ada PDF di {opts['pdf_dir']}")
+                report["meta"]["corpus"] = {"kind": "fixture", "path": opts["pdf_dir"], "files": len(pdfs)}
+            else:
+                pdfs = build_synthetic_corpus(tmp / "pdfs", opts["docs"], pages=opts["pages"])
+                report["meta"]["corpus"] = {"kind": "synthetic", "files": len(pdfs), "pages_per_file": opts["pages"]}
+
+            texts = self._bench_extract(pdfs, results)
+            chunks = self._bench_chunk(texts, results)
+            if not chunks:
+                raise CommandError("Korpus tidak menghasilkan chunk")
+            self._bench_embed(chunks, _ints(opts["batch_sizes"]), opts["embed_sample"], results)
+            self._bench_upsert(chunks, results)
+            self._bench_retrieve(_ints(opts["ks"]), opts["repeat"], results)
+            self._bench_answer(opts["answers"], results)
+
+        report["meta"]["elapsed_s"] = (datetime.now(timezone.utc) - started).total_seconds()
+        out = Path(opts["out"] or f"rag_bench_{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+        out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"DONE. Hasil ditulis ke {out}"))
+
+    def _bench_extract(self, pdfs, results):
+        from ragapi.pdf_ingest import iter_pdf_pages
+
+        texts, pages = [], 0
+        t0 = time.perf_counter()
+        for path in pdfs:
+            page_texts = [text for _, text in iter_pdf_pages(str(path), max_pages=None)]
+            pages += len(page_texts)
+            texts.append("\n".join(page_texts))
+        elapsed = max(time.perf_counter() - t0, 1e-9)
+
+        results["pdf_to_text"] = {
+            "files": len(pdfs),
+            "pages": pages,
+            "seconds": elapsed,
+            "pages_per_sec": pages / elapsed,
+        }
+        self.stdout.write(f"[EXTRACT] pages={pages} pages/sec={pages / elapsed:.1f}")
+        return texts
+
+    def _bench_chunk(self, texts, results):
+        from ragapi.pdf_ingest import CHUNK_MAX_CHARS, CHUNK_OVERLAP, chunk_text_iter
+
+        chars = sum(len(t) for t in texts)
+        t0 = time.perf_counter()
+        chunks = [c for t in texts for c in chunk_text_iter(t, max_chars=CHUNK_MAX_CHARS, overlap=CHUNK_OVERLAP)]
+        elapsed = max(time.perf_counter() - t0, 1e-9)
+
+        results["chunk_text_iter"] = {
+            "chars": chars,
+            "chunks": len(chunks),
+            "seconds": elapsed,
+            "chunks_per_sec": len(chunks) / elapsed,
+            "mb_per_sec": chars / elapsed / 1e6,
+        }
+        self.stdout.write(f"[CHUNK] chunks={len(chunks)} chunks/sec={len(chunks) / elapsed:.0f}")
+        return chunks
+
+    def _bench_embed(self, chunks, batch_sizes, sample, results):
+        from ragapi.embeddings import _encode, get_embedder
+
+        texts = chunks[:sample]
+        get_embedder()  # waktu load model tidak ikut diukur per batch size
+        _encode(texts[:1], False, 1)
+
+        by_batch = {}
+        for batch_size in batch_sizes:
+            t0 = time.perf_counter()
+            _encode(texts, False, batch_size)
+            elapsed = max(time.perf_counter() - t0, 1e-9)
+            by_batch[str(batch_size)] = {
+                "texts": len(texts),
+                "seconds": elapsed,
+                "texts_per_sec": len(texts) / elapsed,
+            }
+            self.stdout.write(f"[EMBED] batch={batch_size} texts/sec={len(texts) / elapsed:.1f}")
+        results["embed"] = by_batch
+
+    def _bench_upsert(self, chunks, results):
+        from ragapi.chroma_client import upsert_chunks
+        from ragapi.embeddings import embed
+
+        embs = embed(chunks, as_numpy=True)
+        ids = [f"bench-{i}" for i in range(len(chunks))]
+        metas = [{"paper_id": f"bench-{i % 50}", "source": "bench"} for i in range(len(chunks))]
+
+        t0 = time.perf_counter()
+        for start in range(0, len(chunks), 64):
+            end = start + 64
+            upsert_chunks(
+                ids=ids[start:end],
+                documents=chunks[start:end],
+                metadatas=metas[start:end],
+                embeddings=embs[start:end],
+            )
+        elapsed = max(time.perf_counter() - t0, 1e-9)
+
+        results["upsert"] = {"chunks": len(chunks), "seconds": elapsed, "chunks_per_sec": len(chunks) / elapsed}
+        self.stdout.write(f"[UPSERT] chunks={len(chunks)} chunks/sec={len(chunks) / elapsed:.1f}")
+
+    def _bench_retrieve(self, ks, repeat, results):
+        from ragapi.retrieval import retrieve
+
+        for query in DEFAULT_QUERIES:
+            retrieve(query, k=1, use_cache=False)  # embedding query & koneksi hangat
+
+        by_k = {}
+        for k in ks:
+            latencies = []
+            for query in DEFAULT_QUERIES:
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    retrieve(query, k=k, use_cache=False)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+            by_k[str(k)] = latency_summary(latencies)
+            s = by_k[str(k)]
+            self.stdout.write(
+                f"[RETRIEVE] k={k} p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms p99={s['p99_ms']:.2f}ms"
+            )
+        results["retrieve"] = by_k
+
+    def _bench_answer(self, n, results):
+        """
+        answer_hybrid end-to-end: LLM dan provider eksternal di-stub, cache retrieval dikosongkan
+        tiap panggilan supaya yang terukur adalah pipeline penuh (tanpa biaya jaringan).
+        """
+        from consultations.models import Consultation
+        from ragapi.hybrid import answer_hybrid
+        from ragapi.retrieval import clear_retrieval_cache
+
+        latencies = []
+        with (
+            override_settings(RAG_AUTOFETCH_MODE="sync"),
+            mock.patch("ragapi.hybrid.chat", return_value="(stub jawaban)"),
+            mock.patch("ragapi.hybrid.search_oa_metas", return_value=[]),
+        ):
+            for i in range(n):
+                c = Consultation(
+                    mode="balita",
+                    age_value=12 + i,
+                    age_unit="months",
+                    sex="female" if i % 2 else "male",
+                    weight_kg=8.0 + i * 0.1,
+                    height_cm=72.0 + i * 0.5,
+                    measurement_type="length",
+                    user_question=DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)],
+                )
+                clear_retrieval_cache()
+                t0 = time.perf_counter()
+                answer_hybrid(c, use_cache=False)
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        results["answer_hybrid"] = latency_summary(latencies)
+        s = results["answer_hybrid"]
+        self.stdout.write(f"[ANSWER] n={n} p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms (LLM/provider stub)")
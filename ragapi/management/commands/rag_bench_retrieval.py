@@ -0,0 +1,171 @@
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from ragapi.bench import DEFAULT_QUERIES, _sentence, percentile
+from ragapi.bm25_index import BM25Index
+from ragapi.chroma_client import get_collection
+from ragapi.embeddings import embed
+from ragapi.gating import evidence_is_weak
+from ragapi.retrieval import retrieve
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark retrieval: vector-only vs hybrid (BM25 + vektor), engine chroma vs numpy, "
+        "latensi query dan overhead ingest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--repeat", type=int, default=5, help="Pengulangan per query per mode")
+        parser.add_argument("--queries-file", default=None, help="File teks, satu query per baris")
+        parser.add_argument("--ingest-sample", type=int, default=500, help="Jumlah chunk untuk benchmark ingest")
+        parser.add_argument(
+            "--bm25-chunks",
+            type=int,
+            default=150_000,
+            help="Jumlah chunk sintetis untuk benchmark BM25 skala korpus (0 = lewati)",
+        )
+
+    def handle(self, *args, **opts):
+        col = get_collection()
+        if not col.count():
+            raise CommandError("Collection kosong; ingest dulu sebelum benchmark.")
+
+        queries = DEFAULT_QUERIES
+        if opts["queries_file"]:
+            with open(opts["queries_file"], encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+
+        self._bench_ingest(col, opts["ingest_sample"])
+        self._bench_queries(queries, opts["k"], opts["repeat"])
+        self._bench_engines(queries, opts["k"], opts["repeat"])
+        if opts["bm25_chunks"] > 0:
+            self._bench_bm25_scale(queries, opts["repeat"], opts["bm25_chunks"])
+
+    def _bench_ingest(self, col, sample):
+        res = col.get(limit=sample, include=["documents", "metadatas"])
+        ids, docs, metas = res["ids"], res["documents"], res["metadatas"]
+        if not ids:
+            return
+
+        import chromadb
+        from chromadb.config import Settings
+
+        with tempfile.TemporaryDirectory() as tmp:
+            client = chromadb.PersistentClient(path=tmp, settings=Settings(anonymized_telemetry=False))
+            bench_col = client.get_or_create_collection(name="bench")
+
+            t0 = time.perf_counter()
+            embs = embed(docs, use_cache=False)
+            t_embed = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            bench_col.upsert(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
+            t_upsert = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            BM25Index(f"{tmp}/bm25.sqlite3").index_documents(ids, docs)
+            t_bm25 = time.perf_counter() - t0
+
+        vector_only = t_embed + t_upsert
+        self.stdout.write(
+            f"[INGEST] chunks={len(ids)} embed={t_embed:.2f}s upsert={t_upsert:.2f}s bm25_index={t_bm25:.2f}s"
+        )
+        self.stdout.write(
+            f"[INGEST] vector-only chunks/sec={len(ids) / vector_only:.1f} "
+            f"hybrid chunks/sec={len(ids) / (vector_only + t_bm25):.1f} "
+            f"overhead={100 * t_bm25 / vector_only:.1f}%"
+        )
+
+    def _bench_queries(self, queries, k, repeat):
+        for mode in ("vector", "hybrid"):
+            latencies = []
+            weak = 0
+            for query in queries:
+                for i in range(repeat):
+                    t0 = time.perf_counter()
+                    hits = retrieve(query, k=k, use_cache=False, mode=mode)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    if i == 0 and evidence_is_weak(hits):
+                        weak += 1
+
+            self.stdout.write(
+                f"[QUERY] mode={mode} n={len(latencies)} "
+                f"mean={statistics.mean(latencies):.1f}ms p50={percentile(latencies, 50):.1f}ms "
+                f"p95={percentile(latencies, 95):.1f}ms evidence_weak={weak}/{len(queries)}"
+            )
+
+    def _bench_engines(self, queries, k, repeat):
+        from ragapi.retrieval import _query_vector
+        from ragapi.vector_mirror import get_mirror
+
+        t0 = time.perf_counter()
+        mirror = get_mirror()
+        self.stdout.write(f"[ENGINE] mirror load chunks={len(mirror)} elapsed={time.perf_counter() - t0:.2f}s")
+
+        q_embs = embed(queries)
+        results = {}
+        for engine in ("chroma", "numpy"):
+            latencies = []
+            results[engine] = []
+            with override_settings(RAG_RETRIEVAL_ENGINE=engine):
+                for q_emb in q_embs:
+                    for i in range(repeat):
+                        t0 = time.perf_counter()
+                        hits = _query_vector(q_emb, k, None)
+                        latencies.append((time.perf_counter() - t0) * 1000)
+                    results[engine].append([h["id"] for h in hits])
+
+            self.stdout.write(
+                f"[ENGINE] engine={engine} n={len(latencies)} "
+                f"mean={statistics.mean(latencies):.2f}ms p50={percentile(latencies, 50):.2f}ms "
+                f"p95={percentile(latencies, 95):.2f}ms"
+            )
+
+        # HNSW Chroma aproksimatif; mirror exact → overlap = recall HNSW terhadap exact
+        overlap = [
+            len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(results["chroma"], results["numpy"])
+        ]
+        self.stdout.write(f"[ENGINE] overlap@{k} chroma vs numpy={statistics.mean(overlap):.3f}")
+
+    def _bench_bm25_scale(self, queries, repeat, n_chunks):
+        from django.conf import settings
+
+        # Chunk sintetis: kosakata gizi yang sangat umum + istilah langka berdistribusi Zipf,
+        # mendekati korpus ~2.000 PDF (ratusan ribu chunk) tanpa perlu embedding
+        rng = random.Random(0)
+        k = settings.RAG_HYBRID_CANDIDATES
+        with tempfile.TemporaryDirectory() as tmp:
+            index = BM25Index(f"{tmp}/bm25.sqlite3")
+            t0 = time.perf_counter()
+            for start in range(0, n_chunks, 5000):
+                ids = [f"bench-{i}" for i in range(start, min(start + 5000, n_chunks))]
+                docs = [
+                    " ".join(_sentence(rng) for _ in range(8))
+                    + " "
+                    + " ".join(f"istilah{int(rng.paretovariate(1.0))}" for _ in range(6))
+                    for _ in ids
+                ]
+                index.index_documents(ids, docs)
+            self.stdout.write(
+                f"[BM25] chunks={index.doc_count()} index={time.perf_counter() - t0:.1f}s"
+            )
+
+            for label, ratio in (("all_terms", 0), ("df_cap", None)):
+                latencies = []
+                for query in queries:
+                    for _ in range(repeat):
+                        t0 = time.perf_counter()
+                        index.search(query, k=k, max_df_ratio=ratio)
+                        latencies.append((time.perf_counter() - t0) * 1000)
+                self.stdout.write(
+                    f"[BM25] terms={label} n={len(latencies)} "
+                    f"mean={statistics.mean(latencies):.1f}ms p50={percentile(latencies, 50):.1f}ms "
+                    f"p95={percentile(latencies, 95):.1f}ms"
+                )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ragapi.bm25_index import get_index
+from ragapi.chroma_client import get_collection
+
+
+class Command(BaseCommand):
+    help = "Bangun ulang index BM25 dari seluruh chunk yang ada di ChromaDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Jumlah chunk per batch baca Chroma")
+
+    def handle(self, *args, **opts):
+        batch_size = opts["batch_size"]
+        col = get_collection()
+        index = get_index()
+
+        t0 = time.perf_counter()
+        index.clear()
+        total = col.count()
+        done = 0
+        while done < total:
+            res = col.get(limit=batch_size, offset=done, include=["documents"])
+            if not res["ids"]:
+                break
+            index.index_documents(res["ids"], res["documents"])
+            done += len(res["ids"])
+            self.stdout.write(f"[BM25] {done}/{total}")
+
+        elapsed = max(time.perf_counter() - t0, 1e-9)
+        self.stdout.write(
+            self.style.SUCCESS(f"DONE. indexed={index.doc_count()} elapsed={elapsed:.1f}s docs/sec={done / elapsed:.1f}")
+        )
@@ -0,0 +1,136 @@
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ragapi.bench import build_synthetic_corpus
+from ragapi.embeddings import embed
+from ragapi.pdf_ingest import CHUNKERS, chunk_pages, chunker_tag, iter_pdf_pages
+from ragapi.token_chunker import MAX_SEQ_LENGTH, SPECIAL_TOKENS, count_tokens, get_tokenizer, split_sentences
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.split())
+
+
+class Command(BaseCommand):
+    help = (
+        "Bandingkan chunker karakter vs token: jumlah chunk, token yang terpotong embedder, "
+        "waktu chunking/embedding, dan kualitas retrieval (kalimat korpus sebagai query)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pdf-dir", default=None, help="Folder PDF (default: korpus sintetis)")
+        parser.add_argument("--docs", type=int, default=10, help="Jumlah PDF sintetis")
+        parser.add_argument("--pages", type=int, default=8, help="Halaman per PDF sintetis")
+        parser.add_argument("--queries", type=int, default=200, help="Jumlah kalimat korpus yang dijadikan query")
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=32, help="Batch size embedding")
+        parser.add_argument("--json", default=None, help="Tulis hasil ke file JSON")
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory(prefix="rag_chunkers_") as tmp:
+            if opts["pdf_dir"]:
+                pdfs = sorted(Path(opts["pdf_dir"]).glob("*.pdf"))
+                if not pdfs:
+                    raise CommandError(f"Tidak ada PDF di {opts['pdf_dir']}")
+            else:
+                pdfs = build_synthetic_corpus(Path(tmp) / "pdfs", opts["docs"], pages=opts["pages"])
+            docs = [list(iter_pdf_pages(str(path))) for path in pdfs]
+
+        queries = self._sample_queries(docs, opts["queries"])
+        if not queries:
+            raise CommandError("Korpus tidak menghasilkan kalimat untuk query")
+        q_embs = embed([q for _, q in queries], use_cache=False, as_numpy=True)
+        get_tokenizer()  # waktu load tokenizer tidak ikut diukur
+        limit = MAX_SEQ_LENGTH - SPECIAL_TOKENS
+
+        self.stdout.write(
+            f"[CORPUS] pdf={len(docs)} pages={sum(len(d) for d in docs)} queries={len(queries)} "
+            f"k={opts['k']} limit_embedder={limit} token"
+        )
+        report = {}
+        for chunker in CHUNKERS:
+            report[chunker] = self._evaluate(chunker, docs, queries, q_embs, limit, opts)
+
+        if opts["json"]:
+            Path(opts["json"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Hasil ditulis ke {opts['json']}"))
+
+    def _sample_queries(self, docs, n):
+        """
+        Kalimat (≥ 8 kata) acak dari korpus; relevan = chunk dokumen yang sama yang memuat kalimat utuh.
+        """
+        pool = [
+            (doc_idx, sentence)
+            for doc_idx, pages in enumerate(docs)
+            for _, text in pages
+            for sentence in split_sentences(text)
+            if len(sentence.split()) >= 8
+        ]
+        random.Random(0).shuffle(pool)
+        return pool[:n]
+
+    def _evaluate(self, chunker, docs, queries, q_embs, limit, opts):
+        t0 = time.perf_counter()
+        chunks = [
+            (doc_idx, chunk)
+            for doc_idx, pages in enumerate(docs)
+            for chunk, _, _ in chunk_pages(iter(pages), chunker)
+        ]
+        chunk_s = time.perf_counter() - t0
+        texts = [chunk for _, chunk in chunks]
+
+        tokens = count_tokens(texts)
+        beyond = sum(max(0, n - limit) for n in tokens)
+
+        t0 = time.perf_counter()
+        embs = embed(texts, batch_size=opts["batch_size"], use_cache=False, as_numpy=True)
+        embed_s = time.perf_counter() - t0
+
+        k = opts["k"]
+        normalized = [_norm(t) for t in texts]
+        hits, rr, answerable = 0, 0.0, 0
+        for (doc_idx, sentence), q in zip(queries, q_embs):
+            relevant = {i for i, (d, _) in enumerate(chunks) if d == doc_idx and sentence in normalized[i]}
+            if relevant:
+                answerable += 1
+            top = np.argsort(-(embs @ q))[:k]
+            for rank, idx in enumerate(top, start=1):
+                if int(idx) in relevant:
+                    hits += 1
+                    rr += 1.0 / rank
+                    break
+
+        result = {
+            "chunker_tag": chunker_tag(chunker),
+            "chunks": len(chunks),
+            "tokens_mean": statistics.fmean(tokens) if tokens else 0.0,
+            "tokens_max": max(tokens, default=0),
+            "chunks_over_limit": sum(n > limit for n in tokens),
+            "tokens_total": sum(tokens),
+            "tokens_beyond_limit": beyond,
+            "tokens_beyond_limit_pct": 100.0 * beyond / max(sum(tokens), 1),
+            "chunk_s": chunk_s,
+            "embed_s": embed_s,
+            f"hit@{k}": hits / len(queries),
+            f"mrr@{k}": rr / len(queries),
+            "answerable_queries": answerable,
+        }
+        self.stdout.write(
+            f"[{chunker.upper()}] {result['chunker_tag']}: chunks={result['chunks']} "
+            f"tokens/chunk mean={result['tokens_mean']:.0f} max={result['tokens_max']} "
+            f"over_limit={result['chunks_over_limit']} "
+            f"dibuang_embedder={beyond} ({result['tokens_beyond_limit_pct']:.1f}%)"
+        )
+        self.stdout.write(
+            f"  chunking={chunk_s * 1000:.0f}ms embed={embed_s * 1000:.0f}ms "
+            f"hit@{k}={result[f'hit@{k}']:.3f} mrr@{k}={result[f'mrr@{k}']:.3f} "
+            f"(query dengan chunk relevan: {answerable}/{len(queries)})"
+        )
+        return result
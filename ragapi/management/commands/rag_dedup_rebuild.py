@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ragapi.chroma_client import get_collection
+from ragapi.dedup import get_index
+from ragapi.pdf_ingest import restore_duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        "Bangun ulang index near-duplicate (MinHash/LSH) dari seluruh chunk di ChromaDB, "
+        "atau tampilkan statistik dedup (--stats)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Jumlah chunk per batch baca Chroma")
+        parser.add_argument("--stats", action="store_true", help="Hanya tampilkan statistik index + penghematan")
+
+    def handle(self, *args, **opts):
+        index = get_index()
+        if not opts["stats"]:
+            self._rebuild(index, opts["batch_size"])
+
+        stats = index.stats()
+        self.stdout.write(
+            f"[DEDUP] indexed={stats['indexed']} recorded_duplicates={stats['recorded_duplicates']} "
+            f"links={stats['links']} "
+            f"checked={stats['checked']} duplicates={stats['duplicates']} ({stats['duplicate_rate']:.1%}) "
+            f"chars_skipped={stats['chars_skipped']}/{stats['chars_checked']}"
+        )
+
+    def _rebuild(self, index, batch_size):
+        col = get_collection()
+        t0 = time.perf_counter()
+        index.clear()
+        total = col.count()
+        done = 0
+        while done < total:
+            res = col.get(limit=batch_size, offset=done, include=["documents", "metadatas"])
+            if not res["ids"]:
+                break
+            index.add(res["ids"], res["documents"], res["metadatas"])
+            done += len(res["ids"])
+            self.stdout.write(f"[DEDUP] {done}/{total}")
+
+        # duplikat yang chunk kanoniknya sudah tidak ada di Chroma di-ingest ulang
+        orphans = index.orphaned()
+        if orphans:
+            restored = restore_duplicates(orphans)
+            self.stdout.write(f"[DEDUP] duplikat tanpa chunk kanonik={len(orphans)} di-embed ulang={restored}")
+
+        elapsed = max(time.perf_counter() - t0, 1e-9)
+        self.stdout.write(self.style.SUCCESS(f"DONE. elapsed={elapsed:.1f}s chunks/sec={done / elapsed:.1f}"))
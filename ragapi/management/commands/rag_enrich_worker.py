@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ragapi.enrichment import claimable_jobs, run_enrichment_job
+from ragapi.models import EnrichmentJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Jalankan job enrichment (autofetch+ingest) yang antre di database, "
+        "termasuk job running yang lease-nya habis (RAG_ENRICH_LEASE_SECONDS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Proses job yang ada lalu berhenti")
+        parser.add_argument("--poll", type=float, default=5.0, help="Interval polling (detik)")
+
+    def handle(self, *args, **opts):
+        while True:
+            pending = list(claimable_jobs().order_by("created_at").values_list("id", flat=True))
+            for job_id in pending:
+                job = run_enrichment_job(job_id)
+                if job is not None:
+                    style = self.style.SUCCESS if job.status == EnrichmentJob.Status.DONE else self.style.ERROR
+                    self.stdout.write(style(f"[{job.status.upper()}] job={job.id} inserted_chunks={job.inserted_chunks}"))
+
+            if opts["once"]:
+                break
+            time.sleep(opts["poll"])
@@ -0,0 +1,105 @@
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ragapi.bench import DEFAULT_QUERIES, percentile
+from ragapi.chroma_client import get_collection
+from ragapi.compact import Codec, Projection
+from ragapi.embeddings import embed
+from ragapi.vector_mirror import VectorMirror, _space
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluasi recall@k mode embedding kompak (int8 / PCA) terhadap baseline float32, "
+        "beserta memori resident mirror dan puncak memori sementara per query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--dims", default="64,128,192", help="Dimensi PCA yang dicoba, dipisah koma")
+        parser.add_argument("--sample-queries", type=int, default=200, help="Jumlah chunk korpus yang dipakai sebagai query")
+        parser.add_argument(
+            "--save-projection",
+            type=int,
+            default=None,
+            help="Fit proyeksi dengan dimensi ini dari korpus dan simpan ke RAG_PROJECTION_PATH",
+        )
+
+    def handle(self, *args, **opts):
+        k = opts["k"]
+        col = get_collection()
+        res = col.get(include=["embeddings"])
+        if not len(res["ids"]):
+            raise CommandError("Collection kosong; ingest dulu sebelum evaluasi.")
+        ids = res["ids"]
+        embs = np.asarray(res["embeddings"], dtype=np.float32)
+        space = _space(col)
+
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(ids), size=min(opts["sample_queries"], len(ids)), replace=False)
+        queries = np.vstack([embed(DEFAULT_QUERIES, as_numpy=True), embs[sample]])
+        self.stdout.write(f"[EVAL] chunks={len(ids)} dim={embs.shape[1]} queries={len(queries)} k={k} space={space}")
+
+        codecs = [Codec(), Codec(int8=True)]
+        for dim in [int(d) for d in opts["dims"].split(",") if d.strip()]:
+            if dim >= embs.shape[1] or dim >= len(ids):
+                self.stdout.write(self.style.WARNING(f"[EVAL] lewati pca{dim}: data/dimensi tidak cukup"))
+                continue
+            projection = Projection.fit(embs, dim)
+            codecs += [Codec(projection=projection), Codec(projection=projection, int8=True)]
+
+        baseline = None
+        for codec in codecs:
+            mirror = VectorMirror(space=space, codec=codec)
+            mirror.upsert(ids, [None] * len(ids), [None] * len(ids), embs)
+
+            latencies, results = [], []
+            for q in queries:
+                t0 = time.perf_counter()
+                hits = mirror.query(q, k)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                results.append(hits)
+
+            peak = self._query_peak_bytes(mirror, queries[:20], k)
+
+            if baseline is None:
+                baseline = results
+            recall = statistics.mean(
+                len({h["id"] for h in got} & {h["id"] for h in ref}) / max(len(ref), 1)
+                for got, ref in zip(results, baseline)
+            )
+            # selisih distance hit teratas: menunjukkan apakah threshold gating masih berlaku
+            dist_err = statistics.mean(
+                abs(got[0]["distance"] - ref[0]["distance"]) for got, ref in zip(results, baseline) if got and ref
+            )
+            self.stdout.write(
+                f"[EVAL] {codec.label:<14} bytes/vec={codec.bytes_per_vector(embs.shape[1]):>5} "
+                f"recall@{k}={recall:.3f} top1_dist_err={dist_err:.4f} "
+                f"p50={percentile(latencies, 50):.3f}ms "
+                f"resident={mirror.nbytes / 1e6:.1f}MB query_peak={peak / 1e6:.2f}MB"
+            )
+
+        if opts["save_projection"]:
+            dim = opts["save_projection"]
+            Projection.fit(embs, dim).save(settings.RAG_PROJECTION_PATH)
+            self.stdout.write(self.style.SUCCESS(f"Proyeksi dim={dim} disimpan ke {settings.RAG_PROJECTION_PATH}"))
+
+    @staticmethod
+    def _query_peak_bytes(mirror, queries, k) -> int:
+        """
+        Puncak alokasi sementara (di luar array mirror) selama query, diukur terpisah dari
+        pengukuran latency karena tracemalloc memperlambat alokasi.
+        """
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            for q in queries:
+                mirror.query(q, k)
+            return tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ragapi.embeddings import EMBED_MODEL_NAME
+from ragapi.onnx_embedder import model_filename
+
+
+class Command(BaseCommand):
+    help = "Ekspor all-MiniLM-L6-v2 ke ONNX (opsional + versi int8) untuk RAG_EMBED_BACKEND=onnx."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", default=None, help="Folder output (default: RAG_ONNX_MODEL_DIR)")
+        parser.add_argument("--quantize", action="store_true", help="Buat juga model_int8.onnx (kuantisasi dinamis)")
+        parser.add_argument("--opset", type=int, default=17)
+
+    def handle(self, *args, **opts):
+        try:
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+        except ImportError as e:
+            raise CommandError("Ekspor membutuhkan torch dan transformers (cukup di mesin build)") from e
+
+        out = Path(opts["out"] or settings.RAG_ONNX_MODEL_DIR)
+        out.mkdir(parents=True, exist_ok=True)
+
+        tokenizer = AutoTokenizer.from_pretrained(EMBED_MODEL_NAME)
+        model = AutoModel.from_pretrained(EMBED_MODEL_NAME).eval()
+        tokenizer.save_pretrained(str(out))  # menghasilkan tokenizer.json (fast tokenizer)
+
+        sample = tokenizer(["contoh kalimat untuk ekspor"], return_tensors="pt")
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic = {name: {0: "batch", 1: "seq"} for name in names}
+        dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+        model_path = out / model_filename(quantized=False)
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in names),
+                str(model_path),
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic,
+                opset_version=opts["opset"],
+            )
+        self.stdout.write(self.style.SUCCESS(f"[ONNX] {model_path}"))
+
+        if opts["quantize"]:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            int8_path = out / model_filename(quantized=True)
+            quantize_dynamic(str(model_path), str(int8_path), weight_type=QuantType.QInt8)
+            self.stdout.write(self.style.SUCCESS(f"[ONNX] {int8_path}"))
@@ -1,6 +1,23 @@
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
 from django.core.management.base import BaseCommand, CommandError
-from ragapi.pdf_ingest import upsert_pdf
+from ragapi.pdf_ingest import (
+    already_ingested,
+    commit_near_duplicates,
+    drop_near_duplicates,
+    extract_pdf_chunks,
+    file_sha256,
+    finalize_ingest,
+    upsert_pdf,
+)
+
+_STOP = object()
 
 
 class Command(BaseCommand):
@@ -11,15 +28,37 @@ class Command(BaseCommand):
         parser.add_argument("--source", default="core", help="Tag sumber (default: core)")
         parser.add_argument("--year", default=None, help="Tahun default jika tidak ada metadata")
         parser.add_argument("--recursive", action="store_true", help="Scan subfolder juga")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Jumlah process untuk ekstraksi+chunking PDF (default: 1 = sekuensial)",
+        )
+        parser.add_argument(
+            "--queue-size",
+            type=int,
+            default=8,
+            help="Kapasitas antrian antar tahap pipeline (satuan: file / batch)",
+        )
+        parser.add_argument("--batch-size", type=int, default=64, help="Ukuran batch embedding")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Ingest ulang walaupun file tidak berubah sejak ingest terakhir (abaikan manifest)",
+        )
 
     def handle(self, *args, **opts):
         folder = opts["folder"]
         source = opts["source"]
         year = opts["year"]
         recursive = opts["recursive"]
+        workers = opts["workers"]
+        force = opts["force"]
 
         if not os.path.isdir(folder):
             raise CommandError(f"Folder tidak ditemukan: {folder}")
+        if workers < 1:
+            raise CommandError("--workers minimal 1")
 
         pdf_files = []
         if recursive:
@@ -35,7 +74,7 @@ class Command(BaseCommand):
         if not pdf_files:
             raise CommandError("Tidak ada file PDF di folder tersebut.")
 
-        total_chunks = 0
+        jobs = []
         for path in sorted(pdf_files):
             filename = os.path.basename(path)
             title = os.path.splitext(filename)[0]
@@ -48,9 +87,229 @@ class Command(BaseCommand):
                 "source": source,
                 "pdf_url": None,
             }
+            jobs.append((path, paper_meta))
+
+        if workers == 1:
+            self._run_sequential(jobs, opts["batch_size"], force)
+        else:
+            self._run_pipeline(jobs, workers, opts["queue_size"], opts["batch_size"], force)
+
+    def _run_sequential(self, jobs, batch_size, force):
+        """
+        --workers 1: satu file per waktu lewat upsert_pdf (streaming halaman → embed → upsert).
+        Kegagalan per file dicatat dan dilaporkan di akhir, sama seperti _run_pipeline.
+        """
+        failures = {}
+        inserted = {}
+        stats = {"chunks": 0, "pages": 0, "unchanged": 0, "duplicates": 0}
+
+        t0 = time.perf_counter()
+        for path, paper_meta in jobs:
+            file_stats = {}
+            try:
+                count = upsert_pdf(path, paper_meta, batch_size=batch_size, force=force, stats=file_stats)
+            except Exception as e:
+                failures[path] = f"{type(e).__name__}: {e}"
+                continue
+            stats["pages"] += file_stats.get("pages", 0)
+            stats["duplicates"] += file_stats.get("duplicates", 0)
+            if file_stats.get("unchanged"):
+                stats["unchanged"] += 1
+                self.stdout.write(f"[UNCHANGED] {path}")
+                continue
+            inserted[path] = count
+            stats["chunks"] += count
+
+        self._report(jobs, inserted, failures, stats, time.perf_counter() - t0)
+
+    def _report(self, jobs, inserted, failures, stats, elapsed):
+        elapsed = max(elapsed, 1e-9)
+        for path, _ in jobs:
+            if path not in failures and path in inserted:
+                self.stdout.write(self.style.SUCCESS(f"[OK] {path}: inserted_chunks={inserted[path]}"))
+
+        if failures:
+            self.stdout.write(self.style.ERROR(f"FAILED files={len(failures)}:"))
+            for path, err in sorted(failures.items()):
+                self.stdout.write(self.style.ERROR(f"  [FAIL] {path}: {err}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"DONE. Total inserted_chunks={stats['chunks']} pages={stats['pages']} "
+                f"unchanged_files={stats['unchanged']} near_duplicates={stats['duplicates']} "
+                f"elapsed={elapsed:.1f}s chunks/sec={stats['chunks'] / elapsed:.2f} "
+                f"pages/sec={stats['pages'] / elapsed:.2f}"
+            )
+        )
+
+    def _run_pipeline(self, jobs, workers, queue_size, batch_size, force):
+        """
+        Pipeline paralel:
+          [process pool] ekstraksi + chunking
+            → (queue terbatas) → [thread] embedding
+            → (queue terbatas) → [thread] Chroma writer
+        Kegagalan per file dicatat dan dilaporkan di akhir, tanpa menghentikan file lain.
+        File yang tidak berubah (menurut manifest) dilewati sebelum masuk pool.
+        Chunk near-duplicate (RAG_DEDUP_MODE) dibuang sebelum masuk tahap embedding dan baru
+        dicatat di index dedup setelah semua chunk unik file itu tertulis.
+        State per file dikunci dengan path lengkap: dengan --recursive, nama file bisa sama
+        di subfolder berbeda (paper_id = nama file).
+        """
+        from ragapi.chroma_client import upsert_chunks
+        from ragapi.embeddings import embed, get_device_info
+
+        self.stdout.write(f"[PIPELINE] files={len(jobs)} workers={workers} embed_device={get_device_info()}")
+
+        embed_q = queue.Queue(maxsize=queue_size)
+        write_q = queue.Queue(maxsize=queue_size)
+        failures = {}
+        inserted = {}
+        expected = {}
+        produced = {}  # jumlah chunk hasil ekstraksi (termasuk duplikat) → chunk_count di manifest
+        near_dups = {}  # (duplikat, jumlah chunk dicek, jumlah karakter dicek)
+        sources = {}  # path → (paper_meta, file_hash, pages)
+        stats = {"chunks": 0, "pages": 0, "unchanged": 0, "duplicates": 0}
+        lock = threading.Lock()
+
+        def fail(path, exc):
+            with lock:
+                failures.setdefault(path, f"{type(exc).__name__}: {exc}")
+
+        def embed_stage():
+            while True:
+                item = embed_q.get()
+                if item is _STOP:
+                    write_q.put(_STOP)
+                    return
+                path, ids, docs, metas = item
+                try:
+                    for start in range(0, len(docs), batch_size):
+                        end = start + batch_size
+                        embs = embed(docs[start:end], show_progress=False, as_numpy=True)
+                        write_q.put((path, ids[start:end], docs[start:end], metas[start:end], embs))
+                except Exception as e:
+                    fail(path, e)
+
+        def write_stage():
+            while True:
+                item = write_q.get()
+                if item is _STOP:
+                    return
+                path, ids, docs, metas, embs = item
+                with lock:
+                    failed = path in failures
+                if failed:
+                    continue
+                try:
+                    upsert_chunks(
+                        ids=ids,
+                        documents=docs,
+                        metadatas=metas,
+                        embeddings=embs,
+                    )
+                    with lock:
+                        inserted[path] = inserted.get(path, 0) + len(docs)
+                        stats["chunks"] += len(docs)
+                        complete = inserted[path] == expected[path]
+                        paper_meta, file_hash, pages = sources[path]
+                    if complete:
+                        restored = commit_near_duplicates(*near_dups[path])
+                        if restored:
+                            with lock:
+                                inserted[path] += restored
+                                stats["chunks"] += restored
+                        finalize_ingest(file_hash, path, paper_meta, chunk_count=produced[path], pages=pages)
+                except Exception as e:
+                    fail(path, e)
+
+        embed_thread = threading.Thread(target=embed_stage, name="rag-embed", daemon=True)
+        write_thread = threading.Thread(target=write_stage, name="rag-write", daemon=True)
+        embed_thread.start()
+        write_thread.start()
+
+        t0 = time.perf_counter()
+        # "spawn" supaya worker tidak mewarisi state torch/thread dari proses utama
+        ctx = multiprocessing.get_context("spawn")
+        pending_jobs = list(jobs)
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            while pending_jobs or in_flight:
+                # batasi jumlah file yang sedang/selesai diekstrak agar memori tetap terkendali
+                while pending_jobs and len(in_flight) < workers * 2:
+                    path, paper_meta = pending_jobs.pop(0)
+                    try:
+                        file_hash = file_sha256(path)
+                    except OSError as e:
+                        fail(path, e)
+                        continue
+                    if not force and already_ingested(file_hash):
+                        with lock:
+                            stats["unchanged"] += 1
+                        self.stdout.write(f"[UNCHANGED] {path}")
+                        continue
+                    with lock:
+                        sources[path] = (paper_meta, file_hash, None)
+                    try:
+                        fut = pool.submit(extract_pdf_chunks, path, paper_meta, file_hash)
+                    except BrokenProcessPool as e:
+                        # worker mati (OOM / crash pypdf): pool tidak bisa dipakai lagi,
+                        # file yang belum diekstrak dicatat gagal; yang sedang jalan gagal lewat result()
+                        fail(path, e)
+                        for rest, _ in pending_jobs:
+                            fail(rest, e)
+                        pending_jobs = []
+                        break
+                    in_flight[fut] = path
+
+                if not in_flight:
+                    continue
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    path = in_flight.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        fail(path, e)
+                        continue
+
+                    with lock:
+                        paper_meta, file_hash, _ = sources[path]
+                    try:
+                        ids, docs, metas, duplicates = drop_near_duplicates(
+                            result["ids"], result["docs"], result["metas"]
+                        )
+                    except Exception as e:
+                        fail(path, e)
+                        continue
+                    with lock:
+                        stats["pages"] += result["pages"]
+                        stats["duplicates"] += len(duplicates)
+                        near_dups[path] = (duplicates, len(result["docs"]), sum(len(d) for d in result["docs"]))
+                        expected[path] = len(docs)
+                        produced[path] = len(result["docs"])
+                        sources[path] = (paper_meta, file_hash, result["pages"])
+                    if not docs:
+                        if result["docs"]:
+                            self.stdout.write(f"[DEDUP] {path}: semua chunk near-duplicate")
+                        else:
+                            self.stdout.write(self.style.WARNING(f"[SKIP] {path}: teks terlalu pendek"))
+                        try:
+                            restored = commit_near_duplicates(*near_dups[path])
+                            if restored:
+                                with lock:
+                                    inserted[path] = restored
+                                    stats["chunks"] += restored
+                            finalize_ingest(
+                                file_hash, path, paper_meta, chunk_count=len(result["docs"]), pages=result["pages"]
+                            )
+                        except Exception as e:
+                            fail(path, e)
+                        continue
+                    embed_q.put((path, ids, docs, metas))
 
-            inserted = upsert_pdf(path, paper_meta)
-            total_chunks += inserted
-            self.stdout.write(self.style.SUCCESS(f"[OK] {filename}: inserted_chunks={inserted}"))
+        embed_q.put(_STOP)
+        embed_thread.join()
+        write_thread.join()
 
-        self.stdout.write(self.style.SUCCESS(f"DONE. Total inserted_chunks={total_chunks}"))
+        self._report(jobs, inserted, failures, stats, time.perf_counter() - t0)
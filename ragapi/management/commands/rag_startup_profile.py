@@ -0,0 +1,155 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+# modul yang di-import saat start (urls → views) dan yang baru di-import pada request pertama
+_IMPORT_PROBE = """
+import django
+django.setup()
+import consultations.views
+import ragapi.views
+from ragapi.embeddings import get_embedder
+from ragapi.chroma_client import get_client
+from ragapi.openrouter_client import get_client as get_llm_client
+get_client()
+get_embedder()
+get_llm_client()
+"""
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _fmt(seconds: float) -> str:
+    return f"{seconds * 1000:8.1f}ms"
+
+
+class Command(BaseCommand):
+    help = (
+        "Profil cold start: waktu import per modul dan time-to-first-answer "
+        "(proses baru, LLM di-stub kecuali --llm)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=25, help="Jumlah modul teratas yang ditampilkan")
+        parser.add_argument("--llm", action="store_true", help="Panggil LLM sungguhan (default: stub)")
+        parser.add_argument("--json", default=None, help="Tulis hasil ke file JSON")
+        parser.add_argument("--child", action="store_true", help="(internal) mode proses anak pengukur TTFA")
+
+    def handle(self, *args, **opts):
+        if opts["child"]:
+            return self._child(opts["llm"])
+
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "stuntingbot.settings")
+        result = {
+            "imports": self._import_times(env, opts["top"]),
+            "first_answer": self._first_answer(env, opts["llm"]),
+        }
+        if opts["json"]:
+            Path(opts["json"]).write_text(json.dumps(result, indent=2), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Hasil ditulis ke {opts['json']}"))
+
+    def _import_times(self, env, top):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _IMPORT_PROBE],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"probe import gagal:\n{proc.stderr[-2000:]}")
+
+        rows = []
+        for line in proc.stderr.splitlines():
+            m = _IMPORTTIME_RE.match(line)
+            if m:
+                self_us, cumulative_us, indent, name = m.groups()
+                rows.append(
+                    {
+                        "module": name,
+                        "self_s": int(self_us) / 1e6,
+                        "cumulative_s": int(cumulative_us) / 1e6,
+                        "depth": (len(indent) - 1) // 2,
+                    }
+                )
+
+        # level teratas = biaya yang benar-benar dibayar proses; sisanya tercakup di cumulative induknya
+        roots = sorted((r for r in rows if r["depth"] == 0), key=lambda r: r["cumulative_s"], reverse=True)
+        total = sum(r["cumulative_s"] for r in roots)
+        self.stdout.write(f"[IMPORT] total={_fmt(total)} modules={len(rows)}")
+        for r in roots[:top]:
+            self.stdout.write(f"  {_fmt(r['cumulative_s'])} (self {_fmt(r['self_s'])})  {r['module']}")
+
+        ours = [r for r in rows if r["module"].split(".")[0] in ("ragapi", "consultations", "stuntingbot")]
+        self.stdout.write("[IMPORT] modul proyek:")
+        for r in sorted(ours, key=lambda r: r["self_s"], reverse=True)[:top]:
+            self.stdout.write(f"  {_fmt(r['self_s'])} self  {r['module']}")
+        return {"total_s": total, "top": roots[:top], "project": ours}
+
+    def _first_answer(self, env, llm):
+        cmd = [sys.executable, "manage.py", "rag_startup_profile", "--child"] + (["--llm"] if llm else [])
+        spawned = time.time()
+        proc = subprocess.run(
+            cmd,
+            cwd=settings.BASE_DIR,
+            env={**env, "RAG_PROFILE_SPAWNED_AT": repr(spawned)},
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"pengukuran time-to-first-answer gagal:\n{proc.stderr[-2000:]}")
+        data = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        self.stdout.write(f"[TTFA] llm={'real' if llm else 'stub'}")
+        for name, seconds in data.items():
+            self.stdout.write(f"  {_fmt(seconds)}  {name}")
+        return data
+
+    def _child(self, llm):
+        """
+        Dijalankan di proses baru: ukur dari spawn sampai jawaban pertama selesai.
+        Autofetch dimatikan supaya angka tidak bergantung jaringan provider.
+        """
+        spawned = float(os.environ.get("RAG_PROFILE_SPAWNED_AT", time.time()))
+        timings = {"spawn_to_django_ready": time.time() - spawned}
+
+        t0 = time.perf_counter()
+        from consultations.models import Consultation
+        from ragapi.hybrid import answer_hybrid
+
+        timings["import_pipeline"] = time.perf_counter() - t0
+
+        c = Consultation(
+            mode="balita",
+            age_value=24,
+            age_unit="months",
+            sex="male",
+            weight_kg=10.5,
+            height_cm=82.0,
+            measurement_type="height",
+            user_question="Apakah anak saya berisiko stunting dan MP-ASI apa yang dianjurkan?",
+        )
+
+        patcher = nullcontext() if llm else mock.patch("ragapi.hybrid.chat", return_value="(stub)")
+        with override_settings(RAG_AUTOFETCH_MODE="off"), patcher:
+            t0 = time.perf_counter()
+            answer_hybrid(c, use_cache=False)
+            timings["first_answer"] = time.perf_counter() - t0
+            timings["spawn_to_first_answer"] = time.time() - spawned
+
+            t0 = time.perf_counter()
+            answer_hybrid(c, use_cache=False)
+            timings["second_answer"] = time.perf_counter() - t0
+
+        self.stdout.write(json.dumps(timings))
@@ -0,0 +1,290 @@
+"""
+Metrik in-process tanpa dependensi eksternal: durasi per tahap (histogram) dan counter,
+diekspos dalam format teks Prometheus di GET /api/metrics/.
+
+    with metrics.span("retrieve.vector"):
+        ...
+    metrics.inc("chunks_embedded", len(batch))
+
+Nama span bertingkat dengan titik (process.vision, answer.generation, ingest.embed, ...).
+Selama collect_timings() aktif, span dan counter di thread yang sama (dan fungsi yang
+dijalankan lewat metrics.bind di thread pool) juga dikumpulkan per request untuk breakdown.
+"""
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_METRIC = "rag_stage_duration_seconds"
+
+_HELP = {
+    STAGE_METRIC: "Durasi tiap tahap pipeline (span).",
+    "rag_chunks_embedded_total": "Chunk PDF yang di-embed saat ingest.",
+    "rag_texts_encoded_total": "Teks yang benar-benar di-encode model (miss cache embedding).",
+    "rag_download_bytes_total": "Byte PDF yang diunduh.",
+    "rag_downloads_total": "Unduhan PDF per hasil.",
+    "rag_llm_tokens_total": "Token LLM per jenis panggilan (prompt/completion).",
+    "rag_dedup_chunks_total": "Chunk ingest yang dicek near-duplicate, per hasil (unique/duplicate).",
+    "rag_dedup_chars_skipped_total": "Karakter chunk near-duplicate yang tidak di-embed.",
+    "rag_autofetch_decisions_total": "Keputusan gating: bukti cukup, autofetch, antre background, atau mati.",
+    "rag_autofetch_trigger_ratio": "Porsi retrieval yang memicu autofetch (sinkron atau background).",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # elemen terakhir = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Timings:
+    """
+    Pengumpul per request: total durasi + jumlah tiap span, dan total tiap counter.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+
+    def add_span(self, name: str, seconds: float):
+        with self._lock:
+            total, count = self.spans.get(name, (0.0, 0))
+            self.spans[name] = (total + seconds, count + 1)
+
+    def add_counter(self, name: str, value: float):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"seconds": round(total, 4), "count": count}
+                    for name, (total, count) in sorted(self.spans.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+_lock = threading.Lock()
+_histograms = {}  # (nama metrik, labels) → Histogram
+_counters = {}  # (nama metrik, labels) → nilai
+_current = contextvars.ContextVar("rag_metrics_timings", default=None)
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(metric: str, value: float, **labels):
+    key = (metric, _labels_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+def record_span(name: str, seconds: float, status: str = "ok"):
+    observe(STAGE_METRIC, seconds, stage=name, status=status)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_span(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Ukur durasi blok; span yang berakhir dengan exception diberi label status="error".
+    """
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_span(name, time.perf_counter() - t0, status)
+
+
+def timed_iter(name: str, iterable):
+    """
+    Generator pembungkus: total waktu menunggu item berikutnya dicatat sebagai satu span.
+    Untuk pipeline streaming (parsing PDF, unduhan) yang diselingi pekerjaan lain.
+    """
+    it = iter(iterable)
+    waited = 0.0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                waited += time.perf_counter() - t0
+                return
+            waited += time.perf_counter() - t0
+            yield item
+    finally:
+        record_span(name, waited)
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Tambah counter rag_<name>_total. Nilai 0 tetap membuat seri (muncul di /metrics).
+    """
+    key = (f"rag_{name}_total", _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    timings = _current.get()
+    if timings is not None:
+        suffix = "".join(f".{v}" for _, v in _labels_key(labels))
+        timings.add_counter(f"{name}{suffix}", value)
+
+
+@contextmanager
+def collect_timings():
+    """
+    Kumpulkan span/counter untuk satu request (contextvar, aman untuk request paralel).
+    """
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def bind(fn):
+    """
+    Bungkus fn supaya dijalankan dalam salinan context pemanggil (untuk executor.submit),
+    sehingga span di thread worker ikut masuk breakdown request.
+    """
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+# ----- eksposisi Prometheus -----
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _fmt_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value == value else "NaN"
+    return str(value)
+
+
+def _header(lines: list, metric: str, kind: str):
+    if metric in _HELP:
+        lines.append(f"# HELP {metric} {_HELP[metric]}")
+    lines.append(f"# TYPE {metric} {kind}")
+
+
+def _stat_sources() -> dict:
+    """
+    Statistik cache/scheduler yang sudah ada, diambil saat scrape.
+    """
+    from .dedup import dedup_stats
+    from .embeddings import embed_scheduler_stats, embedding_cache_stats
+    from .openrouter_client import generation_cache_stats
+    from .retrieval import retrieval_cache_stats
+    from .vision import vision_cache_stats
+
+    return {
+        "rag_cache": {
+            "embeddings": embedding_cache_stats,
+            "retrieval": retrieval_cache_stats,
+            "generations": generation_cache_stats,
+            "vision": vision_cache_stats,
+        },
+        "rag_embed_scheduler": {"default": embed_scheduler_stats},
+        "rag_dedup": {"default": dedup_stats},
+    }
+
+
+def _gauge_lines(counters) -> list[str]:
+    # {nama metrik: [(labels, nilai)]}
+    gauges = {}
+    for prefix, sources in _stat_sources().items():
+        for source, fn in sources.items():
+            try:
+                stats = fn()
+            except Exception as e:
+                logger.warning(f"[METRICS] stats {source} gagal: {type(e).__name__}: {e}")
+                continue
+            for stat, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                labels = (("cache", source),) if prefix == "rag_cache" else ()
+                gauges.setdefault(f"{prefix}_{stat}", []).append((labels, value))
+
+    decisions = {
+        dict(labels).get("decision"): value
+        for (metric, labels), value in counters
+        if metric == "rag_autofetch_decisions_total"
+    }
+    total = sum(decisions.values())
+    if total:
+        triggered = decisions.get("triggered", 0) + decisions.get("queued", 0)
+        gauges["rag_autofetch_trigger_ratio"] = [((), triggered / total)]
+
+    lines = []
+    for metric in sorted(gauges):
+        _header(lines, metric, "gauge")
+        for labels, value in gauges[metric]:
+            lines.append(f"{metric}{_fmt_labels(labels)} {_fmt_value(value)}")
+    return lines
+
+
+def render_prometheus() -> str:
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            (key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in _histograms.items()
+        )
+
+    lines = []
+    seen = set()
+    for (metric, labels), value in counters:
+        if metric not in seen:
+            seen.add(metric)
+            _header(lines, metric, "counter")
+        lines.append(f"{metric}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+    for (metric, labels), (counts, total, count, buckets) in histograms:
+        if metric not in seen:
+            seen.add(metric)
+            _header(lines, metric, "histogram")
+        cumulative = 0
+        for le, n in zip([*map(str, buckets), "+Inf"], counts):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_fmt_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{metric}_sum{_fmt_labels(labels)} {_fmt_value(total)}")
+        lines.append(f"{metric}_count{_fmt_labels(labels)} {count}")
+
+    lines.extend(_gauge_lines(counters))
+    return "\n".join(lines) + "\n"
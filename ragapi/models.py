@@ -1,3 +1,39 @@
 from django.db import models
+from django.db.models import Q
 
-# Create your models here.
+
+class EnrichmentJob(models.Model):
+    """
+    Job autofetch+ingest di background (dipicu saat evidence lemah).
+    Job pending/running dengan query_hash yang sama tidak boleh dobel.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    query_hash = models.CharField(max_length=64, db_index=True)
+    query = models.TextField()
+    max_papers = models.PositiveIntegerField(default=3)
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True)
+    inserted_chunks = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["query_hash"],
+                condition=Q(status__in=["pending", "running"]),
+                name="uniq_active_enrichment_query",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.status} | {self.query_hash[:12]} | {self.created_at:%Y-%m-%d %H:%M}"
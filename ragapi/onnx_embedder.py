@@ -0,0 +1,94 @@
+"""
+Backend embedding ONNX Runtime (CPU) untuk all-MiniLM-L6-v2.
+
+Model diekspor sekali lewat `python manage.py rag_export_onnx` ke RAG_ONNX_MODEL_DIR:
+  model.onnx, model_int8.onnx (opsional, kuantisasi dinamis), tokenizer.json
+Pooling dan normalisasi sama dengan SentenceTransformer (mean pooling + L2),
+jadi vektor yang dihasilkan setara dengan backend PyTorch.
+"""
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_SEQ_LENGTH = 256  # sama dengan max_seq_length all-MiniLM-L6-v2 di sentence-transformers
+
+
+def model_filename(quantized: bool) -> str:
+    return "model_int8.onnx" if quantized else "model.onnx"
+
+
+class OnnxEmbedder:
+    """
+    Antarmuka minimal mirip SentenceTransformer.encode supaya bisa dipakai oleh embeddings._encode.
+    """
+
+    def __init__(self, model_dir, quantized: bool = False, threads: int = 0):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "RAG_EMBED_BACKEND=onnx membutuhkan paket onnxruntime dan tokenizers"
+            ) from e
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / model_filename(quantized)
+        if not model_path.exists():
+            raise RuntimeError(f"model ONNX tidak ditemukan: {model_path} (jalankan rag_export_onnx)")
+
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # satu forward pass = satu operator berat berturut-turut; paralelisme cukup di intra-op
+        opts.intra_op_num_threads = threads or os.cpu_count() or 1
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(model_path), sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.threads = opts.intra_op_num_threads
+        self.max_seq_length = MAX_SEQ_LENGTH
+        self.quantized = quantized
+
+    def _run(self, encodings) -> np.ndarray:
+        width = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention = np.zeros((len(encodings), width), dtype=np.int64)
+        for i, e in enumerate(encodings):
+            input_ids[i, : len(e.ids)] = e.ids
+            attention[i, : len(e.ids)] = 1
+
+        feed = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        token_embs = self.session.run(None, feed)[0]
+
+        # mean pooling hanya pada token asli (bukan padding)
+        mask = attention[..., None].astype(np.float32)
+        return (token_embs * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, texts, normalize_embeddings: bool = True, batch_size: int = 32, show_progress_bar: bool = False):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(texts)
+        # kelompokkan teks dengan panjang mirip supaya padding per batch minimal
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        out = None
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            vecs = self._run([encodings[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
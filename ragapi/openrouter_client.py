@@ -1,27 +1,173 @@
-from openai import OpenAI
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
 from django.conf import settings
 
-_client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=settings.OPENROUTER_API_KEY,
-)
+from . import metrics
+from .cache_store import SQLiteCache
+
+_client = None
+_client_lock = threading.Lock()
+_cache = None
+_stats_lock = threading.Lock()
+_latency_saved = 0.0
+
+
+def get_client():
+    """
+    Client OpenRouter dibuat saat pertama dipakai (import SDK openai ikut ditunda).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+
+                _client = OpenAI(
+                    base_url="https://openrouter.ai/api/v1",
+                    api_key=settings.OPENROUTER_API_KEY,
+                )
+    return _client
+
+
+def get_generation_cache() -> SQLiteCache | None:
+    """
+    Cache jawaban LLM (SQLite) dengan TTL + batas jumlah entry; None jika dimatikan.
+    """
+    global _cache
+    if not settings.RAG_GENERATION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = SQLiteCache(
+            Path(settings.RAG_CACHE_DIR) / "generations.sqlite3",
+            max_entries=settings.RAG_GENERATION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RAG_GENERATION_CACHE_TTL,
+        )
+    return _cache
+
+
+def generation_cache_stats() -> dict:
+    cache = get_generation_cache()
+    if cache is None:
+        return {}
+    return {**cache.stats(), "latency_saved_seconds": round(_latency_saved, 3)}
+
+
+def _generation_key(model: str, max_tokens: int, messages) -> str:
+    payload = json.dumps(
+        {"model": model, "max_tokens": max_tokens, "messages": messages},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_lookup(cache, key: str) -> str | None:
+    global _latency_saved
+    raw = cache.get(key)
+    if raw is None:
+        return None
+    entry = json.loads(raw)
+    with _stats_lock:
+        _latency_saved += entry.get("latency", 0.0)
+    return entry["content"]
+
+
+def _cache_store(cache, key: str, content: str, latency: float):
+    if content:
+        cache.set(key, json.dumps({"content": content, "latency": latency}).encode("utf-8"))
 
-def chat(messages, max_tokens=1000):
-    resp = _client.chat.completions.create(
-        model=settings.OPENROUTER_MODEL,
+
+def _record_usage(call: str, usage):
+    """
+    Catat token prompt/completion dari field usage respons provider (jika ada).
+    """
+    if usage is None:
+        return
+    metrics.inc("llm_tokens", getattr(usage, "prompt_tokens", 0) or 0, call=call, kind="prompt")
+    metrics.inc("llm_tokens", getattr(usage, "completion_tokens", 0) or 0, call=call, kind="completion")
+
+
+def chat(messages, max_tokens=1000, use_cache=True):
+    """
+    use_cache=False: lewati cache (tetap menulis hasil baru ke cache).
+    """
+    model = settings.OPENROUTER_MODEL
+    cache = get_generation_cache()
+    key = _generation_key(model, max_tokens, messages) if cache else None
+
+    if cache and use_cache:
+        content = _cache_lookup(cache, key)
+        if content is not None:
+            return content
+
+    t0 = time.perf_counter()
+    with metrics.span("llm.chat"):
+        resp = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+    _record_usage("chat", resp.usage)
+    content = resp.choices[0].message.content
+    if cache:
+        _cache_store(cache, key, content, time.perf_counter() - t0)
+    return content
+
+
+def chat_stream(messages, max_tokens=1000, use_cache=True):
+    """
+    Streaming completion: yield potongan teks segera setelah diterima dari provider.
+    Jika ada di cache, seluruh jawaban dikirim sebagai satu potongan.
+    """
+    model = settings.OPENROUTER_MODEL
+    cache = get_generation_cache()
+    key = _generation_key(model, max_tokens, messages) if cache else None
+
+    if cache and use_cache:
+        content = _cache_lookup(cache, key)
+        if content is not None:
+            yield content
+            return
+
+    t0 = time.perf_counter()
+    stream = get_client().chat.completions.create(
+        model=model,
         messages=messages,
         max_tokens=max_tokens,
+        stream=True,
+        # event terakhir (tanpa choices) membawa usage token
+        stream_options={"include_usage": True},
     )
-    return resp.choices[0].message.content
+    parts = []
+    for event in stream:
+        _record_usage("stream", getattr(event, "usage", None))
+        if not event.choices:
+            continue
+        delta = event.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    # termasuk jeda konsumen di antara potongan (durasi stream dari sisi klien)
+    metrics.record_span("llm.stream", time.perf_counter() - t0)
+    if cache:
+        _cache_store(cache, key, "".join(parts), time.perf_counter() - t0)
 
 
 def chat_vision(messages, max_tokens=800):
     """
     Messages dapat berisi content list dengan tipe text dan image_url.
     """
-    resp = _client.chat.completions.create(
-        model=settings.OPENROUTER_MODEL,
-        messages=messages,
-        max_tokens=max_tokens,
-    )
+    with metrics.span("llm.vision"):
+        resp = get_client().chat.completions.create(
+            model=settings.OPENROUTER_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+    _record_usage("vision", resp.usage)
     return resp.choices[0].message.content
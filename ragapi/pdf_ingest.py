@@ -1,51 +1,71 @@
+import os
 import re
-import uuid
+import hashlib
 import logging
+from django.conf import settings
 from pypdf import PdfReader
 
-from tqdm import tqdm
 from .embeddings import embed, get_device_info
-from .chroma_client import get_collection
+from .chroma_client import get_collection, upsert_chunks, delete_chunks
+from . import dedup, ingest_manifest, metrics, token_chunker
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-)
 
+CHUNK_MAX_CHARS = 1800
+CHUNK_OVERLAP = 200
 
-def pdf_to_text(
+# "chars": window karakter (CHUNK_MAX_CHARS/CHUNK_OVERLAP)
+# "tokens": kalimat utuh sampai batas token embedder (lihat token_chunker)
+CHUNKERS = ("chars", "tokens")
+
+
+def iter_pdf_pages(
     pdf_path: str,
     max_pages: int | None = 50,
     max_chars: int = 300_000,
-) -> str:
-    logger.info(f"[PDF] Reading: {pdf_path}")
+    stats: dict | None = None,
+):
+    """
+    Generator teks per halaman: yield (page_no, text), page_no mulai dari 1.
+    Hanya satu halaman yang dipegang di memori pada satu waktu.
+    Jika stats diberikan, diisi {"pages": halaman terbaca, "chars": total karakter}.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("pages", 0)
+    stats.setdefault("chars", 0)
 
     reader = PdfReader(pdf_path)
-    parts = []
     pages = reader.pages[:max_pages] if max_pages else reader.pages
 
-    total = 0
     for i, page in enumerate(pages, start=1):
+        stats["pages"] = i
         txt = page.extract_text() or ""
-        if not txt:
-            continue
 
-        txt = re.sub(r"\n{3,}", "\n\n", txt)
         txt = re.sub(r"[ \t]+\n", "\n", txt)
+        txt = re.sub(r"\n{3,}", "\n\n", txt).strip()
+        if not txt:
+            continue
 
-        parts.append(txt)
-        total += len(txt)
+        stats["chars"] += len(txt)
+        yield i, txt
 
         if i % 5 == 0:
-            logger.info(f"[PDF]  extracted page {i}, chars={total}")
+            logger.info(f"[PDF]  extracted page {i}, chars={stats['chars']}")
 
-        if total >= max_chars:
+        if stats["chars"] >= max_chars:
             logger.warning(f"[PDF]  reached max_chars={max_chars}, stopping extraction")
             break
 
-    text = "\n".join(parts).strip()
-    text = re.sub(r"\n{3,}", "\n\n", text)
+
+def pdf_to_text(
+    pdf_path: str,
+    max_pages: int | None = 50,
+    max_chars: int = 300_000,
+) -> str:
+    logger.info(f"[PDF] Reading: {pdf_path}")
+
+    text = "\n".join(txt for _, txt in iter_pdf_pages(pdf_path, max_pages=max_pages, max_chars=max_chars))
 
     logger.info(f"[PDF] Finished extraction, total chars={len(text)}")
     return text
@@ -77,71 +97,372 @@ def chunk_text_iter(text: str, max_chars: int = 1800, overlap: int = 200):
             i = 0
 
 
-def upsert_pdf(pdf_path: str, paper_meta: dict, batch_size: int = 64) -> int:
+def chunk_pages_iter(pages, max_chars: int = 1800, overlap: int = 200):
+    """
+    Versi streaming dari chunk_text_iter untuk input per halaman.
+    pages: iterable (page_no, text), mis. dari iter_pdf_pages.
+    Yield (chunk, page_start, page_end). Sisa teks di akhir halaman dibawa
+    ke halaman berikutnya, jadi batas chunk sama seperti chunk_text_iter
+    atas teks gabungan (halaman digabung dengan "\n").
+    """
+    if overlap >= max_chars:
+        raise ValueError("overlap harus lebih kecil dari max_chars")
+
+    buf = ""
+    # (offset awal di buf, page_no), terurut naik
+    spans = []
+
+    def page_at(offset):
+        page = spans[0][1]
+        for start, page_no in spans:
+            if start > offset:
+                break
+            page = page_no
+        return page
+
+    def take(i, j):
+        c = buf[i:j].strip()
+        return (c, page_at(i), page_at(max(j - 1, i))) if c else None
+
+    for page_no, txt in pages:
+        if buf:
+            buf += "\n"
+        spans.append((len(buf), page_no))
+        buf += txt
+
+        i = 0
+        # masih ada teks sesudah window ini → pasti bukan chunk terakhir
+        while len(buf) - i > max_chars:
+            item = take(i, i + max_chars)
+            if item:
+                yield item
+            i += max_chars - overlap
+
+        if i:
+            buf = buf[i:]
+            shifted = [(start - i, p) for start, p in spans]
+            # pertahankan span yang mencakup offset 0
+            keep = [s for s in shifted if s[0] > 0]
+            head = [s for s in shifted if s[0] <= 0][-1:]
+            spans = [(0, head[0][1])] + keep if head else keep
+
+    # flush: sama dengan langkah terakhir chunk_text_iter
+    if buf:
+        item = take(0, len(buf))
+        if item:
+            yield item
+
+
+def _resolve_chunker(chunker: str | None = None) -> str:
+    chunker = chunker or settings.RAG_CHUNKER
+    if chunker not in CHUNKERS:
+        raise ValueError(f"RAG_CHUNKER tidak dikenal: {chunker!r} (pilihan: {', '.join(CHUNKERS)})")
+    return chunker
+
+
+def chunk_pages(pages, chunker: str | None = None):
+    """
+    Chunk per halaman dengan chunker terpilih (default RAG_CHUNKER).
+    Yield (chunk, page_start, page_end).
+    """
+    if _resolve_chunker(chunker) == "tokens":
+        return token_chunker.chunk_pages_iter(pages)
+    return chunk_pages_iter(pages, max_chars=CHUNK_MAX_CHARS, overlap=CHUNK_OVERLAP)
+
+
+def chunker_tag(chunker: str | None = None) -> str:
+    """
+    Identitas parameter chunking; ikut masuk ke chunk ID dan manifest.
+    """
+    if _resolve_chunker(chunker) == "tokens":
+        return token_chunker.chunker_tag()
+    return f"pages-chars{CHUNK_MAX_CHARS}o{CHUNK_OVERLAP}"
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(file_hash: str, chunk_index: int, chunker: str | None = None) -> str:
+    """
+    ID deterministik: isi PDF + parameter chunking + posisi chunk.
+    Ingest ulang file yang sama menimpa chunk lama, bukan menduplikasi.
+    """
+    return f"{file_hash[:32]}-{chunker or chunker_tag()}-{chunk_index}"
+
+
+def source_key(pdf_path: str, paper_meta: dict) -> str:
+    return paper_meta.get("pdf_url") or os.path.abspath(pdf_path)
+
+
+def already_ingested(file_hash: str) -> dict | None:
+    return ingest_manifest.lookup(file_hash, chunker_tag())
+
+
+def finalize_ingest(file_hash: str, pdf_path: str, paper_meta: dict, chunk_count: int, pages: int | None = None):
+    """
+    Setelah semua chunk tertulis:
+    - hapus chunk versi lama dari dokumen yang sama (isi atau chunker berubah)
+    - hapus chunk lama tanpa file_hash (hasil ingest sebelum ada ID deterministik)
+    - catat ke manifest
+    """
+    paper_id = paper_meta.get("paper_id")
+    key = source_key(pdf_path, paper_meta)
+    col = get_collection()
+
+    stale = ingest_manifest.stale_entries(paper_id, key, file_hash, chunker_tag())
+    for entry in stale:
+        old_ids = [chunk_id(entry["file_hash"], i, entry["chunker"]) for i in range(entry["chunk_count"])]
+        if old_ids:
+            logger.info(
+                f"[INGEST] Removing {len(old_ids)} stale chunks of {paper_id} "
+                f"(file_hash={entry['file_hash'][:12]}, chunker={entry['chunker']})"
+            )
+            delete_chunks(old_ids)
+    ingest_manifest.forget(stale)
+
+    if paper_id:
+        existing = col.get(where={"paper_id": paper_id}, include=["metadatas"])
+        legacy_ids = [
+            cid
+            for cid, meta in zip(existing.get("ids") or [], existing.get("metadatas") or [])
+            if not (meta or {}).get("file_hash")
+        ]
+        if legacy_ids:
+            logger.info(f"[INGEST] Removing {len(legacy_ids)} legacy chunks of {paper_id}")
+            delete_chunks(legacy_ids)
+
+    ingest_manifest.record(
+        file_hash,
+        chunker_tag(),
+        paper_id=paper_id,
+        source_key=key,
+        chunk_count=chunk_count,
+        pages=pages,
+    )
+
+
+def _chunk_meta(
+    paper_meta: dict,
+    chunk_index: int,
+    file_hash: str | None = None,
+    page_start: int | None = None,
+    page_end: int | None = None,
+) -> dict:
+    return {
+        "paper_id": paper_meta.get("paper_id"),
+        "title": paper_meta.get("title"),
+        "year": paper_meta.get("year"),
+        "doi": paper_meta.get("doi"),
+        "source": paper_meta.get("source", "oa"),
+        "pdf_url": paper_meta.get("pdf_url"),
+        "landing_url": paper_meta.get("landing_url") or paper_meta.get("url"),
+        "file_hash": file_hash,
+        "chunk_index": chunk_index,
+        "page_start": page_start,
+        "page_end": page_end,
+    }
+
+
+def iter_pdf_chunks(pdf_path: str, paper_meta: dict, file_hash: str, stats: dict | None = None):
+    """
+    Pipeline generator: halaman → chunk → (id, doc, meta).
+    Chunk pertama sudah bisa diproses sebelum halaman berikutnya diparsing.
+    """
+    pages = iter_pdf_pages(pdf_path, max_pages=50, max_chars=300_000, stats=stats)
+    chunks = chunk_pages(pages)
+    for chunk_index, (chunk, page_start, page_end) in enumerate(chunks):
+        yield (
+            chunk_id(file_hash, chunk_index),
+            chunk,
+            _chunk_meta(paper_meta, chunk_index, file_hash, page_start, page_end),
+        )
+
+
+def extract_pdf_chunks(pdf_path: str, paper_meta: dict, file_hash: str | None = None) -> dict:
+    """
+    Tahap CPU-only (tanpa embedding / Chroma): PDF → teks → chunk + metadata.
+    Aman dijalankan di worker process (input/output picklable).
+    Return: {"ids": [...], "docs": [...], "metas": [...], "pages": int, "chars": int, "file_hash": str}
+    """
+    if file_hash is None:
+        file_hash = file_sha256(pdf_path)
+
+    logger.info(f"[PDF] Reading: {pdf_path}")
+    stats = {}
+    result = {"ids": [], "docs": [], "metas": [], "file_hash": file_hash}
+    for cid, chunk, meta in iter_pdf_chunks(pdf_path, paper_meta, file_hash, stats=stats):
+        result["ids"].append(cid)
+        result["docs"].append(chunk)
+        result["metas"].append(meta)
+
+    result["pages"] = stats.get("pages", 0)
+    result["chars"] = stats.get("chars", 0)
+    if result["chars"] < 500:
+        logger.warning(f"[INGEST] Text too short, skipping PDF ({pdf_path})")
+        result["ids"], result["docs"], result["metas"] = [], [], []
+    return result
+
+
+def drop_near_duplicates(ids, docs, metas):
+    """
+    Pisahkan chunk yang near-duplicate dengan chunk dokumen lain (RAG_DEDUP_MODE="skip"/"link").
+    Read-only: index dedup baru berubah setelah upsert (upsert_chunks) dan commit_near_duplicates.
+    Return (ids, docs, metas yang masih perlu di-embed, duplicates).
+    """
+    if not ids or not dedup.enabled():
+        return ids, docs, metas, []
+    with metrics.span("ingest.dedup"):
+        keep, duplicates = dedup.partition(ids, docs, metas)
+    if not duplicates:
+        return ids, docs, metas, []
+    return [ids[i] for i in keep], [docs[i] for i in keep], [metas[i] for i in keep], duplicates
+
+
+def _write_chunks(ids, docs, metas) -> int:
+    if not ids:
+        return 0
+    with metrics.span("ingest.embed"):
+        embs = embed(docs, show_progress=False, as_numpy=True)
+    metrics.inc("chunks_embedded", len(docs))
+    with metrics.span("ingest.upsert"):
+        upsert_chunks(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
+    return len(ids)
+
+
+def commit_near_duplicates(duplicates, checked: int, chars_checked: int) -> int:
+    """
+    Dipanggil setelah chunk unik dari batch yang sama tertulis: simpan duplikat ke index dedup
+    (supaya bisa dipulihkan jika chunk kanoniknya dihapus) dan catat metrik.
+    Duplikat yang chunk kanoniknya hilang sementara itu di-embed sebagai chunk biasa.
+    Return jumlah chunk yang ditulis ke Chroma.
+    """
+    if not dedup.enabled():
+        return 0
+    orphans = dedup.record_duplicates(duplicates, checked=checked, chars_checked=chars_checked)
+    orphan_ids = {o["chunk_id"] for o in orphans}
+    skipped = [d for d in duplicates if d["chunk_id"] not in orphan_ids]
+    skipped_chars = sum(len(d["document"]) for d in skipped)
+    metrics.inc("dedup_chunks", checked - len(skipped), result="unique")
+    metrics.inc("dedup_chunks", len(skipped), result="duplicate")
+    if skipped:
+        metrics.inc("dedup_chars_skipped", skipped_chars)
+        logger.info(
+            f"[DEDUP] {len(skipped)}/{checked} chunk near-duplicate tidak di-embed "
+            f"({skipped_chars} chars, mode={settings.RAG_DEDUP_MODE})"
+        )
+    return _write_chunks(
+        [d["chunk_id"] for d in orphans],
+        [d["document"] for d in orphans],
+        [d["metadata"] for d in orphans],
+    )
+
+
+def _embed_and_upsert(ids, docs, metas) -> int:
+    """
+    Return jumlah chunk yang benar-benar di-embed + ditulis (setelah dedup).
+    """
+    checked, chars_checked = len(ids), sum(len(d) for d in docs)
+    ids, docs, metas, duplicates = drop_near_duplicates(ids, docs, metas)
+    written = _write_chunks(ids, docs, metas)
+    return written + commit_near_duplicates(duplicates, checked, chars_checked)
+
+
+def restore_duplicates(orphans) -> int:
+    """
+    Ingest ulang chunk near-duplicate yang chunk kanoniknya dihapus (dari delete_chunks).
+    Chunk dicek ulang terhadap index, jadi bisa langsung menempel ke kanonik lain
+    (mis. versi baru dokumen yang sama); sisanya di-embed dan ditulis.
+    """
+    written = _embed_and_upsert(
+        [o["chunk_id"] for o in orphans],
+        [o["document"] for o in orphans],
+        [o["metadata"] for o in orphans],
+    )
+    logger.info(f"[DEDUP] {len(orphans)} chunk duplikat kehilangan chunk kanonik, {written} di-embed ulang")
+    return written
+
+
+@metrics.span("ingest")
+def upsert_pdf(
+    pdf_path: str,
+    paper_meta: dict,
+    batch_size: int = 64,
+    force: bool = False,
+    stats: dict | None = None,
+) -> int:
+    """
+    Ingest satu PDF secara streaming: halaman diparsing, di-chunk, lalu
+    di-embed + upsert per batch sambil halaman berikutnya masih dibaca.
+    File yang isinya sudah tercatat di manifest dilewati (return 0) kecuali force=True.
+    Jika stats diberikan, diisi {"pages", "chars", "unchanged", "duplicates"}.
+    Return jumlah chunk yang ditulis (chunk near-duplicate tidak dihitung).
+    """
+    if stats is None:
+        stats = {}
+    stats.update(pages=0, chars=0, unchanged=False, duplicates=0)
     logger.info(f"[INGEST] Start PDF: {paper_meta.get('title')} ({pdf_path})")
-    logger.info(f"[EMBED] Device: {get_device_info()}")
 
-    text = pdf_to_text(pdf_path, max_pages=50, max_chars=300_000)
-    if len(text) < 500:
-        logger.warning("[INGEST] Text too short, skipping PDF")
+    file_hash = file_sha256(pdf_path)
+    if not force and already_ingested(file_hash):
+        logger.info(f"[INGEST] Unchanged (file_hash={file_hash[:12]}), skipping PDF")
+        stats["unchanged"] = True
         return 0
 
-    col = get_collection()
+    logger.info(f"[EMBED] Device: {get_device_info()}")
+
+    total_chunks = 0  # semua indeks chunk (termasuk duplikat) → dipakai manifest untuk hapus versi lama
     total_inserted = 0
 
     batch_docs, batch_ids, batch_metas = [], [], []
-    chunk_index = 0
 
-    # progress bar tanpa total (anti hang, tetap bergerak)
+    # progress bar tanpa total (anti hang, tetap bergerak); tqdm hanya di-import di jalur ingest
+    from tqdm import tqdm
+
     pbar = tqdm(
         desc=f"Ingest {paper_meta.get('title')}",
         unit="chunk",
         dynamic_ncols=True,
     )
 
-    for chunk in chunk_text_iter(text, max_chars=1800, overlap=200):
+    # ingest.extract = waktu parsing PDF + chunking (diselingi embed/upsert per batch)
+    chunks = metrics.timed_iter("ingest.extract", iter_pdf_chunks(pdf_path, paper_meta, file_hash, stats=stats))
+    for cid, chunk, meta in chunks:
         batch_docs.append(chunk)
-        batch_ids.append(str(uuid.uuid4()))
-        batch_metas.append(
-            {
-                "paper_id": paper_meta.get("paper_id"),
-                "title": paper_meta.get("title"),
-                "year": paper_meta.get("year"),
-                "doi": paper_meta.get("doi"),
-                "source": paper_meta.get("source", "oa"),
-                "pdf_url": paper_meta.get("pdf_url"),
-                "landing_url": paper_meta.get("landing_url") or paper_meta.get("url"),
-                "chunk_index": chunk_index,
-            }
-        )
-        chunk_index += 1
+        batch_ids.append(cid)
+        batch_metas.append(meta)
         pbar.update(1)
 
         if len(batch_docs) >= batch_size:
-            logger.info(f"[EMBED] Embedding+Upsert batch. total={total_inserted + len(batch_docs)}")
-            embs = embed(batch_docs, show_progress=False)
-            col.upsert(
-                ids=batch_ids,
-                documents=batch_docs,
-                metadatas=batch_metas,
-                embeddings=embs,
-            )
-            total_inserted += len(batch_docs)
+            logger.info(f"[EMBED] Embedding+Upsert batch. total={total_chunks + len(batch_docs)}")
+            total_inserted += _embed_and_upsert(batch_ids, batch_docs, batch_metas)
+            total_chunks += len(batch_docs)
             batch_docs, batch_ids, batch_metas = [], [], []
 
+    if total_chunks == 0 and stats.get("chars", 0) < 500:
+        pbar.close()
+        logger.warning("[INGEST] Text too short, skipping PDF")
+        finalize_ingest(file_hash, pdf_path, paper_meta, chunk_count=0, pages=stats.get("pages"))
+        return 0
+
     # flush sisa batch
     if batch_docs:
-        logger.info(f"[EMBED] Embedding+Upsert final batch. total={total_inserted + len(batch_docs)}")
-        embs = embed(batch_docs, show_progress=False)
-        col.upsert(
-            ids=batch_ids,
-            documents=batch_docs,
-            metadatas=batch_metas,
-            embeddings=embs,
-        )
-        total_inserted += len(batch_docs)
+        logger.info(f"[EMBED] Embedding+Upsert final batch. total={total_chunks + len(batch_docs)}")
+        total_inserted += _embed_and_upsert(batch_ids, batch_docs, batch_metas)
+        total_chunks += len(batch_docs)
 
     pbar.close()
 
-    logger.info(f"[DONE] PDF ingested: {paper_meta.get('title')} → {total_inserted} chunks")
+    finalize_ingest(file_hash, pdf_path, paper_meta, chunk_count=total_chunks, pages=stats.get("pages"))
+
+    skipped = total_chunks - total_inserted
+    stats["duplicates"] = max(skipped, 0)
+    logger.info(
+        f"[DONE] PDF ingested: {paper_meta.get('title')} → {total_inserted} chunks"
+        + (f" ({skipped} near-duplicate dilewati)" if skipped else "")
+    )
     return total_inserted
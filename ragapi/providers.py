@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+from .sources_pmc import pmc_search_async, pmc_fetch_summary_async
+from .sources_semantic_scholar import s2_search_async, s2_fetch_summary_async
+from .sources_openalex import openalex_search_async, openalex_fetch_summary
+
+logger = logging.getLogger(__name__)
+
+# urutan ini juga urutan penggabungan metadata (sama seperti versi sekuensial)
+PROVIDERS = ("pmc", "semantic_scholar", "openalex")
+
+
+async def _pmc(client, query, max_papers):
+    pmcids = await pmc_search_async(client, query, retmax=max_papers)
+    return await pmc_fetch_summary_async(client, pmcids)
+
+
+async def _semantic_scholar(client, query, max_papers):
+    paper_ids = await s2_search_async(client, query, limit=max_papers)
+    return await s2_fetch_summary_async(client, paper_ids)
+
+
+async def _openalex(client, query, max_papers):
+    return openalex_fetch_summary(await openalex_search_async(client, query, per_page=max_papers))
+
+
+_FETCHERS = {
+    "pmc": _pmc,
+    "semantic_scholar": _semantic_scholar,
+    "openalex": _openalex,
+}
+
+
+def new_async_client(**kwargs) -> httpx.AsyncClient:
+    kwargs.setdefault("timeout", 30)
+    kwargs.setdefault("follow_redirects", True)
+    kwargs.setdefault("limits", httpx.Limits(max_connections=20, max_keepalive_connections=10))
+    return httpx.AsyncClient(**kwargs)
+
+
+async def _run_provider(name, client, query, max_papers, timeout):
+    t0 = time.perf_counter()
+    try:
+        metas = await asyncio.wait_for(_FETCHERS[name](client, query, max_papers), timeout=timeout)
+        logger.info(f"[PROVIDER] {name}: {len(metas)} metas in {time.perf_counter() - t0:.2f}s")
+        return metas
+    except asyncio.TimeoutError:
+        logger.warning(f"[PROVIDER] {name}: timeout after {timeout}s")
+    except Exception as e:
+        logger.warning(f"[PROVIDER] {name}: failed ({type(e).__name__}: {e})")
+    return []
+
+
+async def search_oa_metas_async(
+    query: str,
+    max_papers: int = 3,
+    timeouts: dict | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> list[dict]:
+    """
+    Query PMC, Semantic Scholar, dan OpenAlex bersamaan lewat satu AsyncClient (pooled).
+    Setiap provider punya timeout sendiri; provider yang gagal/timeout menyumbang [].
+    """
+    timeouts = {**settings.RAG_PROVIDER_TIMEOUTS, **(timeouts or {})}
+    own_client = client is None
+    if own_client:
+        client = new_async_client()
+    try:
+        results = await asyncio.gather(
+            *(_run_provider(name, client, query, max_papers, timeouts.get(name, 30)) for name in PROVIDERS)
+        )
+    finally:
+        if own_client:
+            await client.aclose()
+
+    metas = []
+    for provider_metas in results:
+        metas += provider_metas
+    return metas
+
+
+def run_sync(coro):
+    """
+    Jalankan coroutine dari kode sinkron (view Django, management command).
+    Jika thread ini sudah punya event loop yang berjalan, pakai thread terpisah.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    box = {}
+
+    def runner():
+        try:
+            box["result"] = asyncio.run(coro)
+        except BaseException as e:
+            box["error"] = e
+
+    t = threading.Thread(target=runner)
+    t.start()
+    t.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
+
+
+def search_oa_metas(query: str, max_papers: int = 3, timeouts: dict | None = None) -> list[dict]:
+    return run_sync(search_oa_metas_async(query, max_papers=max_papers, timeouts=timeouts))
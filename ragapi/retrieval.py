@@ -1,10 +1,140 @@
-from .chroma_client import get_collection
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from . import metrics
+from .chroma_client import get_collection, get_generation
 from .embeddings import embed
 
+# pencarian BM25 jalan di thread ini, paralel dengan query vektor di thread pemanggil
+_bm25_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-bm25")
+
+_lock = threading.Lock()
+_query_embs = OrderedDict()  # query → embedding
+_results = OrderedDict()  # (emb_hash, k, where) → (generation, created_at, hits)
+_stats = {
+    "query_emb_hits": 0,
+    "query_emb_misses": 0,
+    "result_hits": 0,
+    "result_misses": 0,
+    "result_stale": 0,
+}
+
+
+def _lru_get(cache: OrderedDict, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _lru_put(cache: OrderedDict, key, value, max_size: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+def _query_embedding(query: str):
+    with _lock:
+        q_emb = _lru_get(_query_embs, query)
+        _stats["query_emb_hits" if q_emb is not None else "query_emb_misses"] += 1
+    if q_emb is None:
+        with metrics.span("retrieve.embed_query"):
+            q_emb = embed([query])[0]
+        with _lock:
+            _lru_put(_query_embs, query, q_emb, settings.RAG_QUERY_EMB_CACHE_SIZE)
+    return q_emb
+
+
+def _result_key(query: str, q_emb, k: int, where: dict | None, mode: str):
+    emb_hash = hashlib.sha1(np.asarray(q_emb, dtype=np.float32).tobytes()).hexdigest()
+    # mode hybrid juga bergantung pada teks query (BM25), bukan hanya embedding-nya
+    text_key = query if mode == "hybrid" else None
+    return emb_hash, k, json.dumps(where, sort_keys=True, default=str), mode, text_key
+
+
+def resolve_mode(mode: str | None = None) -> str:
+    mode = mode or settings.RAG_RETRIEVAL_MODE
+    if mode == "hybrid" and not settings.RAG_BM25_ENABLED:
+        return "vector"
+    return mode
+
+
+def retrieval_cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["query_emb_entries"] = len(_query_embs)
+        stats["result_entries"] = len(_results)
+    for prefix in ("query_emb", "result"):
+        total = stats[f"{prefix}_hits"] + stats[f"{prefix}_misses"]
+        stats[f"{prefix}_hit_rate"] = (stats[f"{prefix}_hits"] / total) if total else 0.0
+    return stats
+
+
+def clear_retrieval_cache():
+    with _lock:
+        _query_embs.clear()
+        _results.clear()
+
+
+def retrieve(query: str, k: int = 8, where: dict | None = None, use_cache: bool = True, mode: str | None = None):
+    """
+    Query Chroma dengan cache in-process:
+    - LRU embedding query (query yang sama tidak di-embed ulang)
+    - cache hasil per (hash embedding, k, where), invalid bila generation
+      collection berubah (upsert/delete dari proses mana pun) atau melewati TTL
+    mode: "vector" (hanya embedding) atau "hybrid" (BM25 + embedding, digabung RRF);
+    default RAG_RETRIEVAL_MODE.
+    """
+    with metrics.span("retrieve"):
+        return _retrieve(query, k, where, use_cache, resolve_mode(mode))
+
+
+def _retrieve(query: str, k: int, where: dict | None, use_cache: bool, mode: str):
+    if not use_cache:
+        with metrics.span("retrieve.embed_query"):
+            q_emb = embed([query])[0]
+        return _search(query, q_emb, k, where, mode)
+
+    q_emb = _query_embedding(query)
+    key = _result_key(query, q_emb, k, where, mode)
+    generation = get_generation()
+    now = time.monotonic()
+
+    with _lock:
+        entry = _lru_get(_results, key)
+        if entry is not None:
+            gen, created_at, hits = entry
+            if gen == generation and now - created_at <= settings.RAG_RESULT_CACHE_TTL:
+                _stats["result_hits"] += 1
+                return [dict(h) for h in hits]
+            _stats["result_stale"] += 1
+        _stats["result_misses"] += 1
 
-def retrieve(query: str, k: int = 8, where: dict | None = None):
+    hits = _search(query, q_emb, k, where, mode)
+    with _lock:
+        _lru_put(_results, key, (generation, now, hits), settings.RAG_RESULT_CACHE_SIZE)
+    return [dict(h) for h in hits]
+
+
+def _query_vector(q_emb, k: int, where: dict | None):
+    with metrics.span("retrieve.vector"):
+        if settings.RAG_RETRIEVAL_ENGINE == "numpy":
+            from .vector_mirror import get_mirror
+
+            return get_mirror().query(q_emb, k, where)
+        return _query_chroma(q_emb, k, where)
+
+
+def _query_chroma(q_emb, k: int, where: dict | None):
     col = get_collection()
-    q_emb = embed([query])[0]
 
     res = col.query(
         query_embeddings=[q_emb],
@@ -14,6 +144,80 @@ def retrieve(query: str, k: int = 8, where: dict | None = None):
     )
 
     hits = []
-    for doc, meta, dist in zip(res["documents"][0], res["metadatas"][0], res["distances"][0]):
-        hits.append({"text": doc, "meta": meta, "distance": dist})
+    for chunk_id, doc, meta, dist in zip(res["ids"][0], res["documents"][0], res["metadatas"][0], res["distances"][0]):
+        hits.append({"id": chunk_id, "text": doc, "meta": meta, "distance": dist})
     return hits
+
+
+def _search(query: str, q_emb, k: int, where: dict | None, mode: str):
+    if mode != "hybrid":
+        return _query_vector(q_emb, k, where)
+
+    n = max(k, settings.RAG_HYBRID_CANDIDATES)
+    bm25_future = _bm25_executor.submit(metrics.bind(_bm25_search), query, n)
+    vector_hits = _query_vector(q_emb, n, where)
+    bm25_hits = bm25_future.result()
+    with metrics.span("retrieve.fuse"):
+        return _fuse(q_emb, vector_hits, bm25_hits, k, where)
+
+
+def _bm25_search(query: str, n: int):
+    from . import bm25_index
+
+    with metrics.span("retrieve.bm25"):
+        return bm25_index.search(query, n)
+
+
+def _fuse(q_emb, vector_hits: list, bm25_hits: list, k: int, where: dict | None):
+    """
+    Reciprocal-rank fusion: skor = Σ 1 / (RAG_RRF_K + rank) dari tiap daftar.
+    Chunk yang hanya ditemukan BM25 diambil dari Chroma (sekaligus menerapkan filter where)
+    dan distance-nya dihitung dari embedding tersimpan, supaya gating tetap bermakna.
+    """
+    rrf_k = settings.RAG_RRF_K
+    scores = {}
+    by_id = {}
+    for rank, hit in enumerate(vector_hits):
+        scores[hit["id"]] = 1.0 / (rrf_k + rank + 1)
+        by_id[hit["id"]] = hit
+
+    bm25_ranks = {chunk_id: rank for rank, (chunk_id, _) in enumerate(bm25_hits)}
+    missing = [chunk_id for chunk_id in bm25_ranks if chunk_id not in by_id]
+    if missing:
+        for hit in _fetch_hits(missing, q_emb, where):
+            by_id[hit["id"]] = hit
+    for chunk_id, rank in bm25_ranks.items():
+        if chunk_id in by_id:
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [by_id[chunk_id] for chunk_id in ranked]
+
+
+def _fetch_hits(ids: list, q_emb, where: dict | None):
+    if settings.RAG_RETRIEVAL_ENGINE == "numpy":
+        from .vector_mirror import get_mirror
+
+        return get_mirror().get(ids, q_emb, where)
+
+    col = get_collection()
+    res = col.get(ids=ids, where=where, include=["documents", "metadatas", "embeddings"])
+    if not res["ids"]:
+        return []
+
+    q = np.asarray(q_emb, dtype=np.float32)
+    embs = np.asarray(res["embeddings"], dtype=np.float32)
+    space = (col.metadata or {}).get("hnsw:space", "l2")
+    if space == "cosine":
+        norms = np.linalg.norm(embs, axis=1) * np.linalg.norm(q)
+        dists = 1.0 - (embs @ q) / np.maximum(norms, 1e-12)
+    elif space == "ip":
+        dists = 1.0 - embs @ q
+    else:
+        # Chroma "l2" = squared L2
+        dists = ((embs - q) ** 2).sum(axis=1)
+
+    return [
+        {"id": chunk_id, "text": doc, "meta": meta, "distance": float(dist)}
+        for chunk_id, doc, meta, dist in zip(res["ids"], res["documents"], res["metadatas"], dists)
+    ]
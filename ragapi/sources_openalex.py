@@ -9,14 +9,7 @@ def openalex_search(query: str, per_page: int = 5):
     """
     try:
         with httpx.Client(timeout=30, follow_redirects=True) as client:
-            r = client.get(
-                f"{OPENALEX_API}/works",
-                params={
-                    "search": query,
-                    "per_page": per_page,
-                    "filter": "is_oa:true",
-                },
-            )
+            r = client.get(f"{OPENALEX_API}/works", params=_search_params(query, per_page))
             r.raise_for_status()
             data = r.json()
         return data.get("results", [])
@@ -24,6 +17,24 @@ def openalex_search(query: str, per_page: int = 5):
         return []
 
 
+async def openalex_search_async(client: httpx.AsyncClient, query: str, per_page: int = 5):
+    try:
+        r = await client.get(f"{OPENALEX_API}/works", params=_search_params(query, per_page))
+        r.raise_for_status()
+        data = r.json()
+        return data.get("results", [])
+    except Exception:
+        return []
+
+
+def _search_params(query: str, per_page: int):
+    return {
+        "search": query,
+        "per_page": per_page,
+        "filter": "is_oa:true",
+    }
+
+
 def openalex_fetch_summary(results):
     """
     Ambil metadata dan URL PDF dari hasil OpenAlex.
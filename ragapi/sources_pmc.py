@@ -13,17 +13,42 @@ def _get_json(url, params):
         return r.json()
 
 
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=8))
+async def _get_json_async(client: httpx.AsyncClient, url, params):
+    r = await client.get(url, params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+def _search_params(query: str, retmax: int):
+    return {"db": "pmc", "term": query, "retmode": "json", "retmax": retmax}
+
+
+def _parse_search(data):
+    ids = data.get("esearchresult", {}).get("idlist", [])
+    return [f"PMC{i}" for i in ids]
+
+
+def _numeric_ids(pmcids: list[str]):
+    return [re.sub(r"^PMC", "", x) for x in pmcids]
+
+
+def _summary_params(numeric_ids: list[str]):
+    return {"db": "pmc", "id": ",".join(numeric_ids), "retmode": "json"}
+
+
 def pmc_search(query: str, retmax: int = 5):
     """
     Cari kandidat artikel di PubMed Central (db=pmc).
     Return list PMCIDs format 'PMC1234567'.
     """
-    data = _get_json(
-        f"{EUTILS}/esearch.fcgi",
-        {"db": "pmc", "term": query, "retmode": "json", "retmax": retmax},
-    )
-    ids = data.get("esearchresult", {}).get("idlist", [])
-    return [f"PMC{i}" for i in ids]
+    data = _get_json(f"{EUTILS}/esearch.fcgi", _search_params(query, retmax))
+    return _parse_search(data)
+
+
+async def pmc_search_async(client: httpx.AsyncClient, query: str, retmax: int = 5):
+    data = await _get_json_async(client, f"{EUTILS}/esearch.fcgi", _search_params(query, retmax))
+    return _parse_search(data)
 
 
 def pmc_fetch_summary(pmcids: list[str]):
@@ -33,12 +58,21 @@ def pmc_fetch_summary(pmcids: list[str]):
     if not pmcids:
         return []
 
-    numeric_ids = [re.sub(r"^PMC", "", x) for x in pmcids]
-    data = _get_json(
-        f"{EUTILS}/esummary.fcgi",
-        {"db": "pmc", "id": ",".join(numeric_ids), "retmode": "json"},
-    )
+    numeric_ids = _numeric_ids(pmcids)
+    data = _get_json(f"{EUTILS}/esummary.fcgi", _summary_params(numeric_ids))
+    return _parse_summary(data, numeric_ids)
+
+
+async def pmc_fetch_summary_async(client: httpx.AsyncClient, pmcids: list[str]):
+    if not pmcids:
+        return []
+
+    numeric_ids = _numeric_ids(pmcids)
+    data = await _get_json_async(client, f"{EUTILS}/esummary.fcgi", _summary_params(numeric_ids))
+    return _parse_summary(data, numeric_ids)
+
 
+def _parse_summary(data, numeric_ids: list[str]):
     result = []
     for nid in numeric_ids:
         item = data.get("result", {}).get(nid)
@@ -1,6 +1,8 @@
 import httpx
 
 S2_API = "https://api.semanticscholar.org/graph/v1"
+_SEARCH_FIELDS = "paperId,title,year,openAccessPdf,url"
+_BATCH_FIELDS = "paperId,title,year,doi,openAccessPdf,url"
 
 
 def s2_search(query: str, limit: int = 5):
@@ -11,13 +13,31 @@ def s2_search(query: str, limit: int = 5):
         with httpx.Client(timeout=30, follow_redirects=True) as client:
             r = client.get(
                 f"{S2_API}/paper/search",
-                params={"query": query, "limit": limit, "fields": "paperId,title,year,openAccessPdf,url"},
+                params={"query": query, "limit": limit, "fields": _SEARCH_FIELDS},
             )
             r.raise_for_status()
             data = r.json()
     except Exception:
         return []
 
+    return _parse_search(data)
+
+
+async def s2_search_async(client: httpx.AsyncClient, query: str, limit: int = 5):
+    try:
+        r = await client.get(
+            f"{S2_API}/paper/search",
+            params={"query": query, "limit": limit, "fields": _SEARCH_FIELDS},
+        )
+        r.raise_for_status()
+        data = r.json()
+    except Exception:
+        return []
+
+    return _parse_search(data)
+
+
+def _parse_search(data):
     papers = data.get("data", [])
     return [p.get("paperId") for p in papers if p.get("paperId")]
 
@@ -36,7 +56,7 @@ def s2_fetch_summary(paper_ids: list[str]):
                 f"{S2_API}/paper/batch",
                 params={
                     "ids": ids,
-                    "fields": "paperId,title,year,doi,openAccessPdf,url",
+                    "fields": _BATCH_FIELDS,
                 },
             )
             r.raise_for_status()
@@ -44,6 +64,27 @@ def s2_fetch_summary(paper_ids: list[str]):
     except Exception:
         return []
 
+    return _parse_summary(data)
+
+
+async def s2_fetch_summary_async(client: httpx.AsyncClient, paper_ids: list[str]):
+    if not paper_ids:
+        return []
+
+    try:
+        r = await client.get(
+            f"{S2_API}/paper/batch",
+            params={"ids": ",".join(paper_ids), "fields": _BATCH_FIELDS},
+        )
+        r.raise_for_status()
+        data = r.json()
+    except Exception:
+        return []
+
+    return _parse_summary(data)
+
+
+def _parse_summary(data):
     metas = []
     for item in data or []:
         pdf = (item or {}).get("openAccessPdf") or {}
@@ -1,3 +1,1334 @@
-from django.test import TestCase
+import hashlib
+import importlib.util
+import random
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ragapi.bench import _sentence, isolated_store
+from ragapi.onnx_embedder import model_filename
+
+PARITY_TEXTS = [
+    "Anak usia 2 tahun dengan tinggi badan di bawah -2 SD (stunting).",
+    "MP-ASI pertama diberikan pada usia 6 bulan dengan tekstur lumat.",
+    "Iron deficiency anemia in children under five years old.",
+    "pendek",
+]
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+@unittest.skipUnless(_available("onnxruntime"), "onnxruntime tidak terpasang")
+@unittest.skipUnless(_available("sentence_transformers"), "sentence-transformers tidak terpasang")
+class OnnxEmbeddingParityTests(SimpleTestCase):
+    """
+    Backend ONNX harus menghasilkan vektor normalized yang setara dengan SentenceTransformer.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from sentence_transformers import SentenceTransformer
+
+        from ragapi.embeddings import EMBED_MODEL_NAME
+
+        cls.model_dir = Path(settings.RAG_ONNX_MODEL_DIR)
+        cls.reference = SentenceTransformer(EMBED_MODEL_NAME, device="cpu").encode(
+            PARITY_TEXTS, normalize_embeddings=True
+        )
+
+    def _check(self, quantized: bool, min_cosine: float):
+        if not (self.model_dir / model_filename(quantized)).exists():
+            self.skipTest(f"{model_filename(quantized)} belum diekspor (rag_export_onnx)")
+        from ragapi.onnx_embedder import OnnxEmbedder
+
+        vecs = OnnxEmbedder(self.model_dir, quantized=quantized).encode(PARITY_TEXTS, batch_size=2)
+
+        np.testing.assert_allclose(np.linalg.norm(vecs, axis=1), 1.0, atol=1e-5)
+        cosines = (vecs * self.reference).sum(axis=1)
+        self.assertGreaterEqual(cosines.min(), min_cosine, f"cosine per teks: {cosines}")
+
+    def test_float32_matches_torch(self):
+        self._check(quantized=False, min_cosine=0.999)
+
+    def test_int8_close_to_torch(self):
+        self._check(quantized=True, min_cosine=0.98)
+
+
+def _fake_embed(texts, **kwargs):
+    """
+    Pengganti embed() untuk test yang tidak menguji model: vektor deterministik per teks.
+    """
+    vecs = np.stack(
+        [np.random.default_rng(int(hashlib.md5(t.encode()).hexdigest()[:8], 16)).standard_normal(8) for t in texts]
+    ).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _paragraphs(seed: int, n: int, sentences: int = 12) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(_sentence(rng) for _ in range(sentences)) for _ in range(n)]
+
+
+def _perturb(text: str) -> str:
+    """
+    Rendering ulang yang sedikit berbeda: satu kata diganti dan teks bergeser.
+    """
+    words = text.split()
+    words[len(words) // 2] = "revisi"
+    return "Catatan. " + " ".join(words)
+
+
+def _meta(paper_id: str, i: int) -> dict:
+    return {"paper_id": paper_id, "file_hash": f"hash-{paper_id}", "chunk_index": i}
+
+
+class NearDuplicateTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = self.enterContext(isolated_store())
+        self.enterContext(override_settings(RAG_DEDUP_MODE="skip"))
+        self.enterContext(mock.patch("ragapi.pdf_ingest.embed", side_effect=_fake_embed))
+
+    def _ingest(self, paper_id: str, docs: list[str]) -> tuple[list[str], int]:
+        from ragapi.pdf_ingest import _embed_and_upsert
+
+        ids = [f"{paper_id}-{i}" for i in range(len(docs))]
+        written = _embed_and_upsert(ids, docs, [_meta(paper_id, i) for i in range(len(docs))])
+        return ids, written
+
+    def test_threshold(self):
+        from ragapi import dedup
+
+        [original] = _paragraphs(1, 1)
+        [unrelated] = _paragraphs(2, 1)
+        index = dedup.get_index()
+        index.add(["a-0"], [original], [_meta("a", 0)])
+
+        candidates = [_perturb(original), unrelated, _perturb(original)]
+        metas = [_meta("b", 0), _meta("b", 1), _meta("a", 1)]
+        keep, duplicates = index.partition(["b-0", "b-1", "a-1"], candidates, metas)
+        # chunk dokumen yang sama (paper a) tidak dihitung duplikat
+        self.assertEqual(keep, [1, 2])
+        self.assertEqual(duplicates[0]["canonical_id"], "a-0")
+        similarity = duplicates[0]["similarity"]
+        self.assertGreaterEqual(similarity, settings.RAG_DEDUP_THRESHOLD)
+        self.assertLess(dedup.similarity(dedup.minhash(original), dedup.minhash(unrelated)), 0.1)
+
+        with override_settings(RAG_DEDUP_THRESHOLD=min(similarity + 0.01, 1.0)):
+            keep, duplicates = index.partition(["b-0"], candidates[:1], metas[:1])
+        self.assertEqual((keep, duplicates), ([0], []))
+
+    def test_partition_is_read_only(self):
+        from ragapi import dedup
+
+        docs = _paragraphs(3, 2)
+        dedup.get_index().partition(["a-0", "a-1"], docs, [_meta("a", 0), _meta("a", 1)])
+        stats = dedup.get_index().stats()
+        self.assertEqual((stats["indexed"], stats["checked"]), (0, 0))
+
+    def test_failed_upsert_does_not_poison_index(self):
+        from ragapi import dedup
+        from ragapi.chroma_client import get_collection
+
+        docs = _paragraphs(4, 3)
+        with mock.patch.object(get_collection(), "upsert", side_effect=RuntimeError("disk penuh")):
+            with self.assertRaises(RuntimeError):
+                self._ingest("a", docs)
+        self.assertEqual(dedup.get_index().stats()["indexed"], 0)
+
+        # salinan dari dokumen lain tidak boleh dianggap duplikat chunk yang tidak pernah tersimpan
+        _, written = self._ingest("b", [_perturb(d) for d in docs])
+        self.assertEqual(written, 3)
+        self.assertEqual(get_collection().count(), 3)
+
+    def test_duplicates_recorded_after_write(self):
+        from ragapi import dedup
+        from ragapi.chroma_client import get_collection
+
+        docs = _paragraphs(5, 3)
+        _, written = self._ingest("a", docs)
+        self.assertEqual(written, 3)
+        _, written = self._ingest("b", [_perturb(d) for d in docs])
+        self.assertEqual(written, 0)
+        self.assertEqual(get_collection().count(), 3)
+
+        stats = dedup.get_index().stats()
+        self.assertEqual(stats["indexed"], 3)
+        self.assertEqual(stats["recorded_duplicates"], 3)
+        self.assertEqual((stats["checked"], stats["duplicates"]), (6, 3))
+        self.assertEqual(stats["links"], 0)  # mode skip
+
+    def test_removing_canonical_restores_duplicates(self):
+        from ragapi import dedup
+        from ragapi.chroma_client import delete_chunks, get_collection
+
+        docs = _paragraphs(6, 3)
+        a_ids, _ = self._ingest("a", docs)
+        b_ids, _ = self._ingest("b", [_perturb(d) for d in docs])
+
+        delete_chunks(a_ids)
+
+        self.assertEqual(sorted(get_collection().get()["ids"]), sorted(b_ids))
+        stats = dedup.get_index().stats()
+        self.assertEqual((stats["indexed"], stats["recorded_duplicates"]), (3, 0))
+        restored = get_collection().get(ids=b_ids[:1], include=["metadatas"])["metadatas"][0]
+        self.assertEqual(restored["paper_id"], "b")
+
+    def test_removing_duplicate_drops_its_record(self):
+        from ragapi import dedup
+        from ragapi.chroma_client import delete_chunks, get_collection
+
+        docs = _paragraphs(7, 2)
+        self._ingest("a", docs)
+        b_ids, _ = self._ingest("b", [_perturb(d) for d in docs])
+
+        delete_chunks(b_ids)
+        self.assertEqual(dedup.get_index().stats()["recorded_duplicates"], 0)
+        self.assertEqual(get_collection().count(), 2)
+
+
+class IngestFolderPipelineTests(SimpleTestCase):
+    """
+    rag_ingest_folder --workers > 1 (process pool ekstraksi → thread embedding → thread writer).
+    """
+
+    def setUp(self):
+        self.tmp = self.enterContext(isolated_store())
+        self.enterContext(mock.patch("ragapi.embeddings.embed", side_effect=_fake_embed))
+        self.folder = self.tmp / "pdfs"
+
+    def _write(self, relpath: str, seed: int):
+        from ragapi.bench import write_synthetic_pdf
+
+        rng = random.Random(seed)
+        path = self.folder / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_synthetic_pdf(path, [[_sentence(rng) for _ in range(40)] for _ in range(2)])
+        return path
+
+    def _run(self, workers=2, **opts) -> str:
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("rag_ingest_folder", folder=str(self.folder), workers=workers, stdout=out, **opts)
+        return out.getvalue()
+
+    def test_same_filename_in_subfolders(self):
+        from ragapi import ingest_manifest
+        from ragapi.chroma_client import get_collection
+        from ragapi.pdf_ingest import chunker_tag, file_sha256
+
+        paths = [self._write("a/report.pdf", 1), self._write("b/report.pdf", 2)]
+        self._run(recursive=True)
+
+        for path in paths:
+            entry = ingest_manifest.lookup(file_sha256(str(path)), chunker_tag())
+            self.assertIsNotNone(entry, path)
+            self.assertEqual(entry["source_key"], str(path.resolve()))
+            self.assertGreater(entry["chunk_count"], 0)
+        expected = sum(ingest_manifest.lookup(file_sha256(str(p)), chunker_tag())["chunk_count"] for p in paths)
+        self.assertEqual(get_collection().count(), expected)
+
+        # file kedua berubah: hanya chunk versi lamanya yang dihapus
+        old_hash = file_sha256(str(paths[1]))
+        self._write("b/report.pdf", 3)
+        self._run(recursive=True)
+        hashes = {m["file_hash"] for m in get_collection().get(include=["metadatas"])["metadatas"]}
+        self.assertEqual(hashes, {file_sha256(str(p)) for p in paths})
+        self.assertNotIn(old_hash, hashes)
+
+    def test_failed_file_does_not_stop_others(self):
+        from ragapi.chroma_client import get_collection
+
+        self._write("ok.pdf", 4)
+        self.folder.joinpath("rusak.pdf").write_bytes(b"bukan pdf")
+        out = self._run()
+
+        self.assertIn("[FAIL]", out)
+        self.assertIn("rusak.pdf", out)
+        self.assertRegex(out, r"\[OK\] .*ok\.pdf")
+        self.assertGreater(get_collection().count(), 0)
+
+        out = self._run()
+        self.assertIn("unchanged_files=1", out)
+
+    def test_sequential_run_isolates_failures_and_reports_throughput(self):
+        from ragapi.chroma_client import get_collection
+
+        self._write("ok.pdf", 5)
+        self.folder.joinpath("rusak.pdf").write_bytes(b"bukan pdf")
+        out = self._run(workers=1)
+
+        self.assertIn("FAILED files=1", out)
+        self.assertRegex(out, r"\[FAIL\] .*rusak\.pdf")
+        self.assertRegex(out, r"\[OK\] .*ok\.pdf: inserted_chunks=[1-9]")
+        self.assertRegex(out, r"pages=2 .*chunks/sec=[\d.]+ pages/sec=[\d.]+")
+        self.assertGreater(get_collection().count(), 0)
+
+        out = self._run(workers=1)
+        self.assertIn("unchanged_files=1", out)
+
+    def test_broken_worker_pool_is_reported_per_file(self):
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+
+        class CrashedPool:
+            """Worker pertama mati di tengah ekstraksi; submit berikutnya ditolak pool."""
+
+            def __init__(self, *args, **kwargs):
+                self.broken = False
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def submit(self, fn, *args):
+                if self.broken:
+                    raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+                self.broken = True
+                fut = Future()
+                fut.set_exception(BrokenProcessPool("A process in the process pool was terminated abruptly"))
+                return fut
+
+        for i in range(3):
+            self._write(f"f{i}.pdf", 10 + i)
+        with mock.patch("ragapi.management.commands.rag_ingest_folder.ProcessPoolExecutor", CrashedPool):
+            out = self._run()
+
+        self.assertIn("FAILED files=3", out)
+        self.assertEqual(out.count("BrokenProcessPool"), 3)
+        self.assertIn("DONE. Total inserted_chunks=0", out)
+
+
+@override_settings(RAG_ENRICH_LEASE_SECONDS=60, RAG_ENRICH_INLINE_WORKER=True)
+class EnrichmentLeaseTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("ragapi.enrichment._get_executor")
+        self.executor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _job(self, status: str, age: int, query: str = "stunting balita"):
+        from ragapi.enrichment import query_hash
+        from ragapi.models import EnrichmentJob
+
+        started = timezone.now() - timedelta(seconds=age)
+        job = EnrichmentJob.objects.create(query_hash=query_hash(query), query=query, status=status)
+        EnrichmentJob.objects.filter(id=job.id).update(
+            created_at=started, started_at=started if status == EnrichmentJob.Status.RUNNING else None
+        )
+        return job
+
+    def test_expired_running_job_is_reclaimed(self):
+        from ragapi.enrichment import claim_job
+        from ragapi.models import EnrichmentJob
+
+        job = self._job(EnrichmentJob.Status.RUNNING, age=120)
+        self.assertIsNotNone(claim_job(job.id))
+        self.assertIsNone(claim_job(job.id))  # lease baru belum habis
+
+    def test_live_running_job_is_not_reclaimed(self):
+        from ragapi.enrichment import claim_job
+        from ragapi.models import EnrichmentJob
+
+        job = self._job(EnrichmentJob.Status.RUNNING, age=10)
+        self.assertIsNone(claim_job(job.id))
+
+    def test_enqueue_resubmits_abandoned_job(self):
+        from ragapi.enrichment import enqueue_enrichment
+        from ragapi.models import EnrichmentJob
+
+        job = self._job(EnrichmentJob.Status.RUNNING, age=120)
+        with self.captureOnCommitCallbacks(execute=True):
+            same, created = enqueue_enrichment("Stunting  balita")
+        self.assertEqual((same.id, created), (job.id, False))
+        self.executor.return_value.submit.assert_called_once()
+
+        fresh = self._job(EnrichmentJob.Status.RUNNING, age=10, query="anemia")
+        with self.captureOnCommitCallbacks(execute=True):
+            same, created = enqueue_enrichment("anemia")
+        self.assertEqual((same.id, created), (fresh.id, False))
+        self.executor.return_value.submit.assert_called_once()
+
+    def test_late_finisher_does_not_overwrite_reclaimed_job(self):
+        from ragapi.enrichment import run_enrichment_job
+        from ragapi.models import EnrichmentJob
+
+        job = self._job(EnrichmentJob.Status.PENDING, age=0)
+
+        def reclaimed_midway(query, max_papers):
+            # worker lain mengklaim ulang job ini (lease baru)
+            EnrichmentJob.objects.filter(id=job.id).update(started_at=timezone.now() + timedelta(seconds=1))
+            return 5
+
+        with mock.patch("ragapi.hybrid.autofetch_oa_and_ingest", side_effect=reclaimed_midway):
+            run_enrichment_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.inserted_chunks), (EnrichmentJob.Status.RUNNING, 0))
+
+    def test_worker_command_picks_expired_jobs(self):
+        from django.core.management import call_command
+
+        from ragapi.models import EnrichmentJob
+
+        job = self._job(EnrichmentJob.Status.RUNNING, age=120)
+        with mock.patch("ragapi.hybrid.autofetch_oa_and_ingest", return_value=3):
+            call_command("rag_enrich_worker", once=True, stdout=mock.MagicMock())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.inserted_chunks), (EnrichmentJob.Status.DONE, 3))
+
+
+class RetrievalCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(isolated_store())
+        self.enterContext(override_settings(RAG_RETRIEVAL_MODE="vector", RAG_RESULT_CACHE_TTL=300))
+        self.enterContext(mock.patch("ragapi.retrieval.embed", side_effect=_fake_embed))
+        hits = [{"id": "c-0", "text": "teks", "meta": {}, "distance": 0.1}]
+        self.search = self.enterContext(mock.patch("ragapi.retrieval._search", return_value=hits))
+
+    def test_cached_until_generation_changes(self):
+        from ragapi.chroma_client import bump_generation
+        from ragapi.retrieval import retrieve
+
+        retrieve("stunting balita")
+        retrieve("stunting balita")
+        self.assertEqual(self.search.call_count, 1)
+
+        bump_generation()
+        retrieve("stunting balita")
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_write_from_other_process_invalidates(self):
+        import sqlite3
+
+        from ragapi.retrieval import retrieve
+
+        retrieve("stunting balita")
+        # proses lain (mis. rag_ingest_folder) menulis collection yang sama
+        other = sqlite3.connect(settings.RAG_GENERATION_PATH)
+        with other:
+            other.execute(
+                "INSERT INTO generation (collection, value) VALUES (?, 1) "
+                "ON CONFLICT (collection) DO UPDATE SET value = value + 1",
+                (settings.RAG_COLLECTION,),
+            )
+        other.close()
+
+        retrieve("stunting balita")
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_upsert_and_delete_bump_generation(self):
+        from ragapi.chroma_client import delete_chunks, get_generation, upsert_chunks
+
+        start = get_generation()
+        upsert_chunks(["c-0"], ["teks"], [{"paper_id": "a"}], _fake_embed(["teks"]))
+        delete_chunks(["c-0"])
+        self.assertEqual(get_generation(), start + 2)
+
+
+class BM25IndexTests(SimpleTestCase):
+    def setUp(self):
+        from ragapi.bm25_index import BM25Index
+
+        self.tmp = self.enterContext(isolated_store())
+        self.index = BM25Index(self.tmp / "bm25.sqlite3")
+
+    def _postings(self, doc_id: str) -> dict:
+        conn = self.index._get_conn()
+        return dict(
+            conn.execute(
+                "SELECT t.term, p.tf FROM postings p JOIN terms t ON t.term_id = p.term_id "
+                "JOIN docs d ON d.doc_no = p.doc_no WHERE d.doc_id = ?",
+                (doc_id,),
+            ).fetchall()
+        )
+
+    def _df(self, term: str) -> int:
+        row = self.index._get_conn().execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+        return row[0] if row else 0
+
+    def test_tokenize(self):
+        from ragapi.bm25_index import tokenize
+
+        self.assertEqual(tokenize("MP-ASI untuk anak"), ["mp-asi", "mp", "asi"])
+        self.assertEqual(tokenize("Z-score < -2 SD"), ["z-score", "score", "sd"])
+        self.assertEqual(tokenize("yang dan the"), [])
+
+    def test_hyphenated_query_matches_split_terms(self):
+        self.index.index_documents(["a", "b"], ["pemberian MP ASI usia enam bulan", "imunisasi dasar lengkap"])
+        self.assertEqual(self.index.search("MP-ASI")[0][0], "a")
+
+    def test_reupsert_replaces_postings(self):
+        self.index.index_documents(["a", "b"], ["stunting stunting gizi", "gizi buruk"])
+        self.assertEqual(self._postings("a"), {"stunting": 2, "gizi": 1})
+        self.assertEqual(self._df("gizi"), 2)
+
+        self.index.index_documents(["a"], ["anemia remaja"])
+        self.assertEqual(self._postings("a"), {"anemia": 1, "remaja": 1})
+        self.assertEqual((self._df("stunting"), self._df("gizi")), (0, 1))
+        self.assertEqual(self.index.doc_count(), 2)
+        self.assertEqual(self.index.search("stunting"), [])
+        self.assertEqual([d for d, _ in self.index.search("anemia")], ["a"])
+
+    def test_delete_updates_stats(self):
+        self.index.index_documents(["a", "b"], ["stunting balita", "stunting remaja putri"])
+        self.index.remove_documents(["a", "tidak-ada"])
+
+        self.assertEqual(self.index.doc_count(), 1)
+        self.assertEqual(self._df("stunting"), 1)
+        self.assertEqual(self._postings("a"), {})
+        stats = dict(self.index._get_conn().execute("SELECT key, value FROM stats"))
+        self.assertEqual(stats["total_length"], 3)
+        self.assertEqual([d for d, _ in self.index.search("stunting")], ["b"])
+
+    def test_ranking_prefers_rare_terms(self):
+        self.index.index_documents(
+            ["a", "b", "c"],
+            ["stunting gizi balita", "stunting gizi remaja", "stunting wasting balita"],
+        )
+        ranked = [d for d, _ in self.index.search("stunting wasting")]
+        self.assertEqual(ranked[0], "c")
+
+    def test_sql_scores_match_bm25_formula(self):
+        import math
+        from collections import Counter
+
+        from ragapi.bm25_index import BM25_B, BM25_K1, tokenize
+
+        rng = random.Random(3)
+        docs = [_sentence(rng) + " " + _sentence(rng) for _ in range(40)]
+        self.index.index_documents([f"d{i}" for i in range(40)], docs)
+        query = docs[7].split(".")[0]
+
+        counted = [Counter(tokenize(d)) for d in docs]
+        avgdl = sum(sum(c.values()) for c in counted) / len(docs)
+        expected = {}
+        for term, qtf in Counter(tokenize(query)).items():
+            df = sum(1 for c in counted if term in c)
+            if not df:
+                continue
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            for i, c in enumerate(counted):
+                if term in c:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(c.values()) / avgdl)
+                    expected[f"d{i}"] = expected.get(f"d{i}", 0.0) + idf * qtf * c[term] * (BM25_K1 + 1) / (c[term] + norm)
+
+        got = self.index.search(query, k=10, max_df_ratio=0)
+        top = sorted(expected.items(), key=lambda kv: -kv[1])[:10]
+        self.assertEqual([d for d, _ in got], [d for d, _ in top])
+        np.testing.assert_allclose([s for _, s in got], [s for _, s in top], rtol=1e-9)
+
+    def test_very_common_terms_are_skipped_when_rarer_terms_exist(self):
+        docs = [f"stunting gizi catatan{i}" for i in range(10)] + ["stunting wasting berat"]
+        self.index.index_documents([f"d{i}" for i in range(11)], docs)
+
+        self.assertEqual([d for d, _ in self.index.search("stunting wasting", k=20)], ["d10"])
+        # semua istilah umum → tetap dipakai, hasil tidak kosong
+        self.assertEqual(len(self.index.search("stunting gizi", k=20)), 11)
+        self.assertEqual(len(self.index.search("stunting wasting", k=20, max_df_ratio=0)), 11)
+
+
+class HybridFusionTests(SimpleTestCase):
+    @staticmethod
+    def _hit(chunk_id: str, distance: float) -> dict:
+        return {"id": chunk_id, "text": chunk_id, "meta": {"paper_id": chunk_id}, "distance": distance}
+
+    @override_settings(RAG_RRF_K=60)
+    def test_rrf_combines_both_lists(self):
+        from ragapi.retrieval import _fuse
+
+        vector_hits = [self._hit("a", 0.1), self._hit("b", 0.2), self._hit("c", 0.3)]
+        bm25_hits = [("c", 9.0), ("b", 5.0)]
+        fused = _fuse(np.zeros(8), vector_hits, bm25_hits, k=3, where=None)
+        # c: 1/63 + 1/61 > b: 1/62 + 1/62 > a: 1/61 (hanya di daftar vektor)
+        self.assertEqual([h["id"] for h in fused], ["c", "b", "a"])
+
+    def test_bm25_only_hits_are_fetched_with_filter(self):
+        from ragapi.retrieval import _fuse
+
+        vector_hits = [self._hit("a", 0.1)]
+        with mock.patch("ragapi.retrieval._fetch_hits", return_value=[self._hit("x", 0.4)]) as fetch:
+            fused = _fuse(np.zeros(8), vector_hits, [("x", 3.0), ("y", 2.0)], k=5, where={"year": 2020})
+
+        fetch.assert_called_once()
+        self.assertEqual(fetch.call_args.args[0], ["x", "y"])
+        self.assertEqual(fetch.call_args.args[2], {"year": 2020})
+        # y tidak lolos filter where → tidak ikut hasil
+        self.assertEqual(sorted(h["id"] for h in fused), ["a", "x"])
+        self.assertEqual(fused[0]["distance"], 0.1)
+
+    def test_truncates_to_k(self):
+        from ragapi.retrieval import _fuse
+
+        vector_hits = [self._hit(c, 0.1 * i) for i, c in enumerate("abcdef")]
+        self.assertEqual(len(_fuse(np.zeros(8), vector_hits, [], k=4, where=None)), 4)
+
+    def test_default_mode_is_vector(self):
+        from ragapi.retrieval import resolve_mode
+
+        self.assertEqual(resolve_mode(), "vector")
+        with override_settings(RAG_RETRIEVAL_MODE="hybrid", RAG_BM25_ENABLED=False):
+            self.assertEqual(resolve_mode(), "vector")
+
+
+@override_settings(
+    ALLOWED_HOSTS=["*"],
+    MEDIA_URL="/media/",
+    RAG_VISION_MEDIA_ORIGINS=["https://api.example.org"],
+)
+class VisionMediaNameTests(SimpleTestCase):
+    def test_relative_media_url_is_local(self):
+        from ragapi.vision import _media_name
+
+        self.assertEqual(_media_name("/media/child_photos/a.jpg"), "child_photos/a.jpg")
+
+    def test_configured_origin_is_local(self):
+        from ragapi.vision import _media_name
+
+        self.assertEqual(_media_name("https://API.example.org/media/child_photos/a.jpg"), "child_photos/a.jpg")
+
+    def test_wildcard_allowed_hosts_does_not_make_external_url_local(self):
+        from ragapi.vision import _media_name
+
+        self.assertIsNone(_media_name("https://evil.example.com/media/child_photos/a.jpg"))
+        # origin harus sama persis: scheme / port lain tetap remote
+        self.assertIsNone(_media_name("http://api.example.org/media/child_photos/a.jpg"))
+        self.assertIsNone(_media_name("https://api.example.org:8443/media/child_photos/a.jpg"))
+
+    def test_absolute_media_url_origin_is_local(self):
+        from ragapi.vision import _media_name
+
+        with self.settings(MEDIA_URL="https://cdn.example.org/media/", RAG_VISION_MEDIA_ORIGINS=[]):
+            self.assertEqual(_media_name("https://cdn.example.org/media/a.jpg"), "a.jpg")
+            self.assertIsNone(_media_name("https://other.example.org/media/a.jpg"))
+
+    def test_path_traversal_is_rejected(self):
+        from ragapi.vision import _media_name
+
+        self.assertIsNone(_media_name("/media/../settings.py"))
+        self.assertIsNone(_media_name("/static/a.jpg"))
+
+
+class VectorMirrorScoringTests(SimpleTestCase):
+    def _mirror(self, codec, n=4000, dim=64, space="l2"):
+        from ragapi.vector_mirror import VectorMirror
+
+        rng = np.random.default_rng(7)
+        embs = rng.standard_normal((n, dim)).astype(np.float32)
+        mirror = VectorMirror(space=space, codec=codec)
+        ids = [f"c{i}" for i in range(n)]
+        mirror.upsert(ids, [None] * n, [None] * n, embs)
+        return mirror, embs
+
+    def test_blockwise_scores_match_single_block(self):
+        from ragapi.compact import Codec
+
+        for space in ("l2", "cosine", "ip"):
+            mirror, embs = self._mirror(Codec(int8=True), space=space)
+            q = embs[3] + 0.01
+            with self.settings(RAG_MIRROR_SCORE_BLOCK=10**9):
+                full = mirror.query(q, 10)
+            with self.settings(RAG_MIRROR_SCORE_BLOCK=333):
+                blocked = mirror.query(q, 10)
+            self.assertEqual([h["id"] for h in blocked], [h["id"] for h in full], space)
+            np.testing.assert_allclose(
+                [h["distance"] for h in blocked], [h["distance"] for h in full], rtol=1e-5, atol=1e-5
+            )
+
+    def test_int8_query_does_not_upcast_whole_matrix(self):
+        import tracemalloc
+
+        from ragapi.compact import Codec
+
+        n, dim = 40_000, 64
+        mirror, embs = self._mirror(Codec(int8=True), n=n, dim=dim)
+        with self.settings(RAG_MIRROR_SCORE_BLOCK=1024):
+            tracemalloc.start()
+            try:
+                base = tracemalloc.get_traced_memory()[0]
+                mirror.query(embs[0], 8)
+                peak = tracemalloc.get_traced_memory()[1] - base
+            finally:
+                tracemalloc.stop()
+        # salinan float32 seluruh matriks = n * dim * 4 byte
+        self.assertLess(peak, n * dim * 4 / 4)
+        self.assertGreaterEqual(mirror.nbytes, n * dim)
+
+
+@unittest.skipUnless(importlib.util.find_spec("PIL"), "Pillow tidak terpasang")
+@override_settings(RAG_VISION_MAX_EDGE=256, RAG_VISION_IMAGE_FORMAT="JPEG", RAG_VISION_IMAGE_QUALITY=80)
+class ImagePreprocessCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(isolated_store())
+
+    @staticmethod
+    def _png(color) -> bytes:
+        import io
+
+        from PIL import Image
+
+        out = io.BytesIO()
+        Image.new("RGB", (800, 400), color).save(out, format="PNG")
+        return out.getvalue()
+
+    def test_resized_result_is_cached(self):
+        from ragapi.image_preprocess import get_image_cache, preprocess_image
+
+        data, content_type = preprocess_image(self._png((200, 10, 10)), "image/png")
+        again, _ = preprocess_image(self._png((200, 10, 10)), "image/png")
+
+        self.assertEqual(content_type, "image/jpeg")
+        self.assertEqual(again, data)
+        self.assertEqual(get_image_cache().stats()["hits"], 1)
+
+    def test_cache_is_bounded(self):
+        from ragapi.image_preprocess import get_image_cache, preprocess_image
+
+        with self.settings(RAG_VISION_IMAGE_CACHE_MAX_ENTRIES=3):
+            for i in range(10):
+                preprocess_image(self._png((i * 20, 0, 0)), "image/png")
+            stats = get_image_cache().stats()
+
+        self.assertLessEqual(stats["entries"], 3)
+        self.assertGreater(stats["evictions"], 0)
+
+    def test_expired_entry_is_recomputed(self):
+        from ragapi.image_preprocess import get_image_cache, preprocess_image
+
+        with self.settings(RAG_VISION_IMAGE_CACHE_TTL=60):
+            content = self._png((0, 90, 0))
+            preprocess_image(content, "image/png")
+            with mock.patch("ragapi.cache_store.time.time", return_value=time.time() + 120):
+                preprocess_image(content, "image/png")
+            stats = get_image_cache().stats()
+
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 2))
+
+
+def _word_tokenizer():
+    """
+    Tokenizer kecil untuk test: satu token per kata / tanda baca (offset tetap akurat).
+    """
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    tok = Tokenizer(models.WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    return tok
+
+
+@override_settings(RAG_CHUNK_MAX_TOKENS=0, RAG_CHUNK_OVERLAP_SENTENCES=1)
+class TokenChunkerTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(mock.patch("ragapi.token_chunker._tokenizer", _word_tokenizer()))
+
+    def test_split_sentences(self):
+        from ragapi.token_chunker import split_sentences
+
+        text = (
+            "Menurut dr. Budi stunting\nbisa dicegah. Studi J. Smith (2020) mendukung hal ini! "
+            "Apa penyebabnya? 3 faktor utama.\n\nParagraf baru tanpa titik"
+        )
+        self.assertEqual(
+            split_sentences(text),
+            [
+                "Menurut dr. Budi stunting bisa dicegah.",
+                "Studi J. Smith (2020) mendukung hal ini!",
+                "Apa penyebabnya?",
+                "3 faktor utama.",
+                "Paragraf baru tanpa titik",
+            ],
+        )
+
+    def test_default_budget_leaves_room_for_special_tokens(self):
+        from ragapi.onnx_embedder import MAX_SEQ_LENGTH
+        from ragapi.token_chunker import max_tokens
+
+        self.assertEqual(max_tokens(), MAX_SEQ_LENGTH - 2)
+        with self.settings(RAG_CHUNK_MAX_TOKENS=100):
+            self.assertEqual(max_tokens(), 100)
+
+    def test_chunks_respect_budget_and_overlap(self):
+        from ragapi.token_chunker import chunk_pages_iter, count_tokens
+
+        sentences = [f"Kalimat nomor {i} membahas gizi anak." for i in range(12)]  # 7 token per kalimat
+        chunks = list(chunk_pages_iter([(1, " ".join(sentences))], max_tokens_per_chunk=21))
+
+        self.assertTrue(all(n <= 21 for n in count_tokens(c for c, _, _ in chunks)))
+        for (prev, _, _), (nxt, _, _) in zip(chunks, chunks[1:]):
+            # kalimat terakhir chunk sebelumnya diulang di awal chunk berikutnya
+            self.assertTrue(nxt.startswith(prev.split(". ")[-1]))
+        joined = " ".join(c for c, _, _ in chunks)
+        self.assertTrue(all(s in joined for s in sentences))
+
+    def test_unfinished_sentence_carries_across_pages(self):
+        from ragapi.token_chunker import chunk_pages_iter
+
+        pages = [(1, "Kalimat pertama selesai. Anak yang kurang gizi"), (2, "cenderung pendek. Kalimat akhir.")]
+        chunks = list(chunk_pages_iter(pages, max_tokens_per_chunk=8, overlap_sentences=0))
+
+        self.assertEqual(
+            chunks,
+            [
+                ("Kalimat pertama selesai.", 1, 1),
+                ("Anak yang kurang gizi cenderung pendek.", 1, 2),
+                ("Kalimat akhir.", 2, 2),
+            ],
+        )
+
+    def test_oversized_sentence_is_split_by_token_offsets(self):
+        from ragapi.token_chunker import _split_long, chunk_pages_iter, get_tokenizer
+
+        sentence = " ".join(f"kata{i}" for i in range(50)) + "."
+        enc = get_tokenizer().encode(sentence, add_special_tokens=False)
+
+        pieces = list(_split_long(sentence, enc, 20))
+
+        self.assertEqual([n for _, n in pieces], [20, 20, 11])
+        self.assertEqual(pieces[0][0], " ".join(f"kata{i}" for i in range(20)))
+        self.assertEqual(pieces[-1][0], " ".join(f"kata{i}" for i in range(40, 50)) + ".")
+        self.assertEqual(len(list(chunk_pages_iter([(3, sentence)], max_tokens_per_chunk=20))), 3)
+
+    def test_tokenizer_comes_from_loaded_embedder(self):
+        from ragapi import token_chunker
+
+        model = mock.Mock(max_seq_length=256, tokenizer=_word_tokenizer())
+        with mock.patch("ragapi.token_chunker._tokenizer", None), mock.patch("ragapi.embeddings._MODEL", model):
+            self.assertEqual(token_chunker.count_tokens(["Dua kata."]), [3])
+
+
+@override_settings(RAG_CHUNKER="chars")
+class PdfStreamingTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = self.enterContext(isolated_store())
+
+    def _pdf(self, n_pages: int, lines: int = 30):
+        from ragapi.bench import write_synthetic_pdf
+
+        rng = random.Random(n_pages)
+        path = self.tmp / f"doc{n_pages}.pdf"
+        write_synthetic_pdf(path, [[_sentence(rng) for _ in range(lines)] for _ in range(n_pages)])
+        return path
+
+    def test_pages_are_extracted_lazily(self):
+        from pypdf import PageObject
+
+        from ragapi.pdf_ingest import iter_pdf_pages
+
+        original = PageObject.extract_text
+        with mock.patch.object(PageObject, "extract_text", autospec=True, side_effect=original) as extract:
+            pages = iter_pdf_pages(str(self._pdf(4)))
+            page_no, text = next(pages)
+            self.assertEqual((page_no, extract.call_count), (1, 1))
+            self.assertTrue(text)
+            self.assertEqual([p for p, _ in pages], [2, 3, 4])
+
+    def test_page_limits_and_stats(self):
+        from ragapi.pdf_ingest import iter_pdf_pages
+
+        path = str(self._pdf(5))
+        stats = {}
+        self.assertEqual([p for p, _ in iter_pdf_pages(path, max_pages=2, stats=stats)], [1, 2])
+        self.assertEqual(stats["pages"], 2)
+
+        stats = {}
+        pages = list(iter_pdf_pages(path, max_pages=None, max_chars=10, stats=stats))
+        self.assertEqual(len(pages), 1)  # berhenti setelah halaman yang melewati max_chars
+        self.assertEqual(stats["chars"], len(pages[0][1]))
+
+    def test_chunk_pages_iter_matches_whole_text_chunking(self):
+        from ragapi.pdf_ingest import chunk_pages_iter, chunk_text_iter
+
+        pages = [(1, "a" * 1000), (2, "b" * 1500), (4, "c" * 300), (5, "d" * 2500)]
+        chunks = list(chunk_pages_iter(pages, max_chars=1800, overlap=200))
+
+        whole = "\n".join(t for _, t in pages)
+        self.assertEqual([c for c, _, _ in chunks], list(chunk_text_iter(whole, 1800, 200)))
+        self.assertEqual([(p0, p1) for _, p0, p1 in chunks], [(1, 2), (2, 5), (5, 5), (5, 5)])
+
+    def test_chunks_carry_page_metadata(self):
+        from ragapi.pdf_ingest import chunk_id, file_sha256, iter_pdf_chunks
+
+        path = str(self._pdf(3, lines=60))
+        file_hash = file_sha256(path)
+        stats = {}
+        chunks = list(iter_pdf_chunks(path, {"paper_id": "p1", "title": "Uji"}, file_hash, stats=stats))
+
+        self.assertEqual([cid for cid, _, _ in chunks], [chunk_id(file_hash, i) for i in range(len(chunks))])
+        metas = [m for _, _, m in chunks]
+        self.assertEqual(metas[0]["page_start"], 1)
+        self.assertEqual(metas[-1]["page_end"], 3)
+        for m in metas:
+            self.assertLessEqual(m["page_start"], m["page_end"])
+            self.assertEqual((m["paper_id"], m["file_hash"]), ("p1", file_hash))
+        self.assertEqual(stats["pages"], 3)
+
+
+class IngestManifestTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(isolated_store())
+
+    def test_stale_entries(self):
+        from ragapi import ingest_manifest
+
+        ingest_manifest.record("h1", "chars", "p1", "/a.pdf", 10, pages=3)
+        ingest_manifest.record("h1", "tokens", "p1", "/a.pdf", 8, pages=3)
+        ingest_manifest.record("h0", "chars", "p1", "/a.pdf", 9, pages=3)
+        ingest_manifest.record("h9", "chars", "p1", "/lain.pdf", 4, pages=1)
+        ingest_manifest.record("h8", "chars", "p2", "/a.pdf", 4, pages=1)
+
+        stale = ingest_manifest.stale_entries("p1", "/a.pdf", "h1", "chars")
+
+        self.assertEqual(
+            sorted((e["file_hash"], e["chunker"], e["chunk_count"]) for e in stale),
+            [("h0", "chars", 9), ("h1", "tokens", 8)],
+        )
+        self.assertEqual(ingest_manifest.stale_entries(None, "/a.pdf", "h1", "chars"), [])
+
+        ingest_manifest.forget(stale)
+        self.assertEqual(ingest_manifest.stale_entries("p1", "/a.pdf", "h1", "chars"), [])
+        self.assertIsNotNone(ingest_manifest.lookup("h1", "chars"))
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = self.enterContext(isolated_store())
+        # jam tiruan: tiap panggilan time.time() maju 1 detik → urutan last_used deterministik
+        self.clock = iter(range(1_000_000, 2_000_000))
+        self.enterContext(mock.patch("ragapi.cache_store.time.time", side_effect=lambda: next(self.clock)))
+
+    def _cache(self, **kwargs):
+        from ragapi.cache_store import SQLiteCache
+
+        return SQLiteCache(self.tmp / "cache.sqlite3", **kwargs)
+
+    def test_roundtrip_and_stats(self):
+        cache = self._cache()
+        cache.set_many([("a", b"1"), ("b", b"2")])
+        cache.set("a", b"3")
+
+        self.assertEqual(cache.get_many(["a", "b", "c", "a"]), {"a": b"3", "b": b"2"})
+        self.assertIsNone(cache.get("c"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (2, 2, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+        cache.delete("a")
+        self.assertEqual(cache.stats()["entries"], 1)
+        # entry bertahan setelah dibuka ulang dari disk
+        self.assertEqual(self._cache().get_many(["a", "b"]), {"b": b"2"})
+
+    def test_ttl_expiry(self):
+        cache = self._cache(ttl_seconds=5)
+        cache.set("a", b"1")
+        self.assertEqual(cache.get("a"), b"1")
+
+        self.clock = iter(range(3_000_000, 4_000_000))
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_lru_eviction_keeps_recently_used(self):
+        cache = self._cache(max_entries=10)
+        cache.set_many((f"k{i}", b"x") for i in range(5))
+        cache.set_many((f"k{i}", b"x") for i in range(5, 10))
+        cache.get("k0")  # k0 baru dipakai → bukan korban eviction
+
+        cache.set("k10", b"x")
+
+        stats = cache.stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (9, 2))  # turun ke 90% kapasitas
+        present = cache.get_many([f"k{i}" for i in range(11)])
+        self.assertIn("k0", present)
+        self.assertIn("k10", present)
+        self.assertEqual(len(present), 9)
+
+
+    def test_entry_count_is_shared_between_processes(self):
+        # dua instance pada file yang sama = dua proses (gunicorn worker + ingest command)
+        web, ingest = self._cache(max_entries=10), self._cache(max_entries=10)
+        web.set_many((f"w{i}", b"x") for i in range(6))
+        ingest.set_many((f"i{i}", b"x") for i in range(6))
+
+        self.assertEqual(ingest.stats()["evictions"], 3)  # 12 > 10 → turun ke 9
+        self.assertEqual(web.stats()["entries"], 9)
+        self.assertEqual(len(web.get_many([f"w{i}" for i in range(6)] + [f"i{i}" for i in range(6)])), 9)
+
+        ingest.delete("i5")
+        self.assertEqual(web.stats()["entries"], 8)
+
+    def test_failed_write_rolls_back(self):
+        import sqlite3
+
+        cache = self._cache()
+        cache.set("a", b"1")
+
+        with self.assertRaises(sqlite3.Error):
+            cache.set_many([("b", b"2"), ("c", object())])  # gagal di tengah executemany
+
+        self.assertEqual(cache.get_many(["a", "b"]), {"a": b"1"})
+        cache.set("d", b"4")  # koneksi tidak tertinggal di transaksi terbuka
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_existing_file_without_meta_is_counted(self):
+        import sqlite3
+
+        conn = sqlite3.connect(self.tmp / "cache.sqlite3")
+        conn.execute(
+            "CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL) WITHOUT ROWID"
+        )
+        conn.executemany("INSERT INTO cache VALUES (?, ?, 0, 0)", [(f"k{i}", b"x") for i in range(4)])
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self._cache().stats()["entries"], 4)
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(isolated_store())
+        self.encode = self.enterContext(
+            mock.patch("ragapi.embeddings._encode_coalesced", side_effect=lambda texts, *a: _fake_embed(texts))
+        )
+
+    def test_only_misses_are_encoded(self):
+        from ragapi.embeddings import embed, embedding_cache_stats
+
+        first = embed(["a", "b", "a"], as_numpy=True)
+        second = embed(["b", "c", "a"], as_numpy=True)
+
+        self.assertEqual([c.args[0] for c in self.encode.call_args_list], [["a", "b"], ["c"]])
+        np.testing.assert_array_equal(second[0], first[1])
+        np.testing.assert_array_equal(second[2], first[0])
+        self.assertEqual(embedding_cache_stats()["entries"], 3)
+
+    def test_use_cache_false_always_encodes(self):
+        from ragapi.embeddings import embed
+
+        embed(["a"])
+        vecs = embed(["a"], use_cache=False)
+
+        self.assertEqual(self.encode.call_count, 2)
+        self.assertIsInstance(vecs[0], list)
+
+
+class VectorMirrorTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = self.enterContext(isolated_store())
+
+    def _corpus(self, n=60):
+        texts = [f"chunk {i}" for i in range(n)]
+        metas = [{"paper_id": f"p{i % 3}", "year": 2000 + i % 10, "chunk_index": i} for i in range(n)]
+        return [f"c{i}" for i in range(n)], texts, metas, _fake_embed(texts)
+
+    def _mirror(self, space="l2"):
+        from ragapi.vector_mirror import VectorMirror
+
+        ids, texts, metas, embs = self._corpus()
+        mirror = VectorMirror(space=space)
+        mirror.upsert(ids, texts, metas, embs)
+        return mirror, embs
+
+    def test_matches_chroma_exact_search(self):
+        from ragapi.chroma_client import upsert_chunks
+        from ragapi.retrieval import _query_chroma
+        from ragapi.vector_mirror import build_from_chroma
+
+        ids, texts, metas, embs = self._corpus()
+        upsert_chunks(ids, texts, metas, embs)
+        mirror = build_from_chroma()
+        q = _fake_embed(["pertanyaan"])[0]
+
+        for where in (None, {"paper_id": "p1"}):
+            expected = _query_chroma(q.tolist(), 5, where)
+            got = mirror.query(q, 5, where)
+            self.assertEqual([h["id"] for h in got], [h["id"] for h in expected])
+            np.testing.assert_allclose(
+                [h["distance"] for h in got], [h["distance"] for h in expected], rtol=1e-4, atol=1e-5
+            )
+            self.assertEqual(got[0]["meta"], expected[0]["meta"])
+
+    def test_upsert_replaces_and_remove_hides(self):
+        mirror, embs = self._mirror()
+
+        mirror.upsert(["c5"], ["baru"], [{"paper_id": "p9"}], embs[7:8])
+        hit = mirror.query(embs[7], 2)
+        self.assertEqual({h["id"] for h in hit}, {"c5", "c7"})
+        self.assertEqual(len(mirror), 60)
+
+        mirror.remove(["c7", "tidak-ada"])
+        hit = mirror.query(embs[7], 1)
+        self.assertEqual((hit[0]["id"], hit[0]["text"]), ("c5", "baru"))
+        self.assertEqual(len(mirror), 59)
+        self.assertEqual(mirror.get(["c7", "c5"], embs[7])[0]["id"], "c5")
+
+    def test_where_operators(self):
+        mirror, embs = self._mirror(space="cosine")
+        q = embs[0]
+
+        def ids(where):
+            return {h["id"] for h in mirror.query(q, 100, where)}
+
+        self.assertEqual(ids({"paper_id": {"$in": ["p0", "p2"]}}), {f"c{i}" for i in range(60) if i % 3 != 1})
+        self.assertEqual(ids({"year": {"$gte": 2008}}), {f"c{i}" for i in range(60) if i % 10 >= 8})
+        self.assertEqual(
+            ids({"$and": [{"paper_id": "p0"}, {"$or": [{"year": 2000}, {"year": {"$lt": 2002}}]}]}),
+            {f"c{i}" for i in range(60) if i % 3 == 0 and i % 10 < 2},
+        )
+        self.assertEqual(ids({"paper_id": {"$ne": "p0"}}), {f"c{i}" for i in range(60) if i % 3})
+        self.assertEqual(mirror.query(q, 5, {"paper_id": "tidak-ada"}), [])
+        with self.assertRaises(ValueError):
+            mirror.query(q, 5, {"year": {"$contains": 1}})
+
+    def test_snapshot_roundtrip_with_mmap(self):
+        from ragapi.vector_mirror import VectorMirror
+
+        mirror, embs = self._mirror()
+        mirror.remove(["c1"])
+        mirror.generation = 7
+        mirror.save(self.tmp / "snap")
+
+        loaded = VectorMirror.load(self.tmp / "snap", mmap=True)
+        self.assertIsInstance(loaded._matrix, np.memmap)
+        self.assertEqual((len(loaded), loaded.generation), (59, 7))
+        self.assertEqual(loaded.query(embs[3], 5), mirror.query(embs[3], 5))
+
+        # tulisan pertama menyalin snapshot read-only ke RAM
+        loaded.upsert(["c1"], ["kembali"], [{}], embs[1:2])
+        self.assertEqual(loaded.query(embs[1], 1)[0]["id"], "c1")
+
+    @override_settings(RAG_RETRIEVAL_ENGINE="numpy", RAG_MIRROR_REFRESH_SECONDS=3600)
+    def test_write_path_keeps_loaded_mirror_in_sync(self):
+        from ragapi.chroma_client import delete_chunks, upsert_chunks
+        from ragapi.vector_mirror import get_mirror
+
+        ids, texts, metas, embs = self._corpus()
+        upsert_chunks(ids[:50], texts[:50], metas[:50], embs[:50])
+        mirror = get_mirror()
+        self.assertEqual(len(mirror), 50)
+
+        upsert_chunks(ids[50:], texts[50:], metas[50:], embs[50:])
+        delete_chunks(["c0"])
+
+        self.assertIs(get_mirror(), mirror)
+        self.assertEqual(len(mirror), 59)
+        self.assertEqual(mirror.query(embs[55], 1)[0]["id"], "c55")
+        self.assertNotIn("c0", {h["id"] for h in mirror.query(embs[0], 5)})
+
+    def _foreign_write(self, ids, texts, metas, embs):
+        import sqlite3
+
+        from ragapi.chroma_client import get_collection
+
+        # proses lain (ingest command / worker enrichment): tulis Chroma + naikkan generation
+        get_collection().upsert(ids=ids, documents=texts, metadatas=metas, embeddings=embs)
+        other = sqlite3.connect(settings.RAG_GENERATION_PATH)
+        with other:
+            other.execute(
+                "UPDATE generation SET value = value + 1 WHERE collection = ?", (settings.RAG_COLLECTION,)
+            )
+        other.close()
+
+    @override_settings(RAG_RETRIEVAL_ENGINE="numpy", RAG_MIRROR_REFRESH_SECONDS=0)
+    def test_own_writes_do_not_trigger_rebuild(self):
+        from ragapi.chroma_client import delete_chunks, upsert_chunks
+        from ragapi.vector_mirror import get_mirror
+
+        ids, texts, metas, embs = self._corpus()
+        upsert_chunks(ids[:50], texts[:50], metas[:50], embs[:50])
+        mirror = get_mirror()
+        upsert_chunks(ids[50:], texts[50:], metas[50:], embs[50:])
+        delete_chunks(["c0"])
+
+        self.assertIs(get_mirror(), mirror)
+        self.assertEqual(mirror.own_generations, set())
+
+    @override_settings(RAG_RETRIEVAL_ENGINE="numpy", RAG_MIRROR_REFRESH_SECONDS=0)
+    def test_foreign_write_with_same_count_triggers_rebuild(self):
+        from ragapi.chroma_client import upsert_chunks
+        from ragapi.vector_mirror import get_mirror
+
+        ids, texts, metas, embs = self._corpus()
+        upsert_chunks(ids, texts, metas, embs)
+        mirror = get_mirror()
+
+        # jumlah chunk tetap, manifest tidak disentuh: hanya generation yang berubah
+        self._foreign_write(["c3"], ["ditulis ulang"], [metas[3]], embs[9:10])
+
+        reloaded = get_mirror()
+        self.assertIsNot(reloaded, mirror)
+        self.assertEqual(reloaded.get(["c3"], embs[9])[0]["text"], "ditulis ulang")
+
+    @override_settings(RAG_RETRIEVAL_ENGINE="numpy", RAG_MIRROR_REFRESH_SECONDS=0)
+    def test_foreign_write_between_own_writes_is_not_absorbed(self):
+        from ragapi.chroma_client import upsert_chunks
+        from ragapi.vector_mirror import get_mirror
+
+        ids, texts, metas, embs = self._corpus()
+        upsert_chunks(ids[:40], texts[:40], metas[:40], embs[:40])
+        mirror = get_mirror()
+        with override_settings(RAG_MIRROR_REFRESH_SECONDS=3600):
+            self._foreign_write(ids[40:50], texts[40:50], metas[40:50], embs[40:50])
+            upsert_chunks(ids[50:], texts[50:], metas[50:], embs[50:])
+            self.assertIs(get_mirror(), mirror)
+
+        reloaded = get_mirror()
+        self.assertIsNot(reloaded, mirror)
+        self.assertEqual(len(reloaded), 60)
+
+    def test_query_waits_for_concurrent_writes(self):
+        import threading
+
+        mirror, embs = self._mirror()
+        stop = threading.Event()
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                mirror.remove([f"c{i % 60}"])
+                mirror.upsert([f"c{i % 60}"], [f"chunk {i % 60}"], [{"paper_id": "p0"}], embs[i % 60 : i % 60 + 1])
+                i += 1
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for _ in range(200):
+                for hit in mirror.query(embs[5], 10):
+                    self.assertIsNotNone(hit["text"])
+                    self.assertIsNotNone(hit["meta"])
+        finally:
+            stop.set()
+            thread.join()
+
+
+class EmbedSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+        def encode(texts, show_progress, batch_size):
+            self.batches.append(list(texts))
+            if any(t.startswith("boom") for t in texts):
+                raise RuntimeError("encode gagal")
+            return _fake_embed(texts)
+
+        self.enterContext(mock.patch("ragapi.embeddings._encode", side_effect=encode))
+
+    @staticmethod
+    def _concurrently(fn, n):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        barrier = threading.Barrier(n)
+
+        def run(i):
+            barrier.wait()
+            return fn(i)
+
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            futures = [pool.submit(run, i) for i in range(n)]
+        return futures
+
+    def test_concurrent_requests_get_their_own_rows(self):
+        from ragapi.embeddings import EmbedScheduler
+
+        scheduler = EmbedScheduler(window_ms=50, max_batch=64)
+        requests = [[f"teks {i}", "bersama", f"teks {i} b"] for i in range(12)]
+
+        futures = self._concurrently(lambda i: scheduler.submit(requests[i]), 12)
+
+        for texts, fut in zip(requests, futures):
+            np.testing.assert_allclose(fut.result(), _fake_embed(texts))
+        stats = scheduler.stats()
+        self.assertEqual((stats["requests"], stats["texts"]), (12, 36))
+        self.assertLess(stats["batches"], 12)
+        # teks yang sama di satu batch hanya di-encode sekali
+        self.assertTrue(all(len(b) == len(set(b)) for b in self.batches))
+
+    def test_batches_respect_max_batch(self):
+        from ragapi.embeddings import EmbedScheduler
+
+        scheduler = EmbedScheduler(window_ms=50, max_batch=8)
+
+        futures = self._concurrently(lambda i: scheduler.submit([f"a{i}", f"b{i}", f"c{i}"]), 10)
+
+        self.assertTrue(all(f.exception() is None for f in futures))
+        self.assertTrue(all(size <= 8 for size in scheduler.stats()["batch_sizes"]))
+
+    def test_encode_error_reaches_every_caller_in_batch(self):
+        from ragapi.embeddings import EmbedScheduler
+
+        scheduler = EmbedScheduler(window_ms=200, max_batch=64)
+
+        futures = self._concurrently(lambda i: scheduler.submit(["boom" if i == 0 else f"ok {i}"]), 4)
+
+        failed = [f for f in futures if f.exception() is not None]
+        self.assertIn(futures[0], failed)
+        for f in failed:
+            self.assertIsInstance(f.exception(), RuntimeError)
+        # thread batcher tetap hidup untuk request berikutnya
+        np.testing.assert_allclose(scheduler.submit(["lagi"]), _fake_embed(["lagi"]))
+
+    @override_settings(RAG_EMBED_BATCHING=True, RAG_EMBED_MAX_BATCH=4, RAG_EMBED_BATCH_WINDOW_MS=1)
+    def test_large_or_explicit_batches_bypass_scheduler(self):
+        from ragapi import embeddings
+
+        with mock.patch.object(embeddings, "_SCHEDULER", None):
+            embeddings._encode_coalesced(["x"] * 4, False, None)
+            embeddings._encode_coalesced(["y"], False, 16)
+            self.assertEqual(embeddings.embed_scheduler_stats()["requests"], 0)
+
+            embeddings._encode_coalesced(["z"], False, None)
+            self.assertEqual(embeddings.embed_scheduler_stats()["requests"], 1)
+
+
+class CompactProjectionTests(SimpleTestCase):
+    @staticmethod
+    def _embeddings(n=2000, dim=64):
+        # seperti MiniLM: komponen bersama besar + variasi rank rendah, dinormalisasi
+        rng = np.random.default_rng(0)
+        common = rng.standard_normal(dim)
+        common /= np.linalg.norm(common)
+        basis = rng.standard_normal((12, dim))
+        embs = 3 * common + rng.standard_normal((n, 12)) @ basis * 0.3 + rng.standard_normal((n, dim)) * 0.05
+        return (embs / np.linalg.norm(embs, axis=1, keepdims=True)).astype(np.float32)
+
+    def test_projection_keeps_distance_scale_for_gating(self):
+        from ragapi.compact import Projection
+
+        embs = self._embeddings()
+        projected = Projection.fit(embs, 16).apply(embs)
+
+        full = 1.0 - embs[:50] @ embs.T
+        approx = 1.0 - projected[:50] @ projected.T
+        # threshold gating (cosine distance) tetap berlaku di ruang terproyeksi
+        self.assertLess(float(np.abs(full - approx).mean()), 0.01)
+
+    def test_centered_projection_file_is_refit(self):
+        from ragapi.compact import Projection, load_projection
+
+        embs = self._embeddings(n=200)
+        with isolated_store() as tmp, self.settings(RAG_EMBED_PCA_DIM=16):
+            path = Path(settings.RAG_PROJECTION_PATH)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as f:
+                np.savez(f, mean=embs.mean(axis=0), components=np.eye(16, 64, dtype=np.float32))
+
+            self.assertIsNone(load_projection())
+            projection = load_projection(fit_from=embs)
+
+            self.assertEqual(projection.dim, 16)
+            self.assertEqual(Projection.load(path).dim, 16)
+            self.assertTrue(str(path).startswith(str(tmp)))
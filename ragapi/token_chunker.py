@@ -0,0 +1,194 @@
+"""
+Chunker berbasis token (RAG_CHUNKER="tokens").
+
+all-MiniLM-L6-v2 memotong input di 256 wordpiece; window 1800 karakter umumnya lebih
+panjang dari itu, jadi ekor chunk ikut di-encode tapi tidak terwakili di vektor.
+Di sini kalimat utuh dipak sampai batas token embedder (diukur dengan tokenizer embedder
+sendiri, di-batch per halaman) dan overlap dihitung per kalimat, bukan per karakter.
+"""
+import logging
+import re
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from .onnx_embedder import MAX_SEQ_LENGTH
+
+logger = logging.getLogger(__name__)
+
+SPECIAL_TOKENS = 2  # [CLS] + [SEP] ditambahkan embedder di setiap input
+
+# akhir kalimat: . ! ? (boleh diikuti kutip/kurung tutup) lalu spasi dan awal kalimat baru
+_SENT_END = re.compile(r"[.!?][\"'”’)\]]*\s+(?=[\"'“‘(\[]?[A-Z0-9])")
+_TERMINAL = re.compile(r"[.!?][\"'”’)\]]*$")
+# singkatan yang sering muncul di jurnal/guideline; titiknya bukan akhir kalimat
+_ABBREVIATIONS = {
+    "al", "dkk", "dr", "drs", "prof", "vs", "fig", "figs", "gbr", "tab", "no", "vol",
+    "e.g", "i.e", "etc", "approx", "ca", "jl", "mis", "yth",
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def max_tokens() -> int:
+    """
+    Budget token per chunk (tanpa token spesial). Default: max_seq_length embedder - 2.
+    """
+    return settings.RAG_CHUNK_MAX_TOKENS or (MAX_SEQ_LENGTH - SPECIAL_TOKENS)
+
+
+def _load_backend_tokenizer():
+    """
+    Tokenizer embedder tanpa memuat modelnya (chunker juga jalan di worker process ekstraksi).
+    """
+    from . import embeddings
+
+    model = embeddings.loaded_embedder()
+    if model is not None:
+        limit = getattr(model, "max_seq_length", None)
+        if limit and max_tokens() + SPECIAL_TOKENS > limit:
+            logger.warning(f"[CHUNK] RAG_CHUNK_MAX_TOKENS={max_tokens()} melebihi max_seq_length embedder ({limit})")
+        return getattr(model.tokenizer, "backend_tokenizer", model.tokenizer)
+    if settings.RAG_EMBED_BACKEND == "onnx":
+        from tokenizers import Tokenizer
+
+        return Tokenizer.from_file(str(Path(settings.RAG_ONNX_MODEL_DIR) / "tokenizer.json"))
+
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(embeddings.EMBED_MODEL_NAME).backend_tokenizer
+
+
+def get_tokenizer():
+    """
+    Salinan tokenizer embedder tanpa truncation/padding (yang dipakai saat encode),
+    supaya kalimat panjang terhitung penuh.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from tokenizers import Tokenizer
+
+                tok = Tokenizer.from_str(_load_backend_tokenizer().to_str())
+                tok.no_truncation()
+                tok.no_padding()
+                _tokenizer = tok
+    return _tokenizer
+
+
+def count_tokens(texts) -> list[int]:
+    """
+    Jumlah token (tanpa token spesial) per teks, satu panggilan encode_batch.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    return [len(e.ids) for e in get_tokenizer().encode_batch(texts, add_special_tokens=False)]
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Pecah teks per paragraf lalu per kalimat; whitespace (termasuk line-wrap PDF) dirapikan.
+    """
+    sentences = []
+    for para in re.split(r"\n\s*\n", text):
+        start = 0
+        for m in _SENT_END.finditer(para):
+            words = para[start:m.start()].split()
+            word = words[-1].lower() if words else ""
+            # inisial nama ("J. Smith") dan singkatan bukan akhir kalimat
+            if word.strip("\"'“‘([") in _ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                continue
+            sentences.append(para[start:m.end()])
+            start = m.end()
+        sentences.append(para[start:])
+    return [" ".join(s.split()) for s in sentences if s.strip()]
+
+
+def _split_long(sentence: str, encoding, budget: int):
+    """
+    Kalimat yang melebihi budget dipotong per budget token (batas potong mengikuti offset token).
+    """
+    offsets = encoding.offsets
+    for i in range(0, len(offsets), budget):
+        piece = offsets[i:i + budget]
+        yield sentence[piece[0][0]:piece[-1][1]], len(piece)
+
+
+def _iter_sentences(pages, budget: int):
+    """
+    Yield (kalimat, n_token, page_start, page_end). Kalimat terakhir halaman yang belum
+    selesai (tanpa tanda baca akhir) disambung ke awal halaman berikutnya.
+    """
+    carry = None  # (teks, page_no)
+    for page_no, txt in pages:
+        items = [(s, page_no, page_no) for s in split_sentences(txt)]
+        if carry is not None:
+            if items:
+                items[0] = (f"{carry[0]} {items[0][0]}", carry[1], page_no)
+            else:
+                items = [(carry[0], carry[1], carry[1])]
+            carry = None
+        if items and not _TERMINAL.search(items[-1][0]):
+            carry = (items[-1][0], items[-1][1])
+            items.pop()
+        if items:
+            yield from _tokenize(items, budget)
+
+    if carry is not None:
+        yield from _tokenize([(carry[0], carry[1], carry[1])], budget)
+
+
+def _tokenize(items, budget: int):
+    encodings = get_tokenizer().encode_batch([text for text, _, _ in items], add_special_tokens=False)
+    for (text, p0, p1), enc in zip(items, encodings):
+        n = len(enc.ids)
+        if not n:
+            continue
+        if n <= budget:
+            yield text, n, p0, p1
+        else:
+            for piece, count in _split_long(text, enc, budget):
+                yield piece, count, p0, p1
+
+
+def chunk_pages_iter(pages, max_tokens_per_chunk: int | None = None, overlap_sentences: int | None = None):
+    """
+    pages: iterable (page_no, text), mis. dari iter_pdf_pages.
+    Yield (chunk, page_start, page_end), sama seperti pdf_ingest.chunk_pages_iter.
+    Overlap: kalimat terakhir chunk sebelumnya (maks. setengah budget) diulang di awal chunk berikutnya.
+    """
+    budget = max_tokens_per_chunk or max_tokens()
+    overlap = settings.RAG_CHUNK_OVERLAP_SENTENCES if overlap_sentences is None else overlap_sentences
+
+    window = []  # (kalimat, n_token, page_start, page_end)
+    total = 0
+    fresh = 0  # kalimat baru sejak chunk terakhir (bukan overlap)
+
+    def emit():
+        return " ".join(s for s, _, _, _ in window), min(w[2] for w in window), max(w[3] for w in window)
+
+    for sentence in _iter_sentences(pages, budget):
+        n = sentence[1]
+        if window and total + n > budget:
+            yield emit()
+            keep = window[-overlap:] if overlap else []
+            # overlap tidak boleh mendominasi chunk berikutnya, dan kalimat baru harus muat
+            while keep and (sum(k[1] for k in keep) * 2 > budget or sum(k[1] for k in keep) + n > budget):
+                keep.pop(0)
+            window = list(keep)
+            total = sum(k[1] for k in window)
+            fresh = 0
+        window.append(sentence)
+        total += n
+        fresh += 1
+
+    if fresh:
+        yield emit()
+
+
+def chunker_tag() -> str:
+    return f"pages-sent-tok{max_tokens()}o{settings.RAG_CHUNK_OVERLAP_SENTENCES}s"
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import IngestPDFView
+from .views import IngestPDFView, MetricsView
 
 urlpatterns = [
     path("rag/ingest/", IngestPDFView.as_view()),
+    path("metrics/", MetricsView.as_view()),
 ]
@@ -0,0 +1,440 @@
+"""
+Mirror in-memory seluruh embedding chunk untuk retrieval exact top-k tanpa lewat Chroma.
+
+- matriks float32 kontigu (N × D) + array id/dokumen/metadata, urutan baris sama
+- top-k = perkalian matriks–vektor per blok baris (RAG_MIRROR_SCORE_BLOCK) + argpartition
+- filter `where` (subset operator Chroma) dievaluasi jadi mask boolean, di-cache per versi mirror
+- disinkronkan dari jalur tulis upsert_chunks / delete_chunks; perubahan dari proses lain
+  terdeteksi lewat generation collection (chroma_client, lintas proses) yang dicek berkala:
+  setiap generation yang tidak dihasilkan proses ini → mirror dibangun ulang
+- opsional: snapshot ke disk (embeddings.npy + meta.pkl) yang dibuka dengan memory-map
+- opsional: representasi kompak (proyeksi PCA dan/atau int8 per-vektor), lihat compact.py
+"""
+import json
+import logging
+import pickle
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .compact import Codec, get_codec
+
+logger = logging.getLogger(__name__)
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+class VectorMirror:
+    def __init__(self, space: str = "l2", codec: Codec | None = None):
+        self.space = space
+        self.codec = codec or Codec()
+        self._dtype = np.int8 if self.codec.int8 else np.float32
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 0), dtype=self._dtype)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0  # jumlah baris terpakai (termasuk yang sudah dihapus)
+        self._ids = []
+        self._docs = []
+        self._metas = []
+        self._row_of = {}
+        self._columns = {}  # key metadata → np.ndarray(object), dibangun saat pertama dipakai filter
+        self._masks = {}  # json where → mask boolean
+        self.version = 0
+        self.generation = None  # generation collection yang sudah tercermin penuh di mirror
+        self.own_generations = set()  # generation sesudahnya yang dihasilkan tulisan proses ini
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self._row_of)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memori array mirror (matriks termasuk kapasitas cadangan, scale, norma, flag hidup);
+        dokumen/metadata Python tidak dihitung.
+        """
+        return sum(a.nbytes for a in (self._matrix, self._scales, self._sq_norms, self._alive))
+
+    # ---------- tulis ----------
+
+    def _reserve(self, rows: int, dim: int):
+        capacity = self._matrix.shape[0]
+        if self._matrix.shape[1] != dim and self._size == 0:
+            self._matrix = np.zeros((0, dim), dtype=self._dtype)
+            capacity = 0
+        if rows <= capacity and self._matrix.flags.writeable:
+            return
+        # kapasitas digandakan supaya append bertahap tetap amortized O(1);
+        # snapshot memory-map (read-only) disalin ke RAM pada tulisan pertama
+        new_capacity = max(rows, capacity * 2 if rows > capacity else capacity, 1024)
+        matrix = np.zeros((new_capacity, dim), dtype=self._dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        scales = np.zeros(new_capacity, dtype=np.float32)
+        scales[: self._size] = self._scales[: self._size]
+        sq_norms = np.zeros(new_capacity, dtype=np.float32)
+        sq_norms[: self._size] = self._sq_norms[: self._size]
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        self._matrix, self._scales, self._sq_norms, self._alive = matrix, scales, sq_norms, alive
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        if not ids:
+            return
+        encoded, scales = self.codec.encode(embeddings)
+        sq_norms = np.einsum("ij,ij->i", encoded, encoded, dtype=np.float32) * scales**2
+        with self._lock:
+            new_rows = sum(1 for chunk_id in dict.fromkeys(ids) if chunk_id not in self._row_of)
+            self._reserve(self._size + new_rows, encoded.shape[1])
+            for chunk_id, doc, meta, row_vec, scale, sq_norm in zip(
+                ids, documents, metadatas, encoded, scales, sq_norms
+            ):
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._row_of[chunk_id] = row
+                    self._ids.append(chunk_id)
+                    self._docs.append(doc)
+                    self._metas.append(meta)
+                else:
+                    self._docs[row] = doc
+                    self._metas[row] = meta
+                self._matrix[row] = row_vec
+                self._scales[row] = scale
+                self._sq_norms[row] = sq_norm
+                self._alive[row] = True
+            self._changed()
+
+    def remove(self, ids):
+        with self._lock:
+            removed = False
+            for chunk_id in ids:
+                row = self._row_of.pop(chunk_id, None)
+                if row is None:
+                    continue
+                if not self._alive.flags.writeable:
+                    self._alive = self._alive.copy()
+                self._alive[row] = False
+                self._docs[row] = None
+                self._metas[row] = None
+                removed = True
+            if removed:
+                self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._columns = {}
+        self._masks = {}
+
+    # ---------- filter where ----------
+
+    def _column(self, key):
+        col = self._columns.get(key)
+        if col is None:
+            col = np.empty(self._size, dtype=object)
+            col[:] = [(m or {}).get(key) for m in self._metas]
+            self._columns[key] = col
+        return col
+
+    def _eval(self, where: dict) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._eval(sub)
+            elif key == "$or":
+                any_mask = np.zeros(self._size, dtype=bool)
+                for sub in cond:
+                    any_mask |= self._eval(sub)
+                mask &= any_mask
+            else:
+                mask &= self._eval_field(self._column(key), cond)
+        return mask
+
+    @staticmethod
+    def _eval_field(col: np.ndarray, cond) -> np.ndarray:
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        mask = np.ones(len(col), dtype=bool)
+        for op, value in cond.items():
+            if op == "$eq":
+                mask &= col == value
+            elif op == "$ne":
+                mask &= col != value
+            elif op in ("$in", "$nin"):
+                values = set(value)
+                member = np.fromiter((v in values for v in col), dtype=bool, count=len(col))
+                mask &= member if op == "$in" else ~member
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                cmp = {
+                    "$gt": lambda a: a > value,
+                    "$gte": lambda a: a >= value,
+                    "$lt": lambda a: a < value,
+                    "$lte": lambda a: a <= value,
+                }[op]
+                mask &= np.fromiter((v is not None and cmp(v) for v in col), dtype=bool, count=len(col))
+            else:
+                raise ValueError(f"operator where tidak didukung mirror: {op}")
+        return mask
+
+    def _mask(self, where: dict | None):
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._eval(where)
+            self._masks[key] = mask
+        return mask
+
+    # ---------- query ----------
+
+    @staticmethod
+    def _dots(matrix, q) -> np.ndarray:
+        # matriks int8 di-upcast ke float32 oleh matmul; per blok supaya salinan sementaranya
+        # hanya RAG_MIRROR_SCORE_BLOCK baris, bukan seluruh mirror
+        dots = np.empty(matrix.shape[0], dtype=np.float32)
+        block = max(1, settings.RAG_MIRROR_SCORE_BLOCK)
+        for start in range(0, matrix.shape[0], block):
+            np.matmul(matrix[start : start + block], q, out=dots[start : start + block])
+        return dots
+
+    def _distances(self, matrix, scales, sq_norms, q):
+        # q sudah di-encode_query (proyeksi bila ada); baris int8 didekuantisasi lewat scale
+        q = np.asarray(q, dtype=np.float32)
+        dots = self._dots(matrix, q)
+        dots *= scales
+        if self.space == "cosine":
+            norms = np.sqrt(sq_norms) * np.linalg.norm(q)
+            return 1.0 - dots / np.maximum(norms, 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        # Chroma "l2" = squared L2: |x|² - 2 x·q + |q|²
+        dots *= -2.0
+        dots += sq_norms
+        dots += float(q @ q)
+        return dots
+
+    def query(self, q_emb, k: int, where: dict | None = None) -> list[dict]:
+        q = self.codec.encode_query(q_emb)
+        # upsert/remove menulis baris matriks, flag hidup dan list dokumen di tempat:
+        # skor + susun hasil di bawah lock supaya tidak membaca baris setengah ditulis
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return []
+            mask = self._mask(where)
+            alive = self._alive[:size]
+            valid = alive if mask is None else alive & mask
+            n_valid = int(valid.sum())
+            k = min(k, n_valid)
+            if k <= 0:
+                return []
+
+            dists = self._distances(self._matrix[:size], self._scales[:size], self._sq_norms[:size], q)
+            dists = np.where(valid, dists, np.inf)
+            top = np.argpartition(dists, k - 1)[:k] if k < size else np.arange(size)
+            top = top[np.argsort(dists[top], kind="stable")][:k]
+            return [
+                {"id": self._ids[i], "text": self._docs[i], "meta": self._metas[i], "distance": float(dists[i])}
+                for i in top
+            ]
+
+    def get(self, ids, q_emb, where: dict | None = None) -> list[dict]:
+        """
+        Ambil chunk tertentu (mis. hasil BM25) beserta distance ke q_emb, menghormati filter where.
+        """
+        with self._lock:
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+            mask = self._mask(where)
+            if mask is not None:
+                rows = [r for r in rows if mask[r]]
+            if not rows:
+                return []
+            matrix = self._matrix[rows]
+            scales = self._scales[rows]
+            sq_norms = self._sq_norms[rows]
+            out = [(self._ids[r], self._docs[r], self._metas[r]) for r in rows]
+        dists = self._distances(matrix, scales, sq_norms, self.codec.encode_query(q_emb))
+        return [
+            {"id": chunk_id, "text": doc, "meta": meta, "distance": float(dist)}
+            for (chunk_id, doc, meta), dist in zip(out, dists)
+        ]
+
+    # ---------- snapshot ----------
+
+    def save(self, directory):
+        """
+        Tulis snapshot kompak (hanya baris yang masih hidup) untuk dibuka ulang dengan memory-map.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            rows = np.flatnonzero(self._alive[: self._size])
+            matrix = np.ascontiguousarray(self._matrix[rows])
+            meta = {
+                "space": self.space,
+                "codec": self.codec.label,
+                "scales": self._scales[rows].copy(),
+                "generation": self.generation,
+                "ids": [self._ids[r] for r in rows],
+                "docs": [self._docs[r] for r in rows],
+                "metas": [self._metas[r] for r in rows],
+            }
+        np.save(directory / "embeddings.npy", matrix)
+        with open(directory / "meta.pkl", "wb") as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, directory, codec: Codec | None = None, mmap: bool = True) -> "VectorMirror":
+        directory = Path(directory)
+        with open(directory / "meta.pkl", "rb") as f:
+            meta = pickle.load(f)
+        codec = codec or Codec()
+        if meta.get("codec", "float32") != codec.label:
+            raise ValueError(f"snapshot memakai codec {meta.get('codec')}, bukan {codec.label}")
+        matrix = np.load(directory / "embeddings.npy", mmap_mode="r" if mmap else None)
+
+        mirror = cls(space=meta["space"], codec=codec)
+        n = len(meta["ids"])
+        mirror._matrix = matrix
+        mirror._scales = meta["scales"]
+        mirror._sq_norms = np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32) * mirror._scales**2
+        mirror._alive = np.ones(n, dtype=bool)
+        mirror._size = n
+        mirror._ids = meta["ids"]
+        mirror._docs = meta["docs"]
+        mirror._metas = meta["metas"]
+        mirror._row_of = {chunk_id: i for i, chunk_id in enumerate(meta["ids"])}
+        mirror.generation = meta.get("generation")
+        return mirror
+
+
+def _space(col) -> str:
+    return (col.metadata or {}).get("hnsw:space", "l2")
+
+
+def mirror_codec(col=None) -> Codec:
+    """
+    Codec sesuai setting. Bila proyeksi PCA diminta tapi belum ada, di-fit dari sampel korpus.
+    """
+    codec = get_codec()
+    if settings.RAG_EMBED_PCA_DIM and codec.projection is None:
+        if col is None:
+            from .chroma_client import get_collection
+
+            col = get_collection()
+        sample = col.get(limit=settings.RAG_PCA_FIT_SAMPLE, include=["embeddings"])["embeddings"]
+        if sample is not None and len(sample):
+            codec = get_codec(fit_from=np.asarray(sample, dtype=np.float32))
+    return codec
+
+
+def build_from_chroma(batch_size: int = 5000, codec: Codec | None = None) -> VectorMirror:
+    from .chroma_client import get_collection, get_generation
+
+    t0 = time.perf_counter()
+    col = get_collection()
+    # dibaca sebelum isi collection: tulisan di tengah build memicu build ulang, bukan hilang
+    generation = get_generation()
+    mirror = VectorMirror(space=_space(col), codec=codec or mirror_codec(col))
+    offset = 0
+    while True:
+        res = col.get(limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+        if not len(res["ids"]):
+            break
+        mirror.upsert(res["ids"], res["documents"], res["metadatas"], res["embeddings"])
+        offset += len(res["ids"])
+    mirror.generation = generation
+    mirror.checked_at = time.monotonic()
+    logger.info(
+        f"[MIRROR] dimuat dari Chroma: {len(mirror)} chunk ({mirror.codec.label}) "
+        f"dalam {time.perf_counter() - t0:.2f}s"
+    )
+    return mirror
+
+
+def mirror_dir() -> Path:
+    return Path(settings.RAG_MIRROR_PATH)
+
+
+def _load_or_build() -> VectorMirror:
+    from .chroma_client import get_generation
+
+    directory = mirror_dir()
+    if settings.RAG_MIRROR_MMAP and (directory / "meta.pkl").exists():
+        try:
+            mirror = VectorMirror.load(directory, codec=mirror_codec(), mmap=True)
+            if mirror.generation == get_generation():
+                mirror.checked_at = time.monotonic()
+                logger.info(f"[MIRROR] snapshot memory-map dipakai: {len(mirror)} chunk")
+                return mirror
+            logger.info("[MIRROR] snapshot kedaluwarsa, bangun ulang dari Chroma")
+        except Exception as e:
+            logger.warning(f"[MIRROR] gagal membuka snapshot: {type(e).__name__}: {e}")
+
+    mirror = build_from_chroma()
+    if settings.RAG_MIRROR_MMAP:
+        mirror.save(directory)
+    return mirror
+
+
+def _accounted(mirror: VectorMirror, current: int) -> bool:
+    """
+    True jika semua generation sejak mirror dibangun sampai `current` berasal dari tulisan
+    proses ini (sudah diterapkan inkremental lewat sync_upsert / sync_remove).
+    """
+    if mirror.generation is None:
+        return False
+    return all(g in mirror.own_generations for g in range(mirror.generation + 1, current + 1))
+
+
+def get_mirror() -> VectorMirror:
+    """
+    Mirror singleton. Setiap RAG_MIRROR_REFRESH_SECONDS generation collection dicek;
+    bila ada generation yang tidak dihasilkan proses ini (ingest command, worker enrichment),
+    mirror dibangun ulang.
+    """
+    global _mirror
+    from .chroma_client import get_generation
+
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = _load_or_build()
+        elif time.monotonic() - _mirror.checked_at > settings.RAG_MIRROR_REFRESH_SECONDS:
+            current = get_generation()
+            if _accounted(_mirror, current):
+                _mirror.generation = max(_mirror.generation, current)
+                _mirror.own_generations = {g for g in _mirror.own_generations if g > _mirror.generation}
+            else:
+                logger.info("[MIRROR] store berubah di proses lain, muat ulang")
+                _mirror = build_from_chroma()
+            _mirror.checked_at = time.monotonic()
+        return _mirror
+
+
+def sync_upsert(ids, documents, metadatas, embeddings, generation: int):
+    """
+    Dipanggil dari upsert_chunks setelah bump_generation (generation = nilai hasil bump).
+    Hanya memperbarui mirror yang sudah dimuat; mirror yang belum dimuat akan membaca
+    Chroma saat pertama dipakai.
+    """
+    with _mirror_lock:
+        if _mirror is None:
+            return
+        _mirror.upsert(ids, documents, metadatas, embeddings)
+        _mirror.own_generations.add(generation)
+
+
+def sync_remove(ids, generation: int):
+    with _mirror_lock:
+        if _mirror is None:
+            return
+        _mirror.remove(ids)
+        _mirror.own_generations.add(generation)
@@ -3,13 +3,16 @@ from django.shortcuts import render
 # Create your views here.
 import os
 import tempfile
-import httpx
 
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from . import metrics
 from .pdf_ingest import upsert_pdf
+from .downloads import download_pdf, PDFDownloadError
 
 
 class IngestPDFView(APIView):
@@ -41,12 +44,26 @@ class IngestPDFView(APIView):
 
         with tempfile.TemporaryDirectory() as td:
             pdf_path = os.path.join(td, "paper.pdf")
-            with httpx.Client(timeout=60, follow_redirects=True) as client:
-                r = client.get(pdf_url)
-                r.raise_for_status()
-                with open(pdf_path, "wb") as f:
-                    f.write(r.content)
+            try:
+                download_pdf(pdf_url, pdf_path)
+            except PDFDownloadError as e:
+                return Response(
+                    {"error": "Gagal mengunduh PDF", "detail": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
             inserted = upsert_pdf(pdf_path, paper_meta)
 
         return Response({"inserted_chunks": inserted, "paper_meta": paper_meta}, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    GET /api/metrics/  (format teks Prometheus)
+    Durasi per tahap (histogram), counter (chunk, byte unduhan, token LLM, keputusan autofetch)
+    dan statistik cache embedding/retrieval/generasi/vision + scheduler embedding.
+    """
+    def get(self, request):
+        if not settings.RAG_METRICS_ENABLED:
+            raise Http404
+        return HttpResponse(metrics.render_prometheus(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
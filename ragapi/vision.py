@@ -1,39 +1,221 @@
 import base64
+import hashlib
 import json
+import logging
+import mimetypes
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
 from typing import List, Dict
+from urllib.parse import unquote, urlsplit
 
 import httpx
+from django.conf import settings
+from django.core.files.storage import default_storage
 
+from .cache_store import SQLiteCache
+from .image_preprocess import preprocess_image
 from .openrouter_client import chat_vision
 
+logger = logging.getLogger(__name__)
 
-def _to_data_url(url: str, max_bytes: int = 3_000_000) -> str | None:
+# naikkan jika vision_prompt / format output berubah → hasil cache lama tidak dipakai lagi
+VISION_PROMPT_VERSION = "v1"
+
+_cache = None
+_http_client = None
+
+
+def get_vision_cache() -> SQLiteCache | None:
+    global _cache
+    if not settings.RAG_VISION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = SQLiteCache(
+            Path(settings.RAG_CACHE_DIR) / "vision.sqlite3",
+            max_entries=settings.RAG_VISION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RAG_VISION_CACHE_TTL,
+        )
+    return _cache
+
+
+def vision_cache_stats() -> dict:
+    cache = get_vision_cache()
+    return cache.stats() if cache else {}
+
+
+def _get_http_client() -> httpx.Client:
     """
-    Unduh gambar dan ubah ke data URL agar bisa diproses LLM vision.
+    Client bersama (connection pool) untuk gambar remote; httpx.Client aman dipakai lintas thread.
     """
+    global _http_client
+    if _http_client is None:
+        n = settings.RAG_VISION_FETCH_CONCURRENCY
+        _http_client = httpx.Client(
+            timeout=settings.RAG_VISION_FETCH_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=n, max_keepalive_connections=n),
+        )
+    return _http_client
+
+
+def _origin(parts) -> str:
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _media_origins() -> set[str]:
+    origins = {o.rstrip("/").lower() for o in settings.RAG_VISION_MEDIA_ORIGINS}
+    media = urlsplit(settings.MEDIA_URL)
+    if media.netloc:
+        origins.add(_origin(media))
+    return origins
+
+
+def _media_name(url: str) -> str | None:
+    """
+    Jika URL menunjuk ke MEDIA_URL milik kita sendiri (relatif, atau origin-nya sama persis dengan
+    MEDIA_URL absolut / RAG_VISION_MEDIA_ORIGINS), return nama file di default_storage.
+    Selain itu None (gambar remote).
+    """
+    parsed = urlsplit(url)
+    if parsed.netloc and _origin(parsed) not in _media_origins():
+        return None
+    media_path = urlsplit(settings.MEDIA_URL).path
+    if not media_path or not parsed.path.startswith(media_path):
+        return None
+    name = posixpath.normpath(unquote(parsed.path[len(media_path):]))
+    if name.startswith(("..", "/")) or name == ".":
+        return None
+    return name
+
+
+def _read_local(name: str) -> tuple[bytes, str] | None:
+    max_bytes = settings.RAG_VISION_MAX_SOURCE_BYTES
+    try:
+        if default_storage.size(name) > max_bytes:
+            logger.warning(f"[VISION] gambar dilewati, > RAG_VISION_MAX_SOURCE_BYTES ({name})")
+            return None
+        with default_storage.open(name, "rb") as f:
+            content = f.read()
+    except Exception as e:
+        logger.warning(f"[VISION] gagal membaca {name} dari storage: {type(e).__name__}: {e}")
+        return None
+    content_type = mimetypes.guess_type(name)[0] or "image/jpeg"
+    return content, content_type
+
+
+def _fetch_remote(url: str) -> tuple[bytes, str] | None:
+    max_bytes = settings.RAG_VISION_MAX_SOURCE_BYTES
     try:
-        with httpx.Client(timeout=30, follow_redirects=True) as client:
-            r = client.get(url)
+        with _get_http_client().stream("GET", url) as r:
             r.raise_for_status()
-            content = r.content
-            if len(content) > max_bytes:
-                return None
             content_type = r.headers.get("content-type", "image/jpeg")
-    except Exception:
+            chunks, size = [], 0
+            for block in r.iter_bytes(64 * 1024):
+                size += len(block)
+                if size > max_bytes:
+                    logger.warning(f"[VISION] gambar dilewati, > RAG_VISION_MAX_SOURCE_BYTES ({url})")
+                    return None
+                chunks.append(block)
+    except Exception as e:
+        logger.warning(f"[VISION] gagal mengunduh {url}: {type(e).__name__}: {e}")
+        return None
+    return b"".join(chunks), content_type
+
+
+def _fetch_images(urls: List[str]) -> list[tuple[bytes, str] | None]:
+    """
+    Ambil semua gambar, urutan hasil = urutan urls.
+    Gambar lokal dibaca langsung; gambar remote diunduh paralel dengan batas waktu total
+    RAG_VISION_FETCH_DEADLINE — yang belum selesai saat deadline dianggap gagal.
+    """
+    results: list[tuple[bytes, str] | None] = [None] * len(urls)
+    remote = {}
+    for i, url in enumerate(urls):
+        name = _media_name(url)
+        if name is not None:
+            results[i] = _read_local(name)
+        else:
+            remote[i] = url
+
+    if not remote:
+        return results
+
+    pool = ThreadPoolExecutor(max_workers=min(len(remote), settings.RAG_VISION_FETCH_CONCURRENCY))
+    futures = {pool.submit(_fetch_remote, url): i for i, url in remote.items()}
+    done, not_done = wait(futures, timeout=settings.RAG_VISION_FETCH_DEADLINE)
+    for fut in done:
+        results[futures[fut]] = fut.result()
+    for fut in not_done:
+        fut.cancel()
+        logger.warning(f"[VISION] unduhan melewati deadline, dilewati ({remote[futures[fut]]})")
+    # jangan menunggu unduhan yang tertinggal; timeout client tetap membatasi umurnya
+    pool.shutdown(wait=False)
+    return results
+
+
+def _to_data_url(content: bytes, content_type: str, max_bytes: int | None = None) -> str | None:
+    """
+    Preprocess gambar (orientasi, resize, re-encode), lalu ubah ke data URL
+    agar bisa diproses LLM vision.
+    """
+    if max_bytes is None:
+        max_bytes = settings.RAG_VISION_MAX_BYTES
+
+    content, content_type = preprocess_image(content, content_type)
+    if len(content) > max_bytes:
+        logger.warning(f"[VISION] gambar dilewati, {len(content)} bytes setelah preprocess > {max_bytes}")
         return None
 
     b64 = base64.b64encode(content).decode("ascii")
     return f"data:{content_type};base64,{b64}"
 
 
+def _vision_cache_key(images: list[tuple[bytes, str, str]]) -> str:
+    """
+    Kunci: urutan (hash bytes gambar, label konteks) + versi prompt + model + parameter preprocess.
+    """
+    payload = {
+        "images": [[hashlib.sha256(content).hexdigest(), label] for content, _, label in images],
+        "prompt_version": VISION_PROMPT_VERSION,
+        "model": settings.OPENROUTER_MODEL,
+        "preprocess": [
+            settings.RAG_VISION_MAX_EDGE,
+            settings.RAG_VISION_IMAGE_FORMAT,
+            settings.RAG_VISION_IMAGE_QUALITY,
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 def analyze_images(image_items: List[Dict[str, str]]) -> dict | None:
     """
     Jalankan analisis visual untuk daftar gambar.
     image_items: [{"url": "...", "context": "..."}]
+    Hasil di-cache berdasarkan isi gambar + konteks, jadi foto yang sama
+    (mis. dilampirkan lagi di konsultasi lanjutan) tidak dikirim ulang ke LLM.
     """
     if not image_items:
         return None
 
+    images = []
+    fetched_all = _fetch_images([item["url"] for item in image_items])
+    for item, fetched in zip(image_items, fetched_all):
+        if not fetched:
+            continue
+        label = item.get("context") or "gambar"
+        images.append((fetched[0], fetched[1], label))
+
+    if not images:
+        return None
+
+    cache = get_vision_cache()
+    key = _vision_cache_key(images) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return json.loads(cached)
+
     vision_prompt = (
         "Anda adalah asisten konsultasi gizi anak. "
         "Analisis gambar hanya berdasarkan observasi visual yang jelas, tanpa diagnosis medis. "
@@ -49,11 +231,10 @@ def analyze_images(image_items: List[Dict[str, str]]) -> dict | None:
     )
 
     content = [{"type": "text", "text": vision_prompt}]
-    for item in image_items:
-        data_url = _to_data_url(item["url"])
+    for image_bytes, content_type, label in images:
+        data_url = _to_data_url(image_bytes, content_type)
         if not data_url:
             continue
-        label = item.get("context") or "gambar"
         content.append({"type": "text", "text": f"Konteks: {label}"})
         content.append({"type": "image_url", "image_url": {"url": data_url}})
 
@@ -85,8 +266,13 @@ def analyze_images(image_items: List[Dict[str, str]]) -> dict | None:
 
     if json_block:
         try:
-            return json.loads(json_block)
+            result = json.loads(json_block)
         except Exception:
             pass
+        else:
+            # hanya output JSON yang valid yang di-cache
+            if cache:
+                cache.set(key, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+            return result
 
     return {"summary": raw_text, "observations": [], "possible_concerns": [], "red_flags": [], "confidence": "low"}
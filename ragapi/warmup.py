@@ -0,0 +1,66 @@
+"""
+Warmup proses: bayar biaya cold start (import chromadb/sentence-transformers, buka
+persistent client, load model) sebelum request pertama masuk.
+
+Dipanggil otomatis dari RagapiConfig.ready() bila RAG_WARMUP=True, atau manual
+dari hook post-fork server (mis. gunicorn `post_fork`) supaya tiap worker hangat:
+
+    def post_fork(server, worker):
+        from ragapi.warmup import start_background_warmup
+        start_background_warmup()
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def warmup() -> dict:
+    """
+    Jalankan tiap langkah warmup secara berurutan. Return durasi per langkah (detik).
+    """
+    from .chroma_client import get_collection
+    from .embeddings import get_embedder
+    from .openrouter_client import get_client
+    from .retrieval import retrieve
+
+    timings = {}
+    steps = [
+        ("embedder", get_embedder),
+        ("collection", get_collection),
+        ("llm_client", get_client),
+        ("dummy_query", lambda: retrieve("pencegahan stunting pada balita", k=1, use_cache=False)),
+    ]
+    for name, step in steps:
+        t0 = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - t0
+    return timings
+
+
+def _run():
+    t0 = time.perf_counter()
+    try:
+        timings = warmup()
+    except Exception as e:
+        logger.warning(f"[WARMUP] gagal: {type(e).__name__}: {e}")
+        return
+    detail = " ".join(f"{k}={v:.2f}s" for k, v in timings.items())
+    logger.info(f"[WARMUP] selesai dalam {time.perf_counter() - t0:.2f}s ({detail})")
+
+
+def start_background_warmup() -> bool:
+    """
+    Mulai warmup di thread daemon (sekali per proses). Return False jika sudah pernah dimulai.
+    """
+    global _started
+    with _started_lock:
+        if _started:
+            return False
+        _started = True
+    threading.Thread(target=_run, name="rag-warmup", daemon=True).start()
+    return True
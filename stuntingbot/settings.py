@@ -86,3 +86,170 @@ OPENROUTER_MODEL = env("OPENROUTER_MODEL", default="google/gemini-3-flash-previe
 # Chroma
 CHROMA_PERSIST_PATH = env("CHROMA_PERSIST_PATH", default=str(BASE_DIR / "chroma_store"))
 RAG_COLLECTION = env("RAG_COLLECTION", default="papers_chunks")
+RAG_INGEST_MANIFEST_PATH = env(
+    "RAG_INGEST_MANIFEST_PATH",
+    default=str(Path(CHROMA_PERSIST_PATH) / "ingest_manifest.sqlite3"),
+)
+# counter generation collection (naik di setiap upsert/delete dari proses mana pun); invalidasi cache retrieval
+RAG_GENERATION_PATH = env(
+    "RAG_GENERATION_PATH",
+    default=str(Path(CHROMA_PERSIST_PATH) / "generation.sqlite3"),
+)
+
+# Index BM25 (dipelihara saat upsert) + mode retrieval: "vector" | "hybrid" (BM25 + vektor, digabung RRF).
+# Hybrid opt-in: mengubah ranking semua query; aktifkan setelah eval (rag_bench_retrieval) menunjukkan
+# kualitasnya tidak lebih buruk. Index BM25 tetap dipelihara supaya bisa langsung diaktifkan tanpa rebuild.
+RAG_BM25_ENABLED = env.bool("RAG_BM25_ENABLED", default=True)
+RAG_BM25_INDEX_PATH = env(
+    "RAG_BM25_INDEX_PATH",
+    default=str(Path(CHROMA_PERSIST_PATH) / "bm25_index.sqlite3"),
+)
+RAG_RETRIEVAL_MODE = env("RAG_RETRIEVAL_MODE", default="vector")
+RAG_HYBRID_CANDIDATES = env.int("RAG_HYBRID_CANDIDATES", default=30)
+RAG_RRF_K = env.int("RAG_RRF_K", default=60)
+# Istilah BM25 yang muncul di > rasio ini dari seluruh chunk dilewati saat ada istilah lain yang lebih jarang
+RAG_BM25_MAX_DF_RATIO = env.float("RAG_BM25_MAX_DF_RATIO", default=0.5)
+
+# Engine pencarian vektor: "chroma" (HNSW persisten) | "numpy" (mirror in-memory, exact top-k)
+RAG_RETRIEVAL_ENGINE = env("RAG_RETRIEVAL_ENGINE", default="chroma")
+RAG_MIRROR_PATH = env("RAG_MIRROR_PATH", default=str(Path(CHROMA_PERSIST_PATH) / "vector_mirror"))
+RAG_MIRROR_MMAP = env.bool("RAG_MIRROR_MMAP", default=False)
+RAG_MIRROR_REFRESH_SECONDS = env.float("RAG_MIRROR_REFRESH_SECONDS", default=10.0)
+# Skor dihitung per blok baris: batasi salinan float32 sementara dari matriks int8 per query
+RAG_MIRROR_SCORE_BLOCK = env.int("RAG_MIRROR_SCORE_BLOCK", default=16_384)
+
+# Representasi kompak di mirror: RAG_EMBED_COMPACT = "off" | "int8", RAG_EMBED_PCA_DIM = 0 (tanpa proyeksi) / mis. 128
+RAG_EMBED_COMPACT = env("RAG_EMBED_COMPACT", default="off")
+RAG_EMBED_PCA_DIM = env.int("RAG_EMBED_PCA_DIM", default=0)
+RAG_PCA_FIT_SAMPLE = env.int("RAG_PCA_FIT_SAMPLE", default=20_000)
+RAG_PROJECTION_PATH = env(
+    "RAG_PROJECTION_PATH",
+    default=str(Path(CHROMA_PERSIST_PATH) / f"{RAG_COLLECTION}_projection.npz"),
+)
+
+# Cache lokal (embedding, dsb.)
+RAG_CACHE_DIR = env("RAG_CACHE_DIR", default=str(BASE_DIR / "rag_cache"))
+RAG_EMBED_CACHE_ENABLED = env.bool("RAG_EMBED_CACHE_ENABLED", default=True)
+RAG_EMBED_CACHE_MAX_ENTRIES = env.int("RAG_EMBED_CACHE_MAX_ENTRIES", default=500_000)
+
+# Backend embedding: "torch" (SentenceTransformer) | "onnx" (ONNX Runtime CPU, ekspor via rag_export_onnx)
+RAG_EMBED_BACKEND = env("RAG_EMBED_BACKEND", default="torch")
+RAG_ONNX_MODEL_DIR = env("RAG_ONNX_MODEL_DIR", default=str(BASE_DIR / "onnx_models" / "all-MiniLM-L6-v2"))
+RAG_ONNX_QUANTIZE = env.bool("RAG_ONNX_QUANTIZE", default=False)
+RAG_ONNX_THREADS = env.int("RAG_ONNX_THREADS", default=0)  # 0 = jumlah core
+RAG_ONNX_BATCH_SIZE = env.int("RAG_ONNX_BATCH_SIZE", default=32)
+
+# Micro-batching embed: panggilan kecil bersamaan digabung maks. WINDOW_MS atau MAX_BATCH teks
+RAG_EMBED_BATCHING = env.bool("RAG_EMBED_BATCHING", default=True)
+RAG_EMBED_BATCH_WINDOW_MS = env.float("RAG_EMBED_BATCH_WINDOW_MS", default=3.0)
+RAG_EMBED_MAX_BATCH = env.int("RAG_EMBED_MAX_BATCH", default=32)
+
+# Cache retrieval in-process
+RAG_QUERY_EMB_CACHE_SIZE = env.int("RAG_QUERY_EMB_CACHE_SIZE", default=1024)
+RAG_RESULT_CACHE_SIZE = env.int("RAG_RESULT_CACHE_SIZE", default=512)
+# detik; batas umur entry (perubahan corpus sudah terdeteksi lewat RAG_GENERATION_PATH)
+RAG_RESULT_CACHE_TTL = env.int("RAG_RESULT_CACHE_TTL", default=300)
+
+# Timeout (detik) per provider eksternal saat autofetch
+RAG_PROVIDER_TIMEOUTS = {
+    "pmc": env.float("RAG_PMC_TIMEOUT", default=20.0),
+    "semantic_scholar": env.float("RAG_S2_TIMEOUT", default=15.0),
+    "openalex": env.float("RAG_OPENALEX_TIMEOUT", default=15.0),
+}
+
+# Chunking PDF: "chars" (window 1800 karakter, overlap 200) atau "tokens" (kalimat utuh
+# sampai batas token embedder, overlap per kalimat). Mengganti chunker = chunk ID baru (ingest ulang).
+RAG_CHUNKER = env("RAG_CHUNKER", default="chars")
+RAG_CHUNK_MAX_TOKENS = env.int("RAG_CHUNK_MAX_TOKENS", default=0)  # 0 = max_seq_length embedder - 2
+RAG_CHUNK_OVERLAP_SENTENCES = env.int("RAG_CHUNK_OVERLAP_SENTENCES", default=1)
+
+# Deteksi chunk near-duplicate saat ingest (MinHash/LSH): "off" | "skip" | "link"
+# (link = dilewati + ditandai sebagai alias chunk kanonik). Kedua mode menyimpan teks duplikat supaya
+# di-ingest ulang otomatis bila chunk kanoniknya dihapus. Threshold = estimasi Jaccard shingle 5 kata;
+# batas chunk dokumen yang sama dengan rendering berbeda biasanya bergeser, jadi Jaccard-nya ~0.7-0.95.
+RAG_DEDUP_MODE = env("RAG_DEDUP_MODE", default="off")
+RAG_DEDUP_THRESHOLD = env.float("RAG_DEDUP_THRESHOLD", default=0.7)
+RAG_DEDUP_INDEX_PATH = env(
+    "RAG_DEDUP_INDEX_PATH",
+    default=str(Path(CHROMA_PERSIST_PATH) / "dedup_index.sqlite3"),
+)
+
+# Unduhan PDF (autofetch & ingest manual)
+RAG_PDF_MAX_BYTES = env.int("RAG_PDF_MAX_BYTES", default=50 * 1024 * 1024)
+RAG_DOWNLOAD_CONCURRENCY = env.int("RAG_DOWNLOAD_CONCURRENCY", default=4)
+
+# Autofetch saat evidence lemah:
+#   "sync"       → tunggu autofetch+ingest lalu retrieve ulang (perilaku lama)
+#   "background" → jawab langsung dari corpus yang ada, enrichment dijalankan di background
+#   "off"        → tidak autofetch
+RAG_AUTOFETCH_MODE = env("RAG_AUTOFETCH_MODE", default="sync")
+# jalankan job enrichment di thread pool proses web; matikan jika memakai `manage.py rag_enrich_worker`
+RAG_ENRICH_INLINE_WORKER = env.bool("RAG_ENRICH_INLINE_WORKER", default=True)
+RAG_ENRICH_WORKERS = env.int("RAG_ENRICH_WORKERS", default=1)
+# job running lebih lama dari ini dianggap ditinggal worker (crash/kill) dan boleh diklaim ulang
+RAG_ENRICH_LEASE_SECONDS = env.int("RAG_ENRICH_LEASE_SECONDS", default=1800)
+
+# Proses konsultasi
+# True → POST /process/ mengembalikan 202 + job_id, pipeline dijalankan worker pool lokal.
+# Default False: respons 200 sinkron seperti sebelumnya; per request bisa ?async=true.
+CONSULTATION_PROCESS_ASYNC = env.bool("CONSULTATION_PROCESS_ASYNC", default=False)
+CONSULTATION_WORKERS = env.int("CONSULTATION_WORKERS", default=4)
+# job queued/running tanpa update selama ini (worker pool in-memory hilang saat restart) → failed
+CONSULTATION_JOB_STALE_SECONDS = env.int("CONSULTATION_JOB_STALE_SECONDS", default=900)
+
+# Cache generasi LLM (kunci: model + max_tokens + hash messages)
+RAG_GENERATION_CACHE_ENABLED = env.bool("RAG_GENERATION_CACHE_ENABLED", default=True)
+RAG_GENERATION_CACHE_TTL = env.int("RAG_GENERATION_CACHE_TTL", default=7 * 24 * 3600)
+RAG_GENERATION_CACHE_MAX_ENTRIES = env.int("RAG_GENERATION_CACHE_MAX_ENTRIES", default=20_000)
+
+# Reuse jawaban untuk konsultasi yang hampir identik
+RAG_ANSWER_REUSE_ENABLED = env.bool("RAG_ANSWER_REUSE_ENABLED", default=True)
+RAG_ANSWER_REUSE_MIN_SIMILARITY = env.float("RAG_ANSWER_REUSE_MIN_SIMILARITY", default=0.95)
+# jumlah kandidat terdekat yang diperiksa (konsultasi itu sendiri bisa ikut muncul)
+RAG_ANSWER_REUSE_CANDIDATES = env.int("RAG_ANSWER_REUSE_CANDIDATES", default=5)
+RAG_ANSWER_COLLECTION = env("RAG_ANSWER_COLLECTION", default="consultation_answers")
+
+# Preprocessing gambar sebelum vision (butuh Pillow; tanpa Pillow gambar dikirim apa adanya)
+RAG_VISION_MAX_EDGE = env.int("RAG_VISION_MAX_EDGE", default=1024)
+RAG_VISION_IMAGE_FORMAT = env("RAG_VISION_IMAGE_FORMAT", default="JPEG")  # JPEG | WEBP
+RAG_VISION_IMAGE_QUALITY = env.int("RAG_VISION_IMAGE_QUALITY", default=80)
+# Cache hasil preprocess di RAG_CACHE_DIR/images.sqlite3 (~100–300 KB per gambar)
+RAG_VISION_IMAGE_CACHE_MAX_ENTRIES = env.int("RAG_VISION_IMAGE_CACHE_MAX_ENTRIES", default=2_000)
+RAG_VISION_IMAGE_CACHE_TTL = env.int("RAG_VISION_IMAGE_CACHE_TTL", default=30 * 24 * 3600)
+# batas unduhan foto asli, dan batas setelah preprocessing (yang dikirim ke provider)
+RAG_VISION_MAX_SOURCE_BYTES = env.int("RAG_VISION_MAX_SOURCE_BYTES", default=20_000_000)
+RAG_VISION_MAX_BYTES = env.int("RAG_VISION_MAX_BYTES", default=3_000_000)
+
+# Cache hasil analisis vision (kunci: hash gambar + konteks + versi prompt + model)
+RAG_VISION_CACHE_ENABLED = env.bool("RAG_VISION_CACHE_ENABLED", default=True)
+RAG_VISION_CACHE_TTL = env.int("RAG_VISION_CACHE_TTL", default=30 * 24 * 3600)
+RAG_VISION_CACHE_MAX_ENTRIES = env.int("RAG_VISION_CACHE_MAX_ENTRIES", default=50_000)
+
+# Pengambilan gambar remote untuk vision (foto upload sendiri dibaca langsung dari storage)
+RAG_VISION_FETCH_CONCURRENCY = env.int("RAG_VISION_FETCH_CONCURRENCY", default=4)
+RAG_VISION_FETCH_TIMEOUT = env.float("RAG_VISION_FETCH_TIMEOUT", default=15.0)
+RAG_VISION_FETCH_DEADLINE = env.float("RAG_VISION_FETCH_DEADLINE", default=20.0)
+# Origin (scheme://host[:port]) tempat MEDIA_URL kita disajikan; URL absolut dengan origin ini
+# dibaca langsung dari storage. Sengaja terpisah dari ALLOWED_HOSTS (yang bisa berisi "*").
+RAG_VISION_MEDIA_ORIGINS = env.list(
+    "RAG_VISION_MEDIA_ORIGINS", default=["http://127.0.0.1:8000", "http://localhost:8000"]
+)
+
+# Logging (sebelumnya lewat logging.basicConfig saat pdf_ingest di-import)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "simple": {"format": "%(asctime)s | %(levelname)s | %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "simple"},
+    },
+    "root": {"handlers": ["console"], "level": env("LOG_LEVEL", default="INFO")},
+}
+
+# Warmup opsional saat start (load embedder, buka collection, query dummy) di thread background
+RAG_WARMUP = env.bool("RAG_WARMUP", default=False)
+
+# Metrik Prometheus (GET /api/metrics/): durasi per tahap, counter, statistik cache
+RAG_METRICS_ENABLED = env.bool("RAG_METRICS_ENABLED", default=True)